@@ -0,0 +1,88 @@
+"""对比旧的PNG中转写入与共用的零复制编码路径的单页耗时和内存分配，以及各编码预设的耗时和输出大小
+
+用法: python benchmarks/bench_encode.py [--dpi 300] [--repeat 5]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from pdftojpg.encode import OUTPUT_FORMATS, PRESETS, save_pixmap
+
+
+def make_page_pixmap(dpi):
+    """生成一页文字加色块的合成页面并渲染"""
+    doc = fitz.open()
+    page = doc.new_page()
+    for i in range(60):
+        page.insert_text((40, 40 + i * 12), "The quick brown fox jumps over the lazy dog 0123456789 " * 2,
+                         fontsize=9)
+    page.draw_rect(fitz.Rect(100, 500, 400, 700), color=(1, 0, 0), fill=(0, 0, 1))
+    pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72))
+    doc.close()
+    return pix
+
+
+def save_via_png(pix, output_path, format_type):
+    """改动前Word路径的写法：先编码为PNG，再解码，再由PIL重新编码"""
+    img = Image.open(io.BytesIO(pix.tobytes("png")))
+    img.save(output_path, format=('JPEG' if format_type == 'jpeg' else 'PNG'))
+
+
+def measure(func, pix, output_path, format_type, repeat, decoded_copy_bytes):
+    """python_peak_bytes只统计Python对象（如tobytes返回的PNG数据）；
+    decoded_copy_bytes是PIL内部额外解码出的整页像素，tracemalloc统计不到"""
+    func(pix, output_path, format_type)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(pix, output_path, format_type)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    func(pix, output_path, format_type)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'ms_per_page': round(elapsed * 1000, 2), 'python_peak_bytes': peak,
+            'decoded_copy_bytes': decoded_copy_bytes, 'output_bytes': os.path.getsize(output_path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pix = make_page_pixmap(args.dpi)
+    page_bytes = pix.width * pix.height * pix.n
+    results = {'dpi': args.dpi, 'width': pix.width, 'height': pix.height, 'formats': {}}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for format_type in ('jpeg', 'png'):
+            output_path = os.path.join(tmp_dir, f"page.{format_type}")
+            results['formats'][format_type] = {
+                'png_roundtrip': measure(save_via_png, pix, output_path, format_type, args.repeat, page_bytes),
+                'zero_copy': measure(save_pixmap, pix, output_path, format_type, args.repeat, 0),
+            }
+        # 各编码预设：每种输出格式的单页编码耗时和字节数
+        results['presets'] = {}
+        for preset, options in PRESETS.items():
+            results['presets'][preset] = {}
+            for format_type in OUTPUT_FORMATS:
+                output_path = os.path.join(tmp_dir, f"{preset}.{format_type}")
+                save = lambda pix, path, fmt: save_pixmap(pix, path, fmt, options)
+                result = measure(save, pix, output_path, format_type, args.repeat, 0)
+                results['presets'][preset][format_type] = {key: result[key]
+                                                           for key in ('ms_per_page', 'output_bytes')}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""对比两次基准测试结果: python benchmarks/compare.py old.json new.json [--threshold 5]
+
+吞吐下降或峰值内存上升超过阈值(百分比)的配置会被标记，存在回退时退出码为1。
+"""
+import argparse
+import json
+import sys
+
+
+def change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次基准测试结果')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=5.0, help='判定为回退的变化百分比')
+    args = parser.parse_args(argv)
+
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"{old['environment'].get('commit')} -> {new['environment'].get('commit')}")
+    regressions = 0
+    for key in sorted(set(old['runs']) & set(new['runs'])):
+        before, after = old['runs'][key], new['runs'][key]
+        speed = change(before.get('pages_per_sec'), after.get('pages_per_sec'))
+        rss = change(before.get('peak_rss_mb'), after.get('peak_rss_mb'))
+        size = change(before.get('output_bytes'), after.get('output_bytes'))
+        flag = ''
+        if (speed is not None and speed < -args.threshold) or (rss is not None and rss > args.threshold):
+            flag = '  <-- 回退'
+            regressions += 1
+        fmt = lambda value: 'n/a' if value is None else f"{value:+.1f}%"
+        print(f"{key:36} 吞吐{fmt(speed):>8}  峰值内存{fmt(rss):>8}  输出大小{fmt(size):>8}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
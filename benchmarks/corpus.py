@@ -0,0 +1,125 @@
+"""生成基准测试用的合成语料，同一参数每次生成的内容完全相同
+
+- text: 文字密集的多页PDF
+- scanned: 每页一张整页JPEG扫描图的PDF
+- drawing: A0幅面的矢量工程图PDF
+- docx: 含大量内嵌图片的.docx（python-docx生成）
+"""
+import io
+import os
+import random
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw
+
+
+CORPORA = ('text', 'scanned', 'drawing', 'docx')
+
+# 各规模下每种语料的(文件数, 每个文件的页数/图片数)
+SIZES = {
+    'small': {'text': (2, 10), 'scanned': (2, 4), 'drawing': (1, 1), 'docx': (2, 6)},
+    'full': {'text': (8, 50), 'scanned': (4, 20), 'drawing': (2, 2), 'docx': (6, 20)},
+}
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud").split()
+
+
+def make_text_pdf(path, pages, rng):
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        y = 50
+        while y < page.rect.height - 50:
+            line = " ".join(rng.choice(WORDS) for _ in range(14))
+            page.insert_text((50, y), line, fontsize=10)
+            y += 13
+    doc.save(path)
+    doc.close()
+
+
+def make_scan_image(rng, width=1700, height=2200):
+    """模拟300DPI灰度扫描页：浅色底噪加若干文字块"""
+    img = Image.new('L', (width, height), 235)
+    draw = ImageDraw.Draw(img)
+    for _ in range(400):
+        x = rng.randrange(0, width - 200)
+        y = rng.randrange(0, height - 20)
+        draw.rectangle((x, y, x + rng.randrange(40, 200), y + rng.randrange(6, 14)), fill=rng.randrange(0, 90))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def make_scanned_pdf(path, pages, rng):
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=make_scan_image(rng))
+    doc.save(path)
+    doc.close()
+
+
+def make_drawing_pdf(path, pages, rng):
+    doc = fitz.open()
+    width, height = fitz.paper_size('a0')
+    for _ in range(pages):
+        page = doc.new_page(width=width, height=height)
+        shape = page.new_shape()
+        for _ in range(3000):
+            p1 = fitz.Point(rng.uniform(0, width), rng.uniform(0, height))
+            p2 = p1 + (rng.uniform(-300, 300), rng.uniform(-300, 300))
+            shape.draw_line(p1, p2)
+        shape.finish(color=(0, 0, 0), width=0.5)
+        for _ in range(200):
+            center = fitz.Point(rng.uniform(0, width), rng.uniform(0, height))
+            shape.draw_circle(center, rng.uniform(5, 80))
+        shape.finish(color=(0.8, 0, 0), width=1)
+        shape.commit()
+    doc.save(path)
+    doc.close()
+
+
+def make_docx(path, images, rng):
+    from docx import Document
+    from docx.shared import Inches
+
+    doc = Document()
+    for i in range(images):
+        doc.add_paragraph(" ".join(rng.choice(WORDS) for _ in range(80)))
+        img = Image.new('RGB', (800, 600), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(50):
+            x, y = rng.randrange(800), rng.randrange(600)
+            draw.ellipse((x, y, x + 60, y + 60), fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        buffer.seek(0)
+        doc.add_picture(buffer, width=Inches(5))
+    doc.save(path)
+
+
+GENERATORS = {
+    'text': (make_text_pdf, '.pdf'),
+    'scanned': (make_scanned_pdf, '.pdf'),
+    'drawing': (make_drawing_pdf, '.pdf'),
+    'docx': (make_docx, '.docx'),
+}
+
+
+def build_corpus(root, corpus, size='small', seed=0):
+    """生成(或复用已生成的)语料，返回文件路径列表"""
+    count, pages = SIZES[size][corpus]
+    directory = os.path.join(root, size, corpus)
+    os.makedirs(directory, exist_ok=True)
+    generator, ext = GENERATORS[corpus]
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"{corpus}_{index+1}{ext}")
+        if not os.path.exists(path):
+            rng = random.Random(f"{seed}:{corpus}:{index}")
+            tmp_path = path + '.tmp' + ext
+            generator(tmp_path, pages, rng)
+            os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,166 @@
+"""在合成语料上运行转换引擎，输出可在不同提交之间对比的JSON结果
+
+每个配置(语料 × DPI × 格式 × 进程数)在独立子进程中运行，峰值内存互不影响。
+
+用法:
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --size full --dpi 200 300 --workers 1 8 -o results.json
+    python benchmarks/compare.py old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import CORPORA, SIZES, build_corpus
+
+
+DEFAULT_CORPUS_DIR = os.path.join(ROOT, 'benchmarks', '.corpus')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """本进程和已回收子进程(进程池)各自的峰值内存，不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # Linux下ru_maxrss单位为KB，macOS为字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def run_single(config):
+    """在当前进程中运行一个配置并返回结果（由子进程调用）"""
+    from pdftojpg import ConversionEngine, PAGE_DONE
+
+    output_dir = tempfile.mkdtemp(prefix='pdftojpg-bench-')
+    try:
+        engine = ConversionEngine(output_dir, config['format'], 'all', config['dpi'], config['workers'])
+        page_times = []
+        start = time.perf_counter()
+        last = start
+        result = None
+        for event in engine.iter_convert(config['files']):
+            if event.kind == PAGE_DONE:
+                now = time.perf_counter()
+                page_times.append(now - last)
+                last = now
+            result = event
+        elapsed = time.perf_counter() - start
+
+        output_bytes = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+        main_rss, worker_rss = peak_rss_mb()
+        return {
+            'success': result.success,
+            'pages': len(page_times),
+            'seconds': round(elapsed, 4),
+            'pages_per_sec': round(len(page_times) / elapsed, 3) if elapsed else None,
+            # 相邻两页完成的时间间隔；并行时页面按区间任务成批到达，分位数会集中在两端
+            'latency_ms': {f"p{pct}": round(percentile(page_times, pct) * 1000, 2) if page_times else None
+                           for pct in (50, 90, 99)},
+            'peak_rss_mb': main_rss,
+            'peak_worker_rss_mb': worker_rss,
+            'output_bytes': output_bytes,
+        }
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def run_in_subprocess(config):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--single', json.dumps(config)],
+                          capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment():
+    import fitz
+    import PIL
+    return {
+        'commit': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pymupdf': fitz.VersionBind,
+        'pillow': PIL.__version__,
+    }
+
+
+def config_key(config):
+    return f"{config['corpus']}/dpi{config['dpi']}/{config['format']}/w{config['workers']}"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='转换引擎性能基准测试')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='语料规模')
+    parser.add_argument('--corpora', nargs='+', choices=CORPORA, default=list(CORPORA))
+    parser.add_argument('--dpi', nargs='+', type=int, default=[96, 200, 300])
+    parser.add_argument('--formats', nargs='+', choices=['jpeg', 'png'], default=['jpeg', 'png'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=1, help='每个配置重复次数，取吞吐最高的一次')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('-o', '--output', help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.single:
+        print(json.dumps(run_single(json.loads(args.single))))
+        return 0
+
+    results = {'environment': environment(), 'size': args.size, 'runs': {}}
+    for corpus in args.corpora:
+        files = build_corpus(args.corpus_dir, corpus, args.size)
+        for dpi in args.dpi:
+            for format_type in args.formats:
+                for workers in sorted(set(args.workers)):
+                    config = {'corpus': corpus, 'files': files, 'dpi': dpi, 'format': format_type,
+                              'workers': workers}
+                    best = None
+                    for _ in range(args.repeat):
+                        run = run_in_subprocess(config)
+                        if best is None or (run.get('pages_per_sec') or 0) > (best.get('pages_per_sec') or 0):
+                            best = run
+                    key = config_key(config)
+                    results['runs'][key] = best
+                    print(f"{key}: {best.get('pages_per_sec', best.get('error'))} 页/秒", file=sys.stderr)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,431 +1,256 @@
 import os
 import sys
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                              QWidget, QPushButton, QFileDialog, QLabel, QSpinBox,
-                             QComboBox, QProgressBar, QMessageBox, QTextEdit, 
-                             QListWidget, QListWidgetItem, QAbstractItemView)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                             QComboBox, QProgressBar, QMessageBox, QPlainTextEdit, 
+                             QListView, QAbstractItemView, QCheckBox)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QAbstractListModel, QModelIndex
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent
-import fitz  # PyMuPDF
-from docx import Document
-from PIL import Image
-import io
-import shutil
-try:
-    import win32com.client
-except ImportError:
-    win32com = None
+import multiprocessing
+from pdftojpg import (ConversionEngine, PREFLIGHT_DONE, FILE_STARTED, PAGE_DONE, FILE_FAILED,
+                      BATCH_FINISHED, SUPPORTED_EXTENSIONS, BatchProgress,
+                      default_cache_dir, format_progress, format_summary, scan_folder, make_sizing,
+                      make_encoding, make_variant)
+
+
+# 后台扫描文件夹时每批最多发送的文件数和最长间隔(秒)，避免界面线程一次插入过多行
+SCAN_CHUNK_SIZE = 2000
+SCAN_CHUNK_INTERVAL = 0.2
+
+# 日志区域只保留最近的行数，完整日志写到输出目录下的日志文件
+LOG_MAX_LINES = 5000
+LOG_NAME = '.pdftojpg.log'
+
+# 界面上的清晰度选项 -> 固定DPI或按目标尺寸渲染；按长边/总像素时不同幅面的页面输出尺寸一致
+CLARITY_OPTIONS = {
+    '低': 96,  # 适合屏幕显示
+    '中': 200,  # 适合一般打印
+    '高': 300,  # 适合高质量印刷
+    '长边2000像素': make_sizing(longest_edge=2000, max_dpi=600),
+    '长边4000像素': make_sizing(longest_edge=4000, max_dpi=600),
+    '每页800万像素': make_sizing(megapixels=8, max_dpi=600),
+}
+
+# 界面上的编码预设选项 -> 引擎编码预设
+ENCODING_PRESETS = {'最快': 'fast', '均衡': 'balanced', '最小文件': 'smallest'}
+
+# 界面上的色彩选项 -> 引擎色彩模式；黑白只对PNG输出生效
+COLOR_OPTIONS = {'彩色': 'rgb', '自动灰度': 'auto', '自动灰度/黑白': 'bilevel'}
+
+# 界面上的输出方式选项 -> (输出方式, 压缩包范围)
+SINK_OPTIONS = {
+    '单独文件': ('files', 'batch'),
+    '整批一个ZIP': ('zip', 'batch'),
+    '每个文档一个ZIP': ('zip', 'document'),
+    '整批一个TAR': ('tar', 'batch'),
+}
+
+# “同时输出网页图和缩略图”对应的尺寸变体，放在输出目录下的web/和thumb/子目录中
+WEB_VARIANTS = [make_variant('web', 1600, 'jpeg'), make_variant('thumb', 256, 'jpeg')]
+
+# 界面上的处理顺序选项 -> 引擎调度策略
+# 默认按添加顺序，与以前的行为一致
+ORDER_POLICIES = {'按添加顺序': 'fifo', '小文件优先': 'shortest', '按优先级': 'priority'}
+
+
+class FileListModel(QAbstractListModel):
+    """文件列表模型：列表保存顺序，集合用于O(1)去重，配合QListView只绘制可见行"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        # 不能命名为index，否则会覆盖QAbstractItemModel.index()，视图和代理模型调用时出错
+        self.path_set = set()
+        # 用户指定的优先级 {路径: 优先级}，“按优先级”调度时数值大的先处理
+        self.priorities = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        file_path = self.paths[index.row()]
+        if role == Qt.DisplayRole:
+            return f"★ {file_path}" if file_path in self.priorities else file_path
+        if role == Qt.UserRole:
+            return file_path
+        return None
+
+    def toggle_priority(self, rows):
+        """选中的文件全部已优先时取消优先，否则全部设为优先"""
+        paths = [self.paths[row] for row in rows]
+        if not paths:
+            return
+        if all(path in self.priorities for path in paths):
+            for path in paths:
+                self.priorities.pop(path, None)
+        else:
+            for path in paths:
+                self.priorities[path] = 1
+        for row in rows:
+            self.dataChanged.emit(self.index_of(row), self.index_of(row))
+
+    def index_of(self, row):
+        return self.createIndex(row, 0)
+
+    def contains(self, file_path):
+        return os.path.normpath(file_path) in self.path_set
+
+    def add_paths(self, paths):
+        """批量追加不重复的文件，一次插入通知，返回实际添加的数量"""
+        new_paths = []
+        for file_path in paths:
+            file_path = os.path.normpath(file_path)
+            if file_path not in self.path_set:
+                self.path_set.add(file_path)
+                new_paths.append(file_path)
+        if new_paths:
+            start = len(self.paths)
+            self.beginInsertRows(QModelIndex(), start, start + len(new_paths) - 1)
+            self.paths.extend(new_paths)
+            self.endInsertRows()
+        return len(new_paths)
+
+    def remove_rows(self, rows):
+        """删除指定行，选中大量行时整体重建，避免逐行删除的O(n²)"""
+        rows = set(rows)
+        if not rows:
+            return
+        self.beginResetModel()
+        self.paths = [path for row, path in enumerate(self.paths) if row not in rows]
+        self.path_set = set(self.paths)
+        self.priorities = {path: value for path, value in self.priorities.items() if path in self.path_set}
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.paths = []
+        self.path_set = set()
+        self.priorities = {}
+        self.endResetModel()
+
+
+class FolderScanner(QThread):
+    """在后台线程中递归扫描文件夹，按批发送找到的文件"""
+    files_found = pyqtSignal(list)
+    scan_finished = pyqtSignal(int)
+
+    def __init__(self, folders):
+        super().__init__()
+        self.folders = folders
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        total = 0
+        chunk = []
+        last_emit = time.monotonic()
+        for folder in self.folders:
+            for file_path in scan_folder(folder, SUPPORTED_EXTENSIONS):
+                if self.stopped:
+                    return
+                chunk.append(file_path)
+                if len(chunk) >= SCAN_CHUNK_SIZE or time.monotonic() - last_emit >= SCAN_CHUNK_INTERVAL:
+                    self.files_found.emit(chunk)
+                    total += len(chunk)
+                    chunk = []
+                    last_emit = time.monotonic()
+        if chunk:
+            self.files_found.emit(chunk)
+            total += len(chunk)
+        self.scan_finished.emit(total)
+
+
+def log_line(event):
+    """引擎事件对应的日志文本"""
+    if event.kind == FILE_STARTED:
+        return f"开始处理: {event.message}"
+    if event.kind == PAGE_DONE:
+        return f"进度: {event.progress}% - {event.message}"
+    if event.kind == BATCH_FINISHED:
+        return f"转换完成: {event.message}"
+    return event.message
 
 
 class ConverterThread(QThread):
+    """把转换引擎放到后台线程中运行，并把引擎事件转发为Qt信号
+
+    页面级事件不逐个转发：每页只写入日志文件，界面按固定频率收到合并后的批次进度，
+    大批次下事件队列和界面线程不会成为瓶颈。
+    """
+    # (整个批次的百分比, 进度说明)
     progress_updated = pyqtSignal(int, str)
+    # BatchProgress快照：已完成/总页数、吞吐量、预计剩余时间
+    batch_progress = pyqtSignal(dict)
     file_started = pyqtSignal(str)
+    file_failed = pyqtSignal(str)
+    preflight_done = pyqtSignal(str)
     conversion_finished = pyqtSignal(bool, str, int, int)
+    # (事件类型, 计时字典)：PAGE_DONE时为最近一页的计时（随进度合并发送），BATCH_FINISHED时为批次汇总
+    timing_updated = pyqtSignal(str, dict)
     
-    def __init__(self, file_list, output_dir, format_type, pages, dpi=300):
+    def __init__(self, file_list, output_dir, format_type, pages, dpi=300, workers=1,
+                 incremental=False, cache_dir=None, policy='fifo', priorities=None, preset='balanced',
+                 color='rgb', passthrough='off', sink=('files', 'batch'), variants=None):
         super().__init__()
         self.file_list = file_list
-        self.output_dir = output_dir
-        self.format_type = format_type
-        self.pages = pages
-        self.dpi = dpi
-        
-        # 确保输出目录存在
-        if not os.path.exists(self.output_dir):
-            try:
-                os.makedirs(self.output_dir)
-            except Exception as e:
-                raise Exception(f"无法创建输出目录: {str(e)}")
-                
-        # 检查目录写入权限
-        if not os.access(self.output_dir, os.W_OK):
-            raise Exception(f"输出目录无写入权限: {self.output_dir}")
-        
-    def run(self):
-        total_files = len(self.file_list)
-        completed_files = 0
-        failed_files = 0
-        
-        for file_path in self.file_list:
-            try:
-                self.file_started.emit(os.path.basename(file_path))
-                
-                # 检查文件是否存在
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(f"文件不存在: {file_path}")
-                
-                # 检查文件大小
-                if os.path.getsize(file_path) == 0:
-                    raise ValueError("文件为空")
-                
-                # 根据文件扩展名和内容类型选择转换方法
-                file_ext = os.path.splitext(file_path)[1].lower()
-                
-                if file_ext == '.pdf':
-                    self.convert_pdf(file_path)
-                elif file_ext in ['.docx', '.doc']:
-                    try:
-                        import zipfile
-                        import mimetypes
-                        
-                        # 对于.doc文件，自动调用Word转换为docx
-                        if file_ext == '.doc':
-                            docx_path = None
-                            try:
-                                if win32com is not None:
-                                    word = win32com.client.Dispatch('Word.Application')
-                                    word.Visible = False
-                                    docx_path = file_path + "_tmp_autoconvert.docx"
-                                    doc = word.Documents.Open(file_path)
-                                    doc.SaveAs(docx_path, FileFormat=16)  # 16 = wdFormatDocumentDefault (docx)
-                                    doc.Close()
-                                    word.Quit()
-                                    # 用docx逻辑处理
-                                    self.convert_word(docx_path)
-                                    # 删除临时文件
-                                    if os.path.exists(docx_path):
-                                        os.remove(docx_path)
-                                else:
-                                    raise ImportError('未安装pywin32，无法自动调用Word转换doc为docx')
-                            except Exception as e:
-                                if docx_path and os.path.exists(docx_path):
-                                    os.remove(docx_path)
-                                raise ValueError(f"自动调用Word转换doc为docx失败: {str(e)}。请用Word手动另存为docx后再试。")
-                        
-                        # 对于.docx文件，进行详细检查
-                        elif file_ext == '.docx':
-                            try:
-                                with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                                    file_list = zip_ref.namelist()
-                                    # 检查是否包含Word文档的核心文件
-                                    if 'word/document.xml' not in file_list:
-                                        # 检查是否是主题文件
-                                        if any('theme' in f.lower() for f in file_list):
-                                            raise ValueError("文件格式错误: 这是一个Office主题文件，不是Word文档")
-                                        else:
-                                            raise ValueError("文件格式错误: 这不是有效的Word文档")
-                            except zipfile.BadZipFile:
-                                raise ValueError("文件格式错误: 文件已损坏或不是有效的Word文档")
-                            
-                            # 尝试用python-docx打开
-                            try:
-                                doc = Document(file_path)
-                                # 检查文档是否有内容
-                                has_content = (len(doc.paragraphs) > 0 and any(p.text.strip() for p in doc.paragraphs)) or len(doc.tables) > 0
-                                if not has_content:
-                                    raise ValueError("Word文档为空或无有效内容")
-                                self.convert_word(file_path)
-                            except Exception as e:
-                                if 'themeManager' in str(e) or 'theme' in str(e):
-                                    raise ValueError("文件格式错误: 这是一个Office主题文件，不是Word文档")
-                                elif 'package' in str(e).lower():
-                                    raise ValueError("文件格式错误: 文件包结构异常，可能已损坏")
-                                else:
-                                    raise ValueError(f"Word文件处理失败: {str(e)}")
-                                    
-                    except ValueError as e:
-                        raise e
-                    except Exception as e:
-                        raise ValueError(f"Word文件处理异常: {str(e)}")
-
-                else:
-                    raise ValueError(f"不支持的文件格式: {file_ext}\n当前仅支持PDF和Word文件格式")
-                    
-                completed_files += 1
-                
-            except FileNotFoundError as e:
-                error_msg = f"文件未找到: {str(e)}"
-                self.conversion_finished.emit(False, error_msg, 0, 1)
-                failed_files += 1
-                
-            except ValueError as e:
-                error_msg = f"文件格式问题: {os.path.basename(file_path)} - {str(e)}"
-                self.conversion_finished.emit(False, error_msg, 0, 1)
-                failed_files += 1
-                
-            except Exception as e:
-                error_msg = f"转换失败: {os.path.basename(file_path)} - {str(e)}"
-                self.conversion_finished.emit(False, error_msg, 0, 1)
-                failed_files += 1
-        
-        total_processed = completed_files + failed_files
-        self.conversion_finished.emit(
-            failed_files == 0, 
-            f"批量转换完成: 成功{completed_files}个, 失败{failed_files}个", 
-            completed_files, 
-            total_files
-        )
+        self.engine = ConversionEngine(output_dir, format_type, pages, dpi, workers, incremental,
+                                       cache_dir, policy=policy, priorities=priorities,
+                                       encoding=make_encoding(preset), color=color,
+                                       passthrough=passthrough, sink=sink[0], archive_scope=sink[1],
+                                       variants=variants, variant_layout='subdir')
+        self.log_path = os.path.join(output_dir, LOG_NAME)
     
-    def convert_pdf(self, file_path):
-        try:
-            doc = fitz.open(file_path)
-            if len(doc) == 0:
-                raise ValueError("PDF文件为空或无法读取")
-                
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            total_pages = len(doc) if self.pages == "all" else min(self.pages, len(doc))
-            pages_to_convert = range(total_pages) if self.pages == "all" else range(min(self.pages, len(doc)))
-            
-            for i, page_num in enumerate(pages_to_convert):
-                page = doc[page_num]
-                mat = fitz.Matrix(self.dpi/72, self.dpi/72)
-                pix = page.get_pixmap(matrix=mat)
-                
-                output_path = os.path.join(self.output_dir, 
-                                         f"{base_name}_page_{page_num+1}.{self.format_type}")
-                pix.save(output_path)
-                
-                progress = int((i + 1) / len(pages_to_convert) * 100)
-                self.progress_updated.emit(progress, f"{base_name} - 第{page_num+1}页")
-                
-            doc.close()
-        except Exception as e:
-            raise Exception(f"PDF转换错误: {str(e)}")
+    # 以下方法可在界面线程中直接调用，引擎在渲染下一页之前响应
+    def pause(self):
+        self.engine.pause()
     
-    def create_text_image(self, text, base_name):
-        """创建包含文本的图片"""
-        from PIL import Image, ImageDraw, ImageFont
-        
-        # 设置图片参数
-        width = 800
-        height = 600
-        background_color = 'white'
-        text_color = 'black'
-        
-        # 创建图片
-        img = Image.new('RGB', (width, height), background_color)
-        draw = ImageDraw.Draw(img)
-        
-        # 尝试使用系统字体，如果失败则使用默认字体
-        try:
-            font = ImageFont.truetype('arial.ttf', 20)
-        except:
-            try:
-                font = ImageFont.truetype('simhei.ttf', 20)
-            except:
-                font = ImageFont.load_default()
-        
-        # 计算文本位置（居中显示）
-        lines = []
-        if len(text) > 50:
-            # 长文本分行
-            words = text.split()
-            line = ""
-            for word in words:
-                if len(line + word) < 50:
-                    line += word + " "
-                else:
-                    lines.append(line.strip())
-                    line = word + " "
-            if line:
-                lines.append(line.strip())
-        else:
-            lines = [text]
-        
-        # 绘制文本
-        y_position = 100
-        for line in lines:
-            draw.text((50, y_position), line, fill=text_color, font=font)
-            y_position += 30
-        
-        return img
+    def resume(self):
+        self.engine.resume()
     
-    def create_text_document_image(self, text_content, base_name):
-        """创建Word文档文本内容的图片"""
-        from PIL import Image, ImageDraw, ImageFont
-        
-        # 设置图片参数
-        width = 800
-        min_height = 600
-        background_color = 'white'
-        text_color = 'black'
-        
-        # 计算所需高度
-        lines = text_content
-        total_lines = len(lines)
-        height = max(min_height, total_lines * 25 + 100)
-        
-        # 创建图片
-        img = Image.new('RGB', (width, height), background_color)
-        draw = ImageDraw.Draw(img)
-        
-        # 尝试使用系统字体
-        try:
-            font = ImageFont.truetype('arial.ttf', 16)
-        except:
-            try:
-                font = ImageFont.truetype('simhei.ttf', 16)
-            except:
-                font = ImageFont.load_default()
-        
-        # 绘制标题
-        title_font = ImageFont.load_default()
-        try:
-            title_font = ImageFont.truetype('arial.ttf', 20)
-        except:
-            try:
-                title_font = ImageFont.truetype('simhei.ttf', 20)
-            except:
-                pass
+    def cancel(self):
+        self.engine.cancel()
         
-        draw.text((50, 30), f"Word文档: {base_name}", fill=text_color, font=title_font)
-        
-        # 绘制文本内容
-        y_position = 80
-        for line in lines:
-            if y_position < height - 30:  # 确保不超出图片边界
-                draw.text((50, y_position), line, fill=text_color, font=font)
-                y_position += 25
+    def run(self):
+        progress = BatchProgress(len(self.file_list))
+        try:
+            log_file = open(self.log_path, 'a', encoding='utf-8')
+            log_file.write(f"==== {time.strftime('%Y-%m-%d %H:%M:%S')} 开始转换{len(self.file_list)}个文件 ====\n")
+        except OSError as e:
+            print(f"无法写入日志文件: {e}")
+            log_file = None
         
-        return img
-
-    def convert_word(self, file_path):
         try:
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            
-            # 方案1：使用Word转换为PDF，保持完整格式
-            if win32com is not None:
-                try:
-                    print(f"尝试使用Word转换: {file_path}")
-                    
-                    # 创建临时PDF文件
-                    temp_pdf_path = os.path.join(self.output_dir, f"{base_name}_temp.pdf")
-                    
-                    # 使用Word打开文档并另存为PDF
-                    word = win32com.client.Dispatch('Word.Application')
-                    word.Visible = False
-                    
-                    # 获取绝对路径
-                    abs_file_path = os.path.abspath(file_path)
-                    print(f"Word打开文件: {abs_file_path}")
-                    
-                    doc = word.Documents.Open(abs_file_path)
-                    print(f"Word文件打开成功，开始保存为PDF")
-                    
-                    doc.SaveAs(temp_pdf_path, FileFormat=17)  # 17 = wdFormatPDF
-                    print(f"PDF保存成功: {temp_pdf_path}")
-                    doc.Close()
-                    word.Quit()
-                    
-                    # 检查PDF文件是否存在
-                    if not os.path.exists(temp_pdf_path):
-                        raise Exception("PDF文件未生成")
-                    
-                    print(f"开始处理PDF文件: {temp_pdf_path}")
-                    
-                    # 使用PyMuPDF处理PDF
-                    pdf_doc = fitz.open(temp_pdf_path)
-                    total_pages = len(pdf_doc)
-                    print(f"PDF总页数: {total_pages}")
-                    
-                    # 确定要处理的页数
-                    pages_to_process = total_pages if self.pages == "all" else min(self.pages, total_pages)
-                    
-                    for page_num in range(pages_to_process):
-                        page = pdf_doc.load_page(page_num)
-                        
-                        # 设置缩放比例以获得高质量图片
-                        mat = fitz.Matrix(self.dpi/72, self.dpi/72)
-                        pix = page.get_pixmap(matrix=mat)
-                        
-                        # 转换为PIL图片
-                        img_data = pix.tobytes("png")
-                        img = Image.open(io.BytesIO(img_data))
-                        
-                        # 保存图片
-                        output_path = os.path.join(self.output_dir, f"{base_name}_page_{page_num+1}.{self.format_type}")
-                        img.save(output_path, format=('JPEG' if self.format_type == 'jpeg' else 'PNG'))
-                        
-                        progress = int((page_num + 1) / pages_to_process * 100)
-                        self.progress_updated.emit(progress, f"{base_name} - 页面 {page_num+1}")
-                    
-                    pdf_doc.close()
-                    
-                    # 删除临时PDF文件
-                    if os.path.exists(temp_pdf_path):
-                        os.remove(temp_pdf_path)
-                    
-                    print(f"Word转换完成，共处理 {pages_to_process} 页")
-                    return
-                    
-                except Exception as e:
-                    print(f"Word转PDF失败，回退到文本模式: {e}")
-                    # 如果Word转换失败，回退到原来的文本模式
-                    pass
-            
-            # 方案2：回退到原来的文本模式（保持原有功能作为备选）
-            doc = Document(file_path)
-            if not doc.paragraphs and not doc.tables:
-                raise ValueError("Word文档为空或无法读取内容")
-            
-            # 提取所有内嵌图片
-            images = []
-            for rel in doc.part.rels.values():
-                if "image" in rel.target_ref:
-                    try:
-                        image_data = rel.target_part.blob
-                        image = Image.open(io.BytesIO(image_data))
-                        images.append(image)
-                    except Exception as e:
-                        print(f"提取图片失败: {e}")
-                        continue
-            
-            # 创建文档文本内容的图片表示，增强编码处理
-            text_content = []
-            for para in doc.paragraphs:
-                try:
-                    text = para.text.strip()
-                    if text:
-                        # 处理文本编码
-                        if not isinstance(text, str):
-                            text = str(text)
-                        text = text.encode('utf-8', errors='ignore').decode('utf-8')
-                        text_content.append(text)
-                except Exception as e:
-                    print(f"处理段落文本失败: {e}")
-                    continue
-            
-            # 为表格内容添加文本，增强编码处理
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        try:
-                            text = cell.text.strip()
-                            if text:
-                                # 处理文本编码
-                                if not isinstance(text, str):
-                                    text = str(text)
-                                text = text.encode('utf-8', errors='ignore').decode('utf-8')
-                                row_text.append(text)
-                        except Exception as e:
-                            print(f"处理表格单元格文本失败: {e}")
-                            continue
-                    if row_text:
-                        text_content.append(" | ".join(row_text))
-            
-            # 创建文本内容的图片
-            if text_content:
-                text_img = self.create_text_document_image(text_content, base_name)
-                images.insert(0, text_img)
-            
-            # 如果没有内容，创建提示图片
-            if not images:
-                img = self.create_text_image(f"Word文档: {base_name} (无内容)")
-                images.append(img)
-            
-            total_images = len(images) if self.pages == "all" else min(self.pages, len(images))
-            images_to_save = images[:total_images]
-            
-            for i, img in enumerate(images_to_save):
-                output_path = os.path.join(self.output_dir, f"{base_name}_content_{i+1}.{self.format_type}")
-                img.save(output_path, format=('JPEG' if self.format_type == 'jpeg' else 'PNG'))
-                
-                progress = int((i + 1) / len(images_to_save) * 100)
-                self.progress_updated.emit(progress, f"{base_name} - 图片 {i+1}")
+            for event in self.engine.iter_convert(self.file_list):
+                if log_file is not None:
+                    log_file.write(log_line(event) + "\n")
+                    # 页面行依赖缓冲批量写出，文件级事件时落盘，界面收到结束信号时日志已经完整
+                    if event.kind != PAGE_DONE:
+                        log_file.flush()
+                if progress.update(event):
+                    snapshot = progress.snapshot()
+                    self.batch_progress.emit(snapshot)
+                    self.progress_updated.emit(snapshot['percent'], format_progress(snapshot))
+                    if event.timing is not None:
+                        self.timing_updated.emit(event.kind, event.timing)
                 
-        except Exception as e:
-            raise Exception(f"Word转换错误: {str(e)}")
+                if event.kind == PREFLIGHT_DONE:
+                    self.preflight_done.emit(event.message)
+                elif event.kind == FILE_STARTED:
+                    self.file_started.emit(event.message)
+                elif event.kind == FILE_FAILED:
+                    # 单个文件失败只记录日志，批次继续，最终结果在BATCH_FINISHED中汇总
+                    self.file_failed.emit(event.message)
+                elif event.kind == BATCH_FINISHED:
+                    self.conversion_finished.emit(event.success, event.message,
+                                                  event.completed, event.total)
+        finally:
+            if log_file is not None:
+                log_file.close()
 
 
 class DocumentConverter(QMainWindow):
@@ -470,13 +295,32 @@ class DocumentConverter(QMainWindow):
         output_layout.addWidget(self.output_path_label, 1)
         output_layout.addWidget(self.output_btn)
         
+        # 输出方式：大批量转换时写入压缩包，避免在共享目录上产生大量小文件
+        output_layout.addWidget(QLabel("输出方式:"))
+        self.sink_combo = QComboBox()
+        self.sink_combo.addItems(list(SINK_OPTIONS))
+        output_layout.addWidget(self.sink_combo)
+        
         # 格式选择
         format_layout = QHBoxLayout()
         format_layout.addWidget(QLabel("输出格式:"))
         self.format_combo = QComboBox()
-        self.format_combo.addItems(['jpeg', 'png'])
+        self.format_combo.addItems(['jpeg', 'png', 'webp'])
         format_layout.addWidget(self.format_combo)
         
+        # 编码预设：在编码速度和文件大小之间取舍
+        format_layout.addWidget(QLabel("编码:"))
+        self.preset_combo = QComboBox()
+        self.preset_combo.addItems(list(ENCODING_PRESETS))
+        self.preset_combo.setCurrentText('均衡')
+        format_layout.addWidget(self.preset_combo)
+        
+        # 色彩模式：黑白文档按灰度渲染可以显著减小内存占用和输出大小
+        format_layout.addWidget(QLabel("色彩:"))
+        self.color_combo = QComboBox()
+        self.color_combo.addItems(list(COLOR_OPTIONS))
+        format_layout.addWidget(self.color_combo)
+        
         # 页数选择
         pages_layout = QHBoxLayout()
         pages_layout.addWidget(QLabel("页数:"))
@@ -494,31 +338,85 @@ class DocumentConverter(QMainWindow):
         dpi_layout = QHBoxLayout()
         dpi_layout.addWidget(QLabel("清晰度:"))
         self.dpi_combo = QComboBox()
-        self.dpi_combo.addItems(['低', '中', '高'])
+        self.dpi_combo.addItems(list(CLARITY_OPTIONS))
         self.dpi_combo.setCurrentText('中')
         dpi_layout.addWidget(self.dpi_combo)
         
-        # 文件列表
-        self.file_list = QListWidget()
+        # 处理顺序：小文件优先可以让大部分文件更早出结果，不被排在前面的大文件挡住（只调整文件顺序）
+        dpi_layout.addWidget(QLabel("处理顺序:"))
+        self.order_combo = QComboBox()
+        self.order_combo.addItems(list(ORDER_POLICIES))
+        dpi_layout.addWidget(self.order_combo)
+        
+        # 并行进程数
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("并行进程:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setMinimum(1)
+        self.workers_spin.setMaximum(max(1, os.cpu_count() or 1) * 2)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        workers_layout.addWidget(self.workers_spin)
+        
+        # 增量转换：跳过上次已转换且未变化的文件
+        self.incremental_check = QCheckBox("跳过未变化的文件")
+        workers_layout.addWidget(self.incremental_check)
+        
+        # 页面缓存：再次转换同一文档（如更换格式或页数）时跳过渲染；与命令行一致，默认不启用
+        self.cache_check = QCheckBox("缓存渲染结果")
+        workers_layout.addWidget(self.cache_check)
+        
+        # 扫描件直通：整页只有一张图片的页面直接输出原图，保持扫描件自身的分辨率
+        self.passthrough_check = QCheckBox("扫描件直接输出原图")
+        workers_layout.addWidget(self.passthrough_check)
+        
+        # 多尺寸输出：每页只渲染一次，同时缩小输出网页图和缩略图
+        self.variants_check = QCheckBox("同时输出网页图和缩略图")
+        workers_layout.addWidget(self.variants_check)
+        
+        # 文件列表：模型保存数据，视图只绘制可见行，十万级文件也能流畅滚动
+        self.file_model = FileListModel(self)
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setUniformItemSizes(True)
+        # 分批布局：插入大量行后只在空闲时逐批计算布局，不会一次性遍历所有行
+        self.file_list.setLayoutMode(QListView.Batched)
+        self.file_list.setBatchSize(500)
         self.file_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         
-        # 转换按钮
+        # 转换、暂停、取消按钮
+        control_layout = QHBoxLayout()
         self.convert_btn = QPushButton("开始转换")
         self.convert_btn.clicked.connect(self.start_conversion)
+        self.pause_btn = QPushButton("暂停")
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_conversion)
+        control_layout.addWidget(self.convert_btn, 1)
+        control_layout.addWidget(self.pause_btn)
+        control_layout.addWidget(self.cancel_btn)
         
         # 进度条
         self.progress_bar = QProgressBar()
         self.progress_bar.setTextVisible(True)
         
-        # 日志区域
-        self.log_text = QTextEdit()
+        # 批次进度说明：页数、速度、预计剩余时间
+        self.status_label = QLabel("")
+        
+        # 日志区域：只保留最近LOG_MAX_LINES行，更早的行自动丢弃
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
         
         # 移除选中按钮
         remove_layout = QHBoxLayout()
         self.remove_btn = QPushButton("移除选中")
         self.remove_btn.clicked.connect(self.remove_selected_files)
         remove_layout.addWidget(self.remove_btn)
+        self.priority_btn = QPushButton("优先处理选中")
+        self.priority_btn.clicked.connect(self.toggle_priority)
+        remove_layout.addWidget(self.priority_btn)
         remove_layout.addStretch()
         
         # 添加所有组件到布局
@@ -530,8 +428,10 @@ class DocumentConverter(QMainWindow):
         layout.addLayout(format_layout)
         layout.addLayout(pages_layout)
         layout.addLayout(dpi_layout)
-        layout.addWidget(self.convert_btn)
+        layout.addLayout(workers_layout)
+        layout.addLayout(control_layout)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
         layout.addWidget(QLabel("日志:"))
         layout.addWidget(self.log_text)
         
@@ -543,6 +443,7 @@ class DocumentConverter(QMainWindow):
         # 初始化变量
         self.output_dir = ""
         self.converter_thread = None
+        self.scanners = []
         
     def select_files(self):
         files, _ = QFileDialog.getOpenFileNames(
@@ -556,35 +457,57 @@ class DocumentConverter(QMainWindow):
                     f"请先将文件转换为.docx格式后再导入。")
                 continue
                 
-            if not self.is_file_in_list(file_path):
-                item = QListWidgetItem(file_path)
-                item.setData(Qt.UserRole, file_path)
-                self.file_list.addItem(item)
+            self.file_model.add_paths([file_path])
     
     def select_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, "选择文件夹")
         if folder_path:
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    if file.lower().endswith(('.pdf', '.docx')):
-                        file_path = os.path.join(root, file)
-                        if not self.is_file_in_list(file_path):
-                            item = QListWidgetItem(file_path)
-                            item.setData(Qt.UserRole, file_path)
-                            self.file_list.addItem(item)
+            self.scan_folders([folder_path])
+    
+    def scan_folders(self, folders):
+        """在后台线程中扫描文件夹，找到的文件分批加入列表，界面不会卡住"""
+        scanner = FolderScanner(folders)
+        scanner.files_found.connect(lambda paths: self.scanned_files(scanner, paths))
+        scanner.scan_finished.connect(self.folder_scanned)
+        scanner.finished.connect(lambda: self.scanner_done(scanner))
+        self.scanners.append(scanner)
+        self.file_label.setText("正在扫描文件夹...")
+        scanner.start()
+    
+    def scanned_files(self, scanner, paths):
+        """已停止的扫描线程在停止前发出、尚未送达的批次直接丢弃，清空列表后不会再加回文件"""
+        if not scanner.stopped:
+            self.file_model.add_paths(paths)
+    
+    def folder_scanned(self, total):
+        self.log_text.appendPlainText(f"文件夹扫描完成，找到{total}个文件")
+    
+    def scanner_done(self, scanner):
+        if scanner in self.scanners:
+            self.scanners.remove(scanner)
+        if not self.scanners:
+            self.file_label.setText("选择文件:")
+    
+    def stop_scanners(self):
+        for scanner in self.scanners:
+            scanner.stop()
+        for scanner in list(self.scanners):
+            scanner.wait()
     
     def is_file_in_list(self, file_path):
-        for i in range(self.file_list.count()):
-            if self.file_list.item(i).data(Qt.UserRole) == file_path:
-                return True
-        return False
+        return self.file_model.contains(file_path)
     
     def clear_files(self):
-        self.file_list.clear()
+        self.stop_scanners()
+        self.file_model.clear()
     
     def remove_selected_files(self):
-        for item in self.file_list.selectedItems():
-            self.file_list.takeItem(self.file_list.row(item))
+        rows = [index.row() for index in self.file_list.selectionModel().selectedRows()]
+        self.file_model.remove_rows(rows)
+    
+    def toggle_priority(self):
+        rows = [index.row() for index in self.file_list.selectionModel().selectedRows()]
+        self.file_model.toggle_priority(rows)
     
     def select_output_dir(self):
         dir_path = QFileDialog.getExistingDirectory(self, "选择输出目录")
@@ -593,52 +516,99 @@ class DocumentConverter(QMainWindow):
             self.output_path_label.setText(dir_path)
     
     def start_conversion(self):
-        if self.file_list.count() == 0:
+        if self.file_model.rowCount() == 0:
             QMessageBox.warning(self, "警告", "请先添加文件！")
             return
         
+        if self.scanners:
+            QMessageBox.warning(self, "警告", "正在扫描文件夹，请等待扫描完成！")
+            return
+        
         if not self.output_dir:
             QMessageBox.warning(self, "警告", "请先选择输出目录！")
             return
         
-        file_list = []
-        for i in range(self.file_list.count()):
-            file_list.append(self.file_list.item(i).data(Qt.UserRole))
+        sink = SINK_OPTIONS[self.sink_combo.currentText()]
+        if sink[0] != 'files' and self.incremental_check.isChecked():
+            QMessageBox.warning(self, "警告", "“跳过未变化的文件”需要每页输出为单独的文件，不能与压缩包输出同时使用！")
+            return
+        
+        file_list = list(self.file_model.paths)
         
         format_type = self.format_combo.currentText()
         pages = self.pages_spin.value()
         if pages == 999:
             pages = "all"
         
-        # 根据清晰度选择设置DPI值
-        clarity = self.dpi_combo.currentText()
-        if clarity == '低':
-            dpi = 96  # 适合屏幕显示
-        elif clarity == '中':
-            dpi = 200  # 适合一般打印
-        else:  # 高
-            dpi = 300  # 适合高质量印刷
+        # 根据清晰度选择设置DPI值或目标尺寸
+        dpi = CLARITY_OPTIONS[self.dpi_combo.currentText()]
         
         self.convert_btn.setEnabled(False)
         self.progress_bar.setValue(0)
         self.log_text.clear()
         
-        self.converter_thread = ConverterThread(file_list, self.output_dir, format_type, pages, dpi)
+        workers = self.workers_spin.value()
+        incremental = self.incremental_check.isChecked()
+        cache_dir = default_cache_dir() if self.cache_check.isChecked() else None
+        policy = ORDER_POLICIES[self.order_combo.currentText()]
+        
+        self.converter_thread = ConverterThread(file_list, self.output_dir, format_type, pages, dpi,
+                                                workers, incremental, cache_dir, policy,
+                                                dict(self.file_model.priorities),
+                                                ENCODING_PRESETS[self.preset_combo.currentText()],
+                                                COLOR_OPTIONS[self.color_combo.currentText()],
+                                                'native' if self.passthrough_check.isChecked() else 'off',
+                                                sink, WEB_VARIANTS if self.variants_check.isChecked() else None)
+        self.log_text.appendPlainText(f"完整日志保存在: {self.converter_thread.log_path}")
         self.converter_thread.progress_updated.connect(self.update_progress)
         self.converter_thread.file_started.connect(self.log_file_started)
+        self.converter_thread.file_failed.connect(self.log_text.appendPlainText)
+        self.converter_thread.preflight_done.connect(self.log_text.appendPlainText)
         self.converter_thread.conversion_finished.connect(self.conversion_complete)
+        self.converter_thread.timing_updated.connect(self.log_timing)
         self.converter_thread.start()
+        self.pause_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(True)
+    
+    def toggle_pause(self):
+        if self.converter_thread is None:
+            return
+        if self.pause_btn.text() == "暂停":
+            self.converter_thread.pause()
+            self.pause_btn.setText("继续")
+            self.log_text.appendPlainText("已暂停")
+        else:
+            self.converter_thread.resume()
+            self.pause_btn.setText("暂停")
+            self.log_text.appendPlainText("继续转换")
+    
+    def cancel_conversion(self):
+        if self.converter_thread is None:
+            return
+        self.converter_thread.cancel()
+        self.pause_btn.setText("暂停")
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.log_text.appendPlainText("正在取消，等待当前页面完成...")
     
     def update_progress(self, progress, info):
         self.progress_bar.setValue(progress)
-        self.log_text.append(f"进度: {progress}% - {info}")
+        self.status_label.setText(info)
     
     def log_file_started(self, filename):
-        self.log_text.append(f"开始处理: {filename}")
+        self.log_text.appendPlainText(f"开始处理: {filename}")
+    
+    def log_timing(self, kind, timing):
+        # 单页计时只保存在运行报告中，日志里只显示批次汇总
+        if kind == BATCH_FINISHED:
+            self.log_text.appendPlainText(f"性能统计: {format_summary(timing)}")
     
     def conversion_complete(self, success, message, completed, total):
         self.convert_btn.setEnabled(True)
-        self.log_text.append(f"转换完成: {message}")
+        self.pause_btn.setText("暂停")
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.log_text.appendPlainText(f"转换完成: {message}")
         
         if success:
             QMessageBox.information(self, "完成", message)
@@ -651,25 +621,27 @@ class DocumentConverter(QMainWindow):
             
     def dropEvent(self, event: QDropEvent):
         files = [u.toLocalFile() for u in event.mimeData().urls()]
+        folders = []
         for file_path in files:
-            if os.path.isfile(file_path) and file_path.lower().endswith(('.pdf', '.docx')):
-                if not self.is_file_in_list(file_path):
-                    item = QListWidgetItem(file_path)
-                    item.setData(Qt.UserRole, file_path)
-                    self.file_list.addItem(item)
+            if os.path.isfile(file_path) and file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+                self.file_model.add_paths([file_path])
             elif os.path.isdir(file_path):
-                # 如果是文件夹，递归添加所有支持的文件
-                for root, dirs, files in os.walk(file_path):
-                    for file in files:
-                        if file.lower().endswith(('.pdf', '.docx')):
-                            full_path = os.path.join(root, file)
-                            if not self.is_file_in_list(full_path):
-                                item = QListWidgetItem(full_path)
-                                item.setData(Qt.UserRole, full_path)
-                                self.file_list.addItem(item)
+                # 如果是文件夹，在后台递归添加所有支持的文件
+                folders.append(file_path)
+        if folders:
+            self.scan_folders(folders)
+    
+    def closeEvent(self, event):
+        self.stop_scanners()
+        if self.converter_thread is not None and self.converter_thread.isRunning():
+            self.converter_thread.cancel()
+            self.converter_thread.wait()
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
+    # 打包为exe后子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     converter = DocumentConverter()
     converter.show()
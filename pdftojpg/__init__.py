@@ -0,0 +1,24 @@
+"""文档批量转图片的转换核心，不依赖PyQt5和win32com，可在无界面环境中使用"""
+from .cache import PageCache, default_cache_dir
+from .encode import EncodeOptions, PRESETS, make_encoding
+from .engine import (ConversionEngine, ConversionEvent, PREFLIGHT_DONE, FILE_STARTED, PAGE_DONE,
+                     FILE_FAILED, FILE_SKIPPED, BATCH_FINISHED, SUPPORTED_EXTENSIONS, collect_files,
+                     scan_folder)
+from .preflight import PreflightIndex, inspect_file, preflight
+from .progress import BatchProgress, format_progress
+from .report import REPORT_NAME, RunReport, format_summary
+from .sinks import FileSink, ZipSink, TarSink, make_sink
+from .sizing import Sizing, make_sizing
+from .variants import Variant, make_variant, parse_variant
+from .watch import FolderWatcher, watch
+from .server import ConversionService, make_server, serve
+from .shard import ShardBatch, ShardWorker
+
+__all__ = ['ConversionEngine', 'ConversionEvent', 'PREFLIGHT_DONE', 'FILE_STARTED', 'PAGE_DONE',
+           'FILE_FAILED', 'FILE_SKIPPED', 'BATCH_FINISHED', 'SUPPORTED_EXTENSIONS', 'collect_files',
+           'scan_folder', 'PageCache', 'default_cache_dir', 'REPORT_NAME', 'RunReport', 'format_summary',
+           'BatchProgress', 'format_progress',
+           'PreflightIndex', 'inspect_file', 'preflight', 'Sizing', 'make_sizing',
+           'EncodeOptions', 'PRESETS', 'make_encoding', 'FileSink', 'ZipSink', 'TarSink', 'make_sink',
+           'Variant', 'make_variant', 'parse_variant', 'FolderWatcher', 'watch',
+           'ConversionService', 'make_server', 'serve', 'ShardBatch', 'ShardWorker']
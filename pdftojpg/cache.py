@@ -0,0 +1,153 @@
+"""渲染页面缓存：按(文档内容哈希, 页码, DPI, 色彩空间)保存渲染后的像素数据，超出容量时按最近最少使用淘汰"""
+import hashlib
+import os
+import sqlite3
+import struct
+import time
+import zlib
+
+import fitz  # PyMuPDF
+
+
+INDEX_NAME = 'index.sqlite'
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 缓存文件头: 宽、高、通道数、是否含alpha
+HEADER = struct.Struct('<IIBB')
+
+COLORSPACES = {'rgb': fitz.csRGB, 'gray': fitz.csGRAY}
+
+# 超出上限时淘汰到上限的这个比例，之后的写入不必每次都触发淘汰
+EVICT_TARGET = 0.9
+
+
+def default_cache_dir():
+    """Windows下放在LOCALAPPDATA，其他系统放在~/.cache"""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pdftojpg', 'pages')
+
+
+class PageCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # 进程池中的多个子进程会同时读写索引，等待锁而不是立即报错
+        self.conn = sqlite3.connect(os.path.join(cache_dir, INDEX_NAME), timeout=30)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                                 key TEXT PRIMARY KEY,
+                                 size INTEGER,
+                                 last_used REAL)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS stats (
+                                 name TEXT PRIMARY KEY,
+                                 value INTEGER)""")
+        self.conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+        self.conn.commit()
+        # 命中/未命中次数和命中条目的使用时间先记在内存中，关闭时一次写入索引，
+        # 查找缓存时不写数据库，进程池中的子进程不会在每页上争用索引的写锁
+        self.counts = {'hits': 0, 'misses': 0}
+        self.touched = {}
+        # 占用字节数的估计：打开时统计一次，之后随写入累加，超出上限时在evict中重新统计
+        self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def make_key(doc_hash, page_num, dpi, colorspace):
+        return hashlib.sha256(f"{doc_hash}:{page_num}:{dpi}:{colorspace}".encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, doc_hash, page_num, dpi, colorspace='rgb'):
+        """命中时返回fitz.Pixmap，未命中返回None"""
+        return self.get_any(doc_hash, page_num, dpi, (colorspace,))[0]
+
+    def get_any(self, doc_hash, page_num, dpi, colorspaces):
+        """按顺序查找同一页在几种色彩空间下的缓存，返回(pixmap, 色彩空间)，全部未命中时为(None, None)
+
+        无论尝试几种色彩空间，统计中只计一次命中或未命中。
+        """
+        for colorspace in colorspaces:
+            key = self.make_key(doc_hash, page_num, dpi, colorspace)
+            try:
+                with open(self.entry_path(key), 'rb') as f:
+                    data = f.read()
+                width, height, n, alpha = HEADER.unpack_from(data)
+                samples = zlib.decompress(data[HEADER.size:])
+                pix = fitz.Pixmap(COLORSPACES[colorspace], width, height, samples, alpha)
+            except (OSError, ValueError, KeyError, struct.error, zlib.error):
+                continue
+            self.touched[key] = time.time()
+            self.counts['hits'] += 1
+            return pix, colorspace
+
+        self.counts['misses'] += 1
+        return None, None
+
+    def put(self, doc_hash, page_num, dpi, colorspace, pix):
+        key = self.make_key(doc_hash, page_num, dpi, colorspace)
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 渲染结果以低压缩级别的zlib保存，读取比重新光栅化快得多
+        data = HEADER.pack(pix.width, pix.height, pix.n, pix.alpha) + zlib.compress(pix.samples, 1)
+        if len(data) > self.max_bytes:
+            return
+        # 先写临时文件再替换，避免其他进程读到写了一半的缓存
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, len(data), time.time()))
+        self.touched.pop(key, None)
+        self.total += len(data)
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """总大小超出上限时删除最久未使用的条目，直到降到上限的EVICT_TARGET以下"""
+        # 其他进程也在写入，淘汰前重新统计实际大小，并先写入本进程记录的使用时间
+        self.flush()
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            self.total = total
+            return
+        target = self.max_bytes * EVICT_TARGET
+        removed = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            try:
+                os.remove(self.entry_path(key))
+            except OSError:
+                pass
+            removed.append((key,))
+            total -= size
+        with self.conn:
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", removed)
+        self.total = total
+
+    def flush(self):
+        """把内存中的命中/未命中次数和使用时间写入索引"""
+        if not self.touched and not any(self.counts.values()):
+            return
+        with self.conn:
+            self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                  [(used, key) for key, used in self.touched.items()])
+            self.conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                                  [(value, name) for name, value in self.counts.items()])
+        self.counts = {'hits': 0, 'misses': 0}
+        self.touched = {}
+
+    def stats(self):
+        """返回累计命中/未命中次数(含本进程尚未写入的部分)以及当前条目数和占用字节数"""
+        result = dict(self.conn.execute("SELECT name, value FROM stats").fetchall())
+        for name, value in self.counts.items():
+            result[name] += value
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        result['entries'] = entries
+        result['bytes'] = size
+        return result
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,258 @@
+"""命令行入口: python -m pdftojpg in/ -o out/ --dpi 200 --format jpeg --workers N
+本地转换服务: python -m pdftojpg --serve 8765"""
+import argparse
+import os
+import sys
+
+from .cache import DEFAULT_MAX_BYTES, default_cache_dir
+from .color import COLOR_MODES
+from .passthrough import PASSTHROUGH_MODES
+from .office import DEFAULT_JOB_TIMEOUT, DEFAULT_MAX_JOBS, EXPORT_BACKENDS
+from .sinks import ARCHIVE_SCOPES, DEFAULT_ARCHIVE_NAME, SINK_KINDS
+from .encode import DEFAULT_PRESET, OUTPUT_FORMATS, PRESETS, SUBSAMPLING_NAMES, make_encoding
+from .pipeline import utilisation
+from .report import REPORT_NAME, format_summary
+from .sizing import make_sizing
+from .tiled import DEFAULT_TILE_BUDGET
+from .variants import VARIANT_LAYOUTS, parse_variant
+from .watch import DEFAULT_SETTLE, DEFAULT_POLL_INTERVAL, watch
+from .server import DEFAULT_HOST, DEFAULT_WORKERS, DEFAULT_MAX_QUEUE, serve
+from .shard import DEFAULT_LEASE_TTL, DEFAULT_SHARD_PAGES, ShardWorker
+from .engine import (ConversionEngine, collect_files, PREFLIGHT_DONE, FILE_STARTED, PAGE_DONE,
+                     FILE_FAILED, FILE_SKIPPED, BATCH_FINISHED)
+
+
+def parse_pages(value):
+    if value == 'all':
+        return value
+    pages = int(value)
+    if pages < 1:
+        raise argparse.ArgumentTypeError("页数必须大于0")
+    return pages
+
+
+def parse_address(value):
+    """解析[HOST:]PORT，只给端口时监听本机"""
+    host, _, port = value.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"地址格式错误: {value}")
+    return host or DEFAULT_HOST, port
+
+
+def print_stats(stats):
+    names = {'render': '渲染', 'encode': '编码', 'write': '写入'}
+    usage = utilisation(stats)
+    print(", ".join(f"{names[stage]}利用率{usage[stage]:.0%}" for stage in names))
+    print(f"在途页面峰值{stats['peak_pending']}/{stats['max_pending']}, "
+          f"写入队列峰值{stats['peak_write_queue']}, "
+          f"共写入{stats['pages']}页 {stats['bytes_written'] / 1024 / 1024:.1f}MB")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='pdftojpg',
+        description='把PDF和Word(.docx)文档批量转换为图片（无需图形界面）')
+    parser.add_argument('inputs', nargs='*', help='要转换的文件或文件夹（文件夹会递归查找）')
+    parser.add_argument('-o', '--output', help='输出目录')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='jpeg', help='输出格式')
+    parser.add_argument('--sink', choices=SINK_KINDS, default='files',
+                        help='输出方式: files每页一个文件(默认); zip/tar流式写入压缩包，避免产生大量小文件')
+    parser.add_argument('--archive-per', choices=ARCHIVE_SCOPES, default='batch',
+                        help='压缩包范围: batch整批一个压缩包(默认), document每个文档一个')
+    parser.add_argument('--archive-name', default=DEFAULT_ARCHIVE_NAME,
+                        help=f'整批输出时压缩包的文件名(不含扩展名)，默认{DEFAULT_ARCHIVE_NAME}')
+    parser.add_argument('--color', choices=COLOR_MODES, default='rgb',
+                        help='色彩模式: rgb总是彩色(默认); auto按页检测，无颜色的页面按灰度渲染; '
+                             'bilevel在auto基础上把纯文字/线条页面写成黑白PNG')
+    parser.add_argument('--passthrough', choices=PASSTHROUGH_MODES, default='off',
+                        help='扫描件直通: 整页只有一张图片的页面直接写出嵌入的原始图片; '
+                             'match只在图片尺寸与目标尺寸相近时直通, native保持扫描件自身的分辨率')
+    parser.add_argument('--preset', choices=list(PRESETS), default=DEFAULT_PRESET,
+                        help='编码预设: fast编码最快, balanced默认, smallest文件最小')
+    parser.add_argument('--quality', type=int, default=None, help='JPEG/WebP质量(1-100)，覆盖预设')
+    parser.add_argument('--progressive', action='store_true', default=None, help='JPEG使用渐进式编码')
+    parser.add_argument('--optimize', action='store_true', default=None, help='JPEG优化霍夫曼表')
+    parser.add_argument('--subsampling', choices=list(SUBSAMPLING_NAMES), default=None,
+                        help='JPEG色度抽样，覆盖预设(默认420)')
+    parser.add_argument('--compress-level', type=int, default=None, help='PNG压缩级别(0-9)，覆盖预设')
+    parser.add_argument('--lossless', action='store_true', default=None, help='WebP使用无损压缩')
+    parser.add_argument('--dpi', type=int, default=200, help='渲染分辨率，默认200')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--longest-edge', type=int, default=None,
+                        help='按目标尺寸渲染: 每页输出图片长边的像素数，指定后忽略--dpi')
+    target.add_argument('--megapixels', type=float, default=None,
+                        help='按目标尺寸渲染: 每页输出的像素总数(百万)，指定后忽略--dpi')
+    parser.add_argument('--min-dpi', type=float, default=None, help='按目标尺寸渲染时的最小DPI')
+    parser.add_argument('--max-dpi', type=float, default=None, help='按目标尺寸渲染时的最大DPI')
+    parser.add_argument('--variant', action='append', default=[], metavar='NAME:EDGE[:FORMAT]',
+                        help='额外输出的尺寸变体，如 thumb:256 或 web:1600:webp，可重复指定；'
+                             '每页只渲染一次，变体从同一张图片缩小得到')
+    parser.add_argument('--variant-layout', choices=VARIANT_LAYOUTS, default='suffix',
+                        help='变体的输出位置: suffix与原图同目录并加名称后缀(默认), subdir放在以名称命名的子目录中')
+    parser.add_argument('--pages', type=parse_pages, default='all',
+                        help='每个文件最多转换的页数，默认all')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行渲染进程数，默认为CPU核心数')
+    parser.add_argument('--incremental', action='store_true',
+                        help='在输出目录记录转换清单，重新运行时跳过未变化的文件并补齐缺失的页面')
+    parser.add_argument('--cache', action='store_true',
+                        help='启用渲染页面缓存，再次转换同一文档时跳过光栅化')
+    parser.add_argument('--cache-dir', default=None,
+                        help=f'页面缓存目录（指定后自动启用缓存），默认{default_cache_dir()}')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='页面缓存容量上限(MB)，超出后淘汰最久未使用的页面')
+    parser.add_argument('--encoders', type=int, default=2, help='编码线程数，默认2')
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='渲染与写入之间在途页面数上限，决定内存占用，默认4')
+    parser.add_argument('--tile-budget', type=int, default=DEFAULT_TILE_BUDGET // (1024 * 1024),
+                        help='单页像素内存预算(MB)，超出的大幅面页面按条带渲染，0表示不分条带')
+    parser.add_argument('--tiles', action='store_true',
+                        help='超出预算的页面按条带写成多个分块文件，而不是拼接为一张图片')
+    parser.add_argument('--word-backend', choices=EXPORT_BACKENDS, default='auto',
+                        help='Word文档导出PDF的方式: auto有Word用Word、否则用LibreOffice(默认); '
+                             'off不导出，直接按文本回退渲染')
+    parser.add_argument('--export-workers', type=int, default=1,
+                        help='LibreOffice常驻转换进程数，默认1')
+    parser.add_argument('--export-timeout', type=float, default=DEFAULT_JOB_TIMEOUT,
+                        help=f'单个Word文档的导出超时(秒)，超时后结束该转换进程，默认{DEFAULT_JOB_TIMEOUT}')
+    parser.add_argument('--export-max-jobs', type=int, default=DEFAULT_MAX_JOBS,
+                        help=f'每个转换进程导出多少个文档后重启，默认{DEFAULT_MAX_JOBS}')
+    parser.add_argument('--order', choices=['fifo', 'shortest', 'priority'], default='fifo',
+                        help='处理顺序: fifo为按输入顺序(默认)，shortest为渲染量小的文件优先，'
+                             'priority为--priority指定的文件优先、其余按渲染量从小到大；'
+                             '调度以文件为单位，同一文件的页面总是按页码依次渲染')
+    parser.add_argument('--priority', action='append', default=[], metavar='PATH',
+                        help='配合--order priority: 优先处理的文件或文件夹(其中的所有文件)，可重复，先指定的先处理')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='跳过转换前的预检（预检会统计总页数并提前报告损坏、加密或空的文件）')
+    parser.add_argument('--stats', action='store_true', help='结束时输出各阶段利用率、耗时和队列深度')
+    parser.add_argument('--report', default=None,
+                        help=f'运行报告(JSONL)的保存路径，默认为输出目录下的{REPORT_NAME}')
+    parser.add_argument('--watch', action='store_true',
+                        help='监视模式: 持续监视输入文件夹，新到达或修改过的文件写完后立即转换，按Ctrl+C退出')
+    parser.add_argument('--watch-existing', action='store_true',
+                        help='监视模式下启动时也转换文件夹中已有的文件(配合--incremental只补齐未转换的文件)')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE,
+                        help=f'监视模式下文件大小和修改时间保持不变多少秒后视为写完，默认{DEFAULT_SETTLE}')
+    parser.add_argument('--poll', type=float, default=None, metavar='SECONDS',
+                        help=f'监视模式下不使用inotify，改为每隔SECONDS秒检查目录和已知文件的变化(默认自动，轮询间隔{DEFAULT_POLL_INTERVAL})')
+    parser.add_argument('--shard-batch', default=None, metavar='DIR',
+                        help='分片批处理: 多个进程或多台机器指定共享盘上的同一个批次目录，各自领取工作单元转换，'
+                             '全部完成后合并运行报告；批次已存在时可以不指定输入文件')
+    parser.add_argument('--shard-pages', type=int, default=DEFAULT_SHARD_PAGES,
+                        help=f'分片批处理时每个工作单元最多包含的PDF页数，默认{DEFAULT_SHARD_PAGES}')
+    parser.add_argument('--lease-ttl', type=float, default=DEFAULT_LEASE_TTL,
+                        help=f'分片批处理的租约时长(秒)，进程失联超过该时长后其单元由其他进程接管，默认{DEFAULT_LEASE_TTL:g}')
+    parser.add_argument('--serve', type=parse_address, default=None, metavar='[HOST:]PORT',
+                        help='启动本地HTTP转换服务(POST /convert上传文档，边渲染边返回页面图片)，'
+                             f'不指定HOST时只监听{DEFAULT_HOST}')
+    parser.add_argument('--serve-jobs', type=int, default=DEFAULT_WORKERS,
+                        help=f'转换服务同时运行的任务数，默认{DEFAULT_WORKERS}')
+    parser.add_argument('--serve-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f'转换服务排队等待的任务数上限，超出时返回429，默认{DEFAULT_MAX_QUEUE}')
+    parser.add_argument('--allow-path', action='append', default=[], metavar='DIR',
+                        help='允许转换服务通过path参数直接读取该目录中的文件，可重复指定')
+    parser.add_argument('-q', '--quiet', action='store_true', help='只输出错误和最终结果')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.serve is not None:
+        host, port = args.serve
+        # 各任务平分渲染进程，同时运行的任务不会占用超过--workers个进程
+        serve(host, port, workers=args.serve_jobs, max_queue=args.serve_queue,
+              allowed_roots=args.allow_path, job_workers=max(1, args.workers // max(1, args.serve_jobs)),
+              export_backend=args.word_backend)
+        return 0
+    if not args.output or not (args.inputs or args.shard_batch):
+        parser.error("需要指定输入文件和输出目录(-o)")
+
+    if args.watch:
+        folders = [path for path in args.inputs if os.path.isdir(path)]
+        if len(folders) != len(args.inputs):
+            print("监视模式的输入必须是文件夹", file=sys.stderr)
+            return 2
+        file_list = []
+    else:
+        file_list = collect_files(args.inputs)
+    if not file_list and not args.watch and not (args.shard_batch and not args.inputs):
+        print("没有找到可转换的文件", file=sys.stderr)
+        return 2
+
+    # 先指定的优先级高，未指定的文件优先级为0
+    priority_paths = {}
+    for rank, path in enumerate(reversed(args.priority)):
+        for file_path in collect_files([path]):
+            priority_paths[os.path.normpath(file_path)] = rank + 1
+    priorities = {file_path: priority_paths[os.path.normpath(file_path)]
+                  for file_path in file_list if os.path.normpath(file_path) in priority_paths}
+
+    cache_dir = args.cache_dir or (default_cache_dir() if args.cache else None)
+
+    try:
+        sizing = None
+        if args.longest_edge is not None or args.megapixels is not None:
+            sizing = make_sizing(args.longest_edge, args.megapixels, args.min_dpi, args.max_dpi)
+        variants = [parse_variant(spec) for spec in args.variant]
+        encoding = make_encoding(args.preset, quality=args.quality, progressive=args.progressive,
+                                 optimize=args.optimize, compress_level=args.compress_level,
+                                 lossless=args.lossless,
+                                 subsampling=SUBSAMPLING_NAMES.get(args.subsampling))
+        engine = ConversionEngine(args.output, args.format, args.pages, args.dpi, args.workers,
+                                  incremental=args.incremental, cache_dir=cache_dir,
+                                  cache_size=args.cache_size * 1024 * 1024,
+                                  encoders=args.encoders, queue_size=args.queue_size,
+                                  tile_budget=args.tile_budget * 1024 * 1024, tiles=args.tiles,
+                                  report_path=args.report, preflight=not args.no_preflight,
+                                  policy=args.order, priorities=priorities, sizing=sizing, encoding=encoding,
+                                  color=args.color, passthrough=args.passthrough, sink=args.sink,
+                                  archive_scope=args.archive_per, archive_name=args.archive_name,
+                                  variants=variants, variant_layout=args.variant_layout,
+                                  export_backend=args.word_backend, export_workers=args.export_workers,
+                                  export_timeout=args.export_timeout, export_max_jobs=args.export_max_jobs)
+    except Exception as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    def report(event):
+        if event.kind == PREFLIGHT_DONE and not args.quiet:
+            print(event.message)
+        elif event.kind == FILE_STARTED and not args.quiet:
+            print(f"开始处理: {event.message}")
+        elif event.kind == PAGE_DONE and not args.quiet:
+            print(f"进度: {event.progress}% - {event.message}")
+        elif event.kind == FILE_SKIPPED and not args.quiet:
+            print(event.message)
+        elif event.kind == FILE_FAILED:
+            print(event.message, file=sys.stderr)
+        elif event.kind == BATCH_FINISHED:
+            print(f"转换完成: {event.message}")
+
+    if args.shard_batch:
+        try:
+            worker = ShardWorker(engine, args.shard_batch, args.lease_ttl)
+            summary = worker.run(file_list, report, args.shard_pages)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 2
+        print(f"分片批处理完成: {format_summary(summary)}")
+        return 0 if set(summary['files']) <= {'done', 'skipped'} else 1
+
+    if args.watch:
+        try:
+            watch(engine, args.inputs, report, settle=args.settle, existing=args.watch_existing,
+                  poll_interval=args.poll or DEFAULT_POLL_INTERVAL, use_inotify=args.poll is None)
+        except KeyboardInterrupt:
+            print("已停止监视")
+        return 0
+
+    result = engine.convert(file_list, report)
+    if args.stats and engine.last_stats:
+        print_stats(engine.last_stats)
+        print(format_summary(result.timing))
+    return 0 if result.success else 1
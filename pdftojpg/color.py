@@ -0,0 +1,78 @@
+"""按页选择最省的色彩空间：没有颜色的页面按灰度渲染，纯线条页面可写成黑白PNG
+
+色彩模式:
+- rgb: 总是按RGB渲染（默认，与以前的输出一致）
+- auto: 先以很低的分辨率试渲染，没有颜色的页面按灰度渲染，内存、渲染带宽和输出大小约为RGB的1/3
+- bilevel: 在auto的基础上，输出PNG时把只有文字和线条的灰度页面写成1位黑白图片
+
+试渲染和正式渲染共用同一个显示列表，页面内容只解析一次。
+"""
+from PIL import ImageChops
+
+from .encode import pixmap_to_image
+
+
+COLOR_MODES = ('rgb', 'auto', 'bilevel')
+
+# 试渲染的分辨率，细线条在这个分辨率下仍会留下可检测的色偏
+PROBE_DPI = 24
+
+# R/G/B三个通道之间的最大差值不超过该值时视为无颜色，容忍扫描件轻微的色偏
+CHROMA_TOLERANCE = 8
+
+# 灰度直方图中，中间调像素占(深色+中间调)像素的比例不超过该值时视为纯线条页面；
+# 文字的抗锯齿边缘约占0.6~0.7，灰色底纹和照片接近1
+BILEVEL_MAX_MIDTONE_RATIO = 0.8
+DARK_LEVEL = 16
+LIGHT_LEVEL = 240
+
+# 转为黑白时的阈值
+BILEVEL_THRESHOLD = 128
+
+
+def is_colorless(source):
+    """source为页面或显示列表，试渲染后检查是否只有灰色"""
+    import fitz  # PyMuPDF
+
+    zoom = PROBE_DPI / 72
+    probe = source.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    red, green, blue = pixmap_to_image(probe).split()
+    return all(ImageChops.difference(a, b).getextrema()[1] <= CHROMA_TOLERANCE
+               for a, b in ((red, green), (green, blue)))
+
+
+def is_line_art(pix):
+    """灰度pixmap是否只有文字和线条，没有大面积的灰色"""
+    histogram = pixmap_to_image(pix).histogram()
+    dark = sum(histogram[:DARK_LEVEL])
+    midtones = sum(histogram[DARK_LEVEL:LIGHT_LEVEL])
+    if dark + midtones == 0:
+        # 空白页
+        return True
+    return midtones / (dark + midtones) <= BILEVEL_MAX_MIDTONE_RATIO
+
+
+def to_bilevel(pix):
+    """把灰度pixmap转为1位黑白PIL图片，返回的图片不再引用pix的内存"""
+    return pixmap_to_image(pix).point(lambda value: 255 if value >= BILEVEL_THRESHOLD else 0, '1')
+
+
+def choose_colorspace(source, color):
+    """按色彩模式选择页面的渲染色彩空间('rgb'或'gray')"""
+    if color == 'rgb':
+        return 'rgb'
+    return 'gray' if is_colorless(source) else 'rgb'
+
+
+def cached_colorspaces(color):
+    """查找缓存时依次尝试的色彩空间"""
+    return ('rgb',) if color == 'rgb' else ('gray', 'rgb')
+
+
+def finish_pixmap(pix, color, format_type, timing):
+    """渲染或读取缓存之后的最后一步：纯线条的灰度页面按需转为黑白，并记录该页的输出色彩空间"""
+    if pix.n == 1 and color == 'bilevel' and format_type == 'png' and is_line_art(pix):
+        timing['colorspace'] = 'bilevel'
+        return to_bilevel(pix)
+    timing['colorspace'] = 'gray' if pix.n == 1 else 'rgb'
+    return pix
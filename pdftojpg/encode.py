@@ -0,0 +1,89 @@
+"""图片编码：PDF和Word两条转换路径共用的输出写入
+
+编码参数由EncodeOptions描述，提供三个预设：
+- fast: 编码最快，JPEG质量85，PNG压缩级别1，WebP方法0
+- balanced: 默认，与此前的输出一致(JPEG质量95，PNG压缩级别6)
+- smallest: 文件最小，JPEG开启霍夫曼优化和渐进式，PNG压缩级别9，WebP方法6
+"""
+from collections import namedtuple
+
+from PIL import Image
+
+
+# 与此前MuPDF写JPEG时的默认质量一致
+JPEG_QUALITY = 95
+
+PIL_MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+OUTPUT_FORMATS = ('jpeg', 'png', 'webp')
+
+# 色度抽样: 0为4:4:4，1为4:2:2，2为4:2:0
+SUBSAMPLING_NAMES = {'444': 0, '422': 1, '420': 2}
+
+# quality用于JPEG和有损WebP；optimize/progressive/subsampling只用于JPEG；
+# compress_level为PNG的zlib压缩级别(0-9)；webp_method为WebP的速度/压缩权衡(0最快，6最小)
+EncodeOptions = namedtuple('EncodeOptions', ['preset', 'quality', 'optimize', 'progressive', 'subsampling',
+                                             'compress_level', 'webp_method', 'lossless'])
+
+PRESETS = {
+    'fast': EncodeOptions('fast', 85, False, False, 2, 1, 0, False),
+    'balanced': EncodeOptions('balanced', JPEG_QUALITY, False, False, 2, 6, 4, False),
+    'smallest': EncodeOptions('smallest', 80, True, True, 2, 9, 6, False),
+}
+
+DEFAULT_PRESET = 'balanced'
+
+
+def make_encoding(preset=DEFAULT_PRESET, **overrides):
+    """从预设创建编码参数，overrides中不为None的项覆盖预设，参数无效时抛出ValueError"""
+    if preset not in PRESETS:
+        raise ValueError(f"不支持的编码预设: {preset}")
+    options = PRESETS[preset]._replace(**{key: value for key, value in overrides.items() if value is not None})
+    if not 1 <= options.quality <= 100:
+        raise ValueError("图片质量必须在1到100之间")
+    if options.subsampling not in SUBSAMPLING_NAMES.values():
+        raise ValueError(f"不支持的色度抽样: {options.subsampling}")
+    if not 0 <= options.compress_level <= 9:
+        raise ValueError("PNG压缩级别必须在0到9之间")
+    if not 0 <= options.webp_method <= 6:
+        raise ValueError("WebP方法必须在0到6之间")
+    return options
+
+
+def pixmap_to_image(pix):
+    """直接在pixmap的像素缓冲区上构造PIL图片，不复制数据
+
+    返回的图片引用pix的内存，使用期间必须保持pix存活。
+    """
+    mode = PIL_MODES[pix.n]
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, 'raw', mode, pix.stride, 1)
+
+
+def save_image(img, output_path, format_type, options=None):
+    """保存PIL图片，options为None时使用默认预设"""
+    if options is None:
+        options = PRESETS[DEFAULT_PRESET]
+    if format_type == 'jpeg':
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(output_path, format='JPEG', quality=options.quality, optimize=options.optimize,
+                 progressive=options.progressive, subsampling=options.subsampling)
+    elif format_type == 'webp':
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+        img.save(output_path, format='WEBP', quality=options.quality, method=options.webp_method,
+                 lossless=options.lossless)
+    else:
+        img.save(output_path, format='PNG', compress_level=options.compress_level)
+
+
+def save_pixmap(pix, output_path, format_type, options=None):
+    """保存渲染结果，不经过PNG中转
+
+    未指定编码参数的PNG直接使用MuPDF自带的写入器；其余交给Pillow在同一块缓冲区上编码，
+    JPEG实测比MuPDF的JPEG写入器快数倍。
+    """
+    if format_type == 'png' and options is None:
+        pix.save(output_path, output='png')
+    else:
+        save_image(pixmap_to_image(pix), output_path, format_type, options)
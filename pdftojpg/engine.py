@@ -0,0 +1,800 @@
+"""批量转换引擎：把文件列表转换为图片，通过事件迭代器或回调报告进度"""
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from .render import page_output_path, render_output, render_pdf_pages, split_pages, count_pages
+from .manifest import Manifest, file_hash
+from .cache import PageCache, DEFAULT_MAX_BYTES
+from .color import COLOR_MODES
+from .passthrough import PASSTHROUGH_MODES
+from .office import DEFAULT_JOB_TIMEOUT, DEFAULT_MAX_JOBS, check_backend, make_backend
+from .sinks import ARCHIVE_SCOPES, DEFAULT_ARCHIVE_NAME, SINK_KINDS, make_sink
+from .encode import make_encoding
+from .pipeline import PagePipeline, merge_stats
+from .report import REPORT_NAME, RunReport, page_timing
+from .preflight import preflight
+from .sizing import Sizing
+from .scheduler import ConversionCancelled, JobControl, init_worker, order_files
+from .tiled import DEFAULT_TILE_BUDGET
+from .variants import VARIANT_LAYOUTS, variant_dirs, variant_outputs
+from . import word
+
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+
+# 事件类型
+PREFLIGHT_DONE = 'preflight'
+FILE_STARTED = 'file_started'
+PAGE_DONE = 'progress'
+FILE_FAILED = 'file_failed'
+FILE_SKIPPED = 'file_skipped'
+BATCH_FINISHED = 'finished'
+
+# kind为事件类型；message为文件名、页面说明、跳过原因或错误信息；
+# progress为当前文件的百分比进度；success仅用于BATCH_FINISHED；
+# completed/total在PAGE_DONE中为当前文件的已完成页数/总页数，在BATCH_FINISHED中为文件数，
+# 在PREFLIGHT_DONE中为通过预检的文件数/已知总页数；
+# timing在PAGE_DONE中为该页各阶段计时，在BATCH_FINISHED中为批次汇总，在PREFLIGHT_DONE中为预检汇总；
+# outputs在PAGE_DONE中为该页写出的文件路径列表(压缩包输出时为包内条目对应的输出目录路径)
+ConversionEvent = namedtuple('ConversionEvent',
+                             ['kind', 'message', 'progress', 'success', 'completed', 'total', 'timing',
+                              'outputs'],
+                             defaults=('', 0, True, 0, 0, None, None))
+
+
+class ConversionEngine:
+    def __init__(self, output_dir, format_type='jpeg', pages='all', dpi=200, workers=1,
+                 incremental=False, cache_dir=None, cache_size=DEFAULT_MAX_BYTES,
+                 encoders=2, queue_size=4, tile_budget=DEFAULT_TILE_BUDGET, tiles=False,
+                 report_path=None, preflight=True, policy='fifo', priorities=None, sizing=None,
+                 encoding=None, color='rgb', passthrough='off', sink='files', archive_scope='batch',
+                 archive_name=DEFAULT_ARCHIVE_NAME, variants=None, variant_layout='suffix',
+                 export_backend='auto', export_workers=1, export_timeout=DEFAULT_JOB_TIMEOUT,
+                 export_max_jobs=DEFAULT_MAX_JOBS, page_ranges=None):
+        self.output_dir = output_dir
+        self.format_type = format_type
+        self.pages = pages
+        # sizing为Sizing时按目标尺寸逐页计算DPI，代替固定的dpi
+        self.dpi = sizing if sizing is not None else dpi
+        # workers > 1 时使用进程池并行渲染PDF页面
+        self.workers = max(1, int(workers))
+        self.pool = None
+        self.pending_pdf = {}
+        self.next_submit = 0
+        # incremental为True时在输出目录维护清单，跳过内容和参数都未变化的文件
+        self.incremental = incremental
+        self.manifest = None
+        self.prepared = {}
+        self.current_file = None
+        # cache_dir不为空时启用渲染页面缓存，重复转换同一文档时跳过光栅化
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.cache = None
+        self.hashes = {}
+        # 渲染→编码→写入流水线：encoders为编码线程数，queue_size为在途页面上限（决定内存占用）
+        self.encoders = encoders
+        # encoding为编码参数(EncodeOptions)，默认为balanced预设
+        self.encoding = encoding or make_encoding()
+        # color为色彩模式：rgb总是彩色，auto按页检测无颜色的页面按灰度渲染，bilevel还把纯线条页面写成黑白PNG
+        if color not in COLOR_MODES:
+            raise ValueError(f"不支持的色彩模式: {color}")
+        self.color = color
+        # passthrough为扫描件直通模式(off/match/native)，整页只有一张图片的页面直接写出嵌入的原始图片
+        if passthrough not in PASSTHROUGH_MODES:
+            raise ValueError(f"不支持的直通模式: {passthrough}")
+        self.passthrough = passthrough
+        # sink为输出方式：files每页一个文件，zip/tar流式写入压缩包；
+        # archive_scope为batch时整批一个压缩包(archive_name.zip)，为document时每个文档一个({base}.zip)
+        if sink not in SINK_KINDS:
+            raise ValueError(f"不支持的输出方式: {sink}")
+        if archive_scope not in ARCHIVE_SCOPES:
+            raise ValueError(f"不支持的压缩包范围: {archive_scope}")
+        if sink != 'files' and incremental:
+            raise ValueError("增量转换需要每页输出为单独的文件，不能与压缩包输出同时使用")
+        self.sink_kind = sink
+        self.archive_scope = archive_scope
+        self.archive_name = archive_name
+        self.sink = None
+        # variants为Variant列表，每页渲染一次后额外输出这些较小的尺寸(网页图、缩略图等)；
+        # variant_layout为suffix时变体与原图同目录并加名称后缀，为subdir时放在以变体名称命名的子目录中
+        if variant_layout not in VARIANT_LAYOUTS:
+            raise ValueError(f"不支持的变体输出布局: {variant_layout}")
+        self.variants = list(variants or [])
+        if len({variant.name for variant in self.variants}) != len(self.variants):
+            raise ValueError("变体名称不能重复")
+        self.variant_layout = variant_layout
+        # export_backend为Word文档导出PDF的方式(auto/word/libreoffice/off)，导出后端在整个批次中保持打开；
+        # export_workers为LibreOffice常驻转换进程数，后续的.docx会提前提交导出；
+        # export_timeout为单个文档的导出超时(秒)，export_max_jobs为每个进程导出多少个文档后重启
+        check_backend(export_backend)
+        self.export_backend = export_backend
+        self.export_workers = max(1, int(export_workers))
+        self.export_timeout = export_timeout
+        self.export_max_jobs = export_max_jobs
+        self.exporter = None
+        self.export_dir = None
+        self.exports = {}
+        # 为True时进程池和导出后端由start_workers/stop_workers管理，不随批次关闭
+        self.persistent = False
+        # 并行输出压缩包时子进程先把页面写到本地临时目录，再由主进程依次写入压缩包
+        self.spool_dir = None
+        self.queue_size = queue_size
+        self.pipeline = None
+        self.worker_stats = None
+        self.last_stats = None
+        # 整页像素超过tile_budget字节的页面按条带渲染；tiles为True时把这些页面写成分块文件
+        self.tile_budget = tile_budget
+        self.tiles = tiles
+        # 每个批次结束时把运行报告写到report_path，默认为输出目录下的.pdftojpg_report.jsonl
+        self.report_path = report_path or os.path.join(output_dir, REPORT_NAME)
+        self.report = None
+        self.last_report = None
+        # preflight为True时在转换前并行预检所有文件，得到准确的总页数并提前拒绝不可用的文件
+        self.preflight = preflight
+        self.index = None
+        # policy为文件调度策略(fifo/shortest/priority)，priorities为{文件路径: 优先级}，数值大的先处理
+        self.policy = policy
+        self.priorities = priorities or {}
+        # page_ranges为{文件路径: (起始页, 结束页)}，页码从0开始、不含结束页，PDF只转换该范围内的页面(分片批处理)
+        self.page_ranges = page_ranges or {}
+        # 暂停/取消控制，可以在其他线程中调用pause/resume/cancel
+        self.control = JobControl()
+
+        # 确保输出目录存在
+        if not os.path.exists(self.output_dir):
+            try:
+                os.makedirs(self.output_dir)
+            except Exception as e:
+                raise Exception(f"无法创建输出目录: {str(e)}")
+        if self.sink_kind == 'files':
+            for directory in variant_dirs(self.output_dir, self.variants, self.variant_layout):
+                os.makedirs(directory, exist_ok=True)
+
+        # 检查目录写入权限
+        if not os.access(self.output_dir, os.W_OK):
+            raise Exception(f"输出目录无写入权限: {self.output_dir}")
+
+    def convert(self, file_list, callback=None):
+        """同步转换整个批次，每个事件都会传给callback，返回BATCH_FINISHED事件"""
+        event = None
+        for event in self.iter_convert(file_list):
+            if callback is not None:
+                callback(event)
+        return event
+
+    def pause(self):
+        """暂停转换：主进程和子进程在渲染下一页之前停下"""
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        """取消转换：正在处理的文件停止后产出BATCH_FINISHED，剩余文件不再处理"""
+        self.control.cancel()
+
+    def iter_convert(self, file_list):
+        """逐个产出ConversionEvent；提前停止迭代会关闭进程池并取消未开始的任务"""
+        self.control.reset()
+        if self.incremental:
+            self.manifest = Manifest(self.output_dir)
+        if self.cache_dir:
+            self.cache = PageCache(self.cache_dir, self.cache_size)
+        self.sink = make_sink(self.sink_kind, self.output_dir, self.archive_scope, self.archive_name)
+        if self.sink.archive and self.workers > 1:
+            self.spool_dir = tempfile.mkdtemp(prefix='pdftojpg_spool_')
+            for directory in variant_dirs(self.spool_dir, self.variants, self.variant_layout):
+                os.makedirs(directory)
+        self.pipeline = PagePipeline(self.encoders, self.queue_size, self.encoding, self.sink)
+        self.worker_stats = None
+        self.report = RunReport(self.report_path)
+        self.report.encoding = self.encoding._asdict()
+        # 已经调用start_workers时沿用常驻的进程池和导出后端，否则只在本批次内使用
+        owns_workers = not self.persistent
+        if owns_workers:
+            self.start_workers()
+        self.next_submit = 0
+
+        finished = False
+        try:
+            yield from self.process_files(file_list)
+            finished = not self.control.cancelled.is_set()
+        finally:
+            if self.pool is not None:
+                for pending in self.pending_pdf.values():
+                    if not isinstance(pending, Exception):
+                        for future in pending[2]:
+                            future.cancel()
+            for file_path in list(self.exports):
+                self.discard_export(file_path)
+            if owns_workers:
+                self.stop_workers()
+            self.pipeline.close()
+            self.report.close()
+            # 批次被取消或提前停止迭代时整批压缩包保留.part文件名
+            self.sink.close(finished)
+            self.sink = None
+            if self.spool_dir is not None:
+                shutil.rmtree(self.spool_dir, ignore_errors=True)
+                self.spool_dir = None
+            self.last_stats = self.stage_stats()
+            self.pipeline = None
+            self.report = None
+            self.index = None
+            self.pending_pdf = {}
+            self.prepared = {}
+            self.hashes = {}
+            if self.cache is not None:
+                self.cache.close()
+                self.cache = None
+            if self.manifest is not None:
+                self.manifest.close()
+                self.manifest = None
+
+    def start_workers(self):
+        """启动进程池和Word导出后端，在之后的多个批次之间保持运行(如监视模式)，直到调用stop_workers"""
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                            initargs=(self.control.paused, self.control.cancelled))
+        # 转换进程和Word实例都在第一次导出时才启动
+        self.exporter = make_backend(self.export_backend, self.export_workers, self.export_max_jobs,
+                                     self.export_timeout)
+        if self.exporter is not None:
+            self.export_dir = tempfile.mkdtemp(prefix='pdftojpg_export_')
+        self.persistent = True
+
+    def stop_workers(self):
+        self.persistent = False
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        if self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+            shutil.rmtree(self.export_dir, ignore_errors=True)
+            self.export_dir = None
+
+    def process_files(self, file_list):
+        total_files = len(file_list)
+        completed_files = 0
+        failed_files = 0
+        self.skipped_files = 0
+        cache_before = self.cache.stats() if self.cache is not None else None
+
+        if self.preflight:
+            file_list = yield from self.run_preflight(file_list)
+        else:
+            file_list = self.schedule(file_list)
+
+        cancelled = False
+        try:
+            for index, file_path in enumerate(file_list):
+                self.control.checkpoint()
+                if self.pool is not None:
+                    self.fill_pool(file_list, index)
+                if self.exporter is not None:
+                    self.prefetch_exports(file_list, index)
+                self.current_file = file_path
+                self.report.start_file(file_path)
+                succeeded = False
+                try:
+                    yield ConversionEvent(FILE_STARTED, os.path.basename(file_path))
+                    self.sink.begin_document(os.path.splitext(os.path.basename(file_path))[0])
+                    skipped_before = self.skipped_files
+                    yield from self.convert_file(file_path)
+                    if self.manifest is not None:
+                        self.manifest.finish(file_path)
+                    completed_files += 1
+                    succeeded = True
+                    self.report.finish_file('skipped' if self.skipped_files > skipped_before else 'done')
+
+                except FileNotFoundError as e:
+                    error_msg = f"文件未找到: {str(e)}"
+                    self.report.finish_file('failed', error_msg)
+                    yield ConversionEvent(FILE_FAILED, error_msg)
+                    failed_files += 1
+
+                except ValueError as e:
+                    error_msg = f"文件格式问题: {os.path.basename(file_path)} - {str(e)}"
+                    self.report.finish_file('failed', error_msg)
+                    yield ConversionEvent(FILE_FAILED, error_msg)
+                    failed_files += 1
+
+                except Exception as e:
+                    error_msg = f"转换失败: {os.path.basename(file_path)} - {str(e)}"
+                    self.report.finish_file('failed', error_msg)
+                    yield ConversionEvent(FILE_FAILED, error_msg)
+                    failed_files += 1
+
+                finally:
+                    # 出错时丢弃本文件尚未写完的页面，不影响下一个文件
+                    self.pipeline.discard()
+                    # 失败或取消的文档不把压缩包改为正式文件名
+                    self.sink.end_document(succeeded)
+                    self.pending_pdf.pop(file_path, None)
+                    self.discard_export(file_path)
+                    self.prepared.pop(file_path, None)
+                    self.hashes.pop(file_path, None)
+        except ConversionCancelled:
+            # 被取消的文件没有在清单中标记完成，增量模式下次运行会从断点继续
+            cancelled = True
+            self.report.finish_file('cancelled')
+
+        if cancelled:
+            message = (f"转换已取消: 成功{completed_files}个, 失败{failed_files}个, "
+                       f"未处理{total_files - completed_files - failed_files}个")
+        else:
+            message = f"批量转换完成: 成功{completed_files}个, 失败{failed_files}个"
+        if self.skipped_files:
+            message += f", 其中未变化跳过{self.skipped_files}个"
+        if self.cache is not None:
+            cache_after = self.cache.stats()
+            message += (f"; 页面缓存命中{cache_after['hits'] - cache_before['hits']}次, "
+                        f"未命中{cache_after['misses'] - cache_before['misses']}次")
+        summary = self.write_report()
+        yield ConversionEvent(
+            BATCH_FINISHED,
+            message,
+            success=failed_files == 0 and not cancelled,
+            completed=completed_files,
+            total=total_files,
+            timing=summary
+        )
+
+    def schedule(self, file_list):
+        """按调度策略排列文件，有预检结果时按估算的渲染量，否则按文件大小"""
+        return order_files(file_list, self.policy, self.index, self.dpi, self.page_limit, self.priorities)
+
+    def run_preflight(self, file_list):
+        """预检所有文件，产出PREFLIGHT_DONE事件，返回调整后的文件顺序：预检不合格的文件排在最前，尽早报告"""
+        self.index = preflight(file_list, self.pool)
+        rejected = [file_path for file_path in file_list if self.index.error(file_path)]
+        file_list = rejected + self.schedule([file_path for file_path in file_list
+                                              if not self.index.error(file_path)])
+        summary = self.index.summary(file_list, self.page_limit)
+        self.report.preflight = {key: summary[key] for key in ('rejected', 'known_pages', 'image_pages', 'seconds')}
+        message = f"预检完成: {len(file_list)}个文件, 共{summary['known_pages']}页"
+        if rejected:
+            message += f", {len(rejected)}个文件无法转换"
+        yield ConversionEvent(PREFLIGHT_DONE, message, completed=len(file_list) - len(rejected),
+                              total=summary['known_pages'], timing=summary)
+        return file_list
+
+    def write_report(self):
+        """写出本批次的运行报告并返回汇总，写入失败不影响转换结果"""
+        summary = self.report.summary(self.stage_stats())
+        self.last_report = self.report
+        try:
+            self.report.write(summary)
+        except Exception as e:
+            print(f"写入运行报告失败: {e}")
+        return summary
+
+    def timed(self, stage, func, *args):
+        """调用func并把耗时计入当前文件的stage阶段"""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.report.stage(stage, time.perf_counter() - start)
+
+    def convert_file(self, file_path):
+        # 检查文件是否存在
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+
+        # 检查文件大小
+        if os.path.getsize(file_path) == 0:
+            raise ValueError("文件为空")
+
+        # 预检发现的问题（损坏、加密、空文档）直接报告，不再打开文件
+        if self.index is not None and self.index.error(file_path):
+            raise ValueError(self.index.error(file_path))
+
+        # 根据文件扩展名和内容类型选择转换方法
+        file_ext = os.path.splitext(file_path)[1].lower()
+
+        unchanged, _ = self.prepare_file(file_path)
+        if unchanged:
+            self.skipped_files += 1
+            yield ConversionEvent(FILE_SKIPPED, f"{os.path.basename(file_path)} - 内容和参数未变化，已跳过", 100)
+            return
+
+        if file_ext == '.pdf':
+            yield from self.convert_pdf(file_path)
+        elif file_ext in ['.docx', '.doc']:
+            try:
+                # 对于.doc文件，自动调用Word转换为docx
+                if file_ext == '.doc':
+                    docx_path = None
+                    try:
+                        docx_path = file_path + "_tmp_autoconvert.docx"
+                        self.timed('word_export', word.doc_to_docx, file_path, docx_path)
+                        # 用docx逻辑处理
+                        yield from self.convert_word(docx_path)
+                    except Exception as e:
+                        raise ValueError(f"自动调用Word转换doc为docx失败: {str(e)}。请用Word手动另存为docx后再试。")
+                    finally:
+                        # 删除临时文件
+                        if docx_path and os.path.exists(docx_path):
+                            os.remove(docx_path)
+
+                # 对于.docx文件，进行详细检查
+                elif file_ext == '.docx':
+                    # 只读取和解析一次，校验、内容检查和回退渲染共用
+                    document = self.timed('parse', word.load_docx, file_path)
+                    try:
+                        yield from self.convert_word(file_path, document)
+                    except Exception as e:
+                        raise ValueError(f"Word文件处理失败: {str(e)}")
+                    finally:
+                        document.close()
+
+            except ValueError as e:
+                raise e
+            except Exception as e:
+                raise ValueError(f"Word文件处理异常: {str(e)}")
+
+        else:
+            raise ValueError(f"不支持的文件格式: {file_ext}\n当前仅支持PDF和Word文件格式")
+
+    def page_limit(self, page_count):
+        return page_count if self.pages == "all" else min(self.pages, page_count)
+
+    def settings(self):
+        """影响输出内容的转换参数，参数变化后需要重新转换"""
+        dpi = self.dpi._asdict() if isinstance(self.dpi, Sizing) else self.dpi
+        return {'dpi': dpi, 'format': self.format_type, 'pages': self.pages,
+                'encoding': self.encoding._asdict(), 'color': self.color, 'passthrough': self.passthrough,
+                'variants': [variant._asdict() for variant in self.variants],
+                'variant_layout': self.variant_layout}
+
+    def prepare_file(self, file_path):
+        """查询增量清单，返回(unchanged, valid_outputs)，非增量模式下总是需要转换"""
+        if self.manifest is None:
+            return False, set()
+        if file_path not in self.prepared:
+            self.prepared[file_path] = self.manifest.begin(file_path, self.settings())
+        return self.prepared[file_path]
+
+    def document_hash(self, file_path):
+        """渲染缓存使用的文档内容哈希，增量模式下直接复用清单中的记录"""
+        if self.cache is None:
+            return None
+        if file_path not in self.hashes:
+            digest = self.manifest.recorded_hash(file_path) if self.manifest is not None else None
+            if digest is None and file_path == self.current_file:
+                digest = self.timed('hash', file_hash, file_path)
+            # 并行模式下预先提交的后续文件在这里算哈希，不计入当前文件的耗时
+            self.hashes[file_path] = digest or file_hash(file_path)
+        return self.hashes[file_path]
+
+    def cache_config(self):
+        return (self.cache_dir, self.cache_size) if self.cache is not None else None
+
+    def pipeline_config(self, file_path=None):
+        """子进程内部的流水线参数：各进程已经占满CPU，只用一个编码线程
+
+        预检给出页面尺寸时，按最大一页的内存估算缩短在途页面数，使每个进程的在途像素不超过条带预算。
+        """
+        max_pending = max(2, self.queue_size // 2)
+        page_bytes = self.index.max_page_bytes(file_path, self.dpi) if self.index is not None else None
+        if page_bytes and self.tile_budget:
+            max_pending = max(1, min(max_pending, self.tile_budget // page_bytes))
+        return (1, max_pending, self.encoding)
+
+    def stage_stats(self):
+        """合并主进程和所有子进程的流水线统计，可在转换过程中随时调用"""
+        if self.pipeline is None:
+            return self.last_stats
+        stats = self.pipeline.stats()
+        if self.worker_stats is not None:
+            # 并行模式下主进程流水线只处理Word文件，没有页面时不计入，避免空闲时间拉低利用率
+            stats = merge_stats(merge_stats(None, self.worker_stats), stats) if stats['pages'] else \
+                merge_stats(None, self.worker_stats)
+        stats['depth'] = self.pipeline.depth()
+        return stats
+
+    def write_pages(self, sources, total_pages, done_pages, describe):
+        """把(页码, 图片, 输出文件列表, 计时字典)依次送入流水线，按提交顺序为写完的页面产出进度事件
+
+        sources通常是边迭代边渲染的生成器，流水线满时会阻塞渲染，从而限制内存占用；
+        图片为None表示该页已经按条带直接写出；输出文件列表的第一项为原尺寸输出，其余为尺寸变体。
+        """
+        for page_num, source, outputs, timing in sources:
+            self.control.checkpoint()
+            for finished in self.pipeline.submit(source, outputs[0], self.format_type,
+                                                 (page_num, outputs, timing), timing,
+                                                 self.variant_outputs(outputs[0])):
+                done_pages += 1
+                yield self.page_written(finished, done_pages, total_pages, describe)
+        for finished in self.pipeline.flush():
+            done_pages += 1
+            yield self.page_written(finished, done_pages, total_pages, describe)
+
+    def page_written(self, finished, done_pages, total_pages, describe):
+        page_num, outputs, timing = finished
+        for output_path in outputs:
+            self.record_output(output_path)
+        self.report.add_page(timing)
+        progress = int(done_pages / total_pages * 100)
+        return ConversionEvent(PAGE_DONE, describe(page_num), progress, completed=done_pages,
+                               total=total_pages, timing=timing, outputs=outputs)
+
+    def render_sources(self, open_doc, page_numbers, base_name, doc_hash):
+        """按顺序渲染页面，产出(页码, pixmap, 输出文件列表, 计时字典)"""
+        for page_num in page_numbers:
+            timing = page_timing(page_num)
+            start = time.perf_counter()
+            output_path = page_output_path(self.output_dir, base_name, page_num, self.format_type)
+            pix, outputs = render_output(open_doc, page_num, self.dpi, output_path,
+                                         self.format_type, self.cache, doc_hash,
+                                         self.tile_budget, self.tiles, timing, self.encoding, self.color,
+                                         self.passthrough, self.sink, self.variant_outputs(output_path))
+            timing['render'] = time.perf_counter() - start
+            self.pipeline.record('render', timing['render'])
+            yield page_num, pix, outputs, timing
+
+    def variant_outputs(self, output_path):
+        """一页的尺寸变体[(输出路径, 格式, 长边像素)]"""
+        return variant_outputs(output_path, self.variants, self.variant_layout)
+
+    def page_outputs(self, output_path):
+        """一页的所有输出文件：原尺寸输出和各尺寸变体"""
+        return [output_path] + [path for path, _, _ in self.variant_outputs(output_path)]
+
+    def record_output(self, output_path):
+        if self.manifest is not None:
+            self.manifest.add_output(self.current_file, output_path)
+
+    def pages_to_render(self, file_path, base_name, total_pages):
+        """去掉清单中原图和所有尺寸变体都已有完好输出的页面，以及page_ranges指定范围之外的页面"""
+        _, valid_outputs = self.prepare_file(file_path)
+        start, end = self.page_ranges.get(file_path, (0, total_pages))
+        return [page_num for page_num in range(max(0, start), min(end, total_pages))
+                if not all(os.path.relpath(path, self.output_dir) in valid_outputs
+                           for path in self.page_outputs(page_output_path(self.output_dir, base_name, page_num,
+                                                                          self.format_type)))]
+
+    def in_flight(self):
+        return sum(len(pending[2]) for pending in self.pending_pdf.values()
+                   if not isinstance(pending, Exception))
+
+    def fill_pool(self, file_list, index):
+        """提前提交后续PDF的渲染任务，使进程池在文件之间保持满载，同时限制排队任务数"""
+        self.next_submit = max(self.next_submit, index)
+        while self.next_submit < len(file_list) and self.in_flight() < self.workers * 4:
+            file_path = file_list[self.next_submit]
+            self.next_submit += 1
+            if os.path.splitext(file_path)[1].lower() == '.pdf' and os.path.isfile(file_path):
+                self.submit_pdf(file_path)
+
+    def submit_pdf(self, file_path):
+        """把一个PDF拆分为页区间任务提交到进程池，失败时留到处理该文件时再报告"""
+        try:
+            unchanged, _ = self.prepare_file(file_path)
+            if unchanged:
+                return
+            page_count = count_pages(file_path)
+            if page_count == 0:
+                raise ValueError("PDF文件为空或无法读取")
+            total_pages = self.page_limit(page_count)
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            page_numbers = self.pages_to_render(file_path, base_name, total_pages)
+            doc_hash = self.document_hash(file_path)
+            futures = [self.pool.submit(render_pdf_pages, file_path, chunk, self.spool_dir or self.output_dir,
+                                        self.format_type, self.dpi, base_name,
+                                        self.cache_config(), doc_hash, self.pipeline_config(file_path),
+                                        (self.tile_budget, self.tiles), self.color, self.passthrough,
+                                        (self.variants, self.variant_layout))
+                       for chunk in split_pages(page_numbers)]
+            # 清单中已有完好输出的页面直接计入进度
+            self.pending_pdf[file_path] = (total_pages, total_pages - len(page_numbers), futures)
+        except Exception as e:
+            self.pending_pdf[file_path] = e
+
+    def submit_export(self, file_path):
+        """把Word文档提交给导出后端，导出到批次临时目录中的PDF"""
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        # 先创建空的占位文件，提前提交的多个同名文档不会使用同一个路径
+        fd, pdf_path = tempfile.mkstemp('.pdf', f"{base_name}_", self.export_dir)
+        os.close(fd)
+        self.exports[file_path] = (pdf_path, self.exporter.submit(file_path, pdf_path))
+
+    def prefetch_exports(self, file_list, index):
+        """提前提交后续的.docx，转换进程在处理其他文件时并行导出，最多提前export_workers个文件"""
+        for file_path in file_list[index:index + self.export_workers]:
+            if (file_path in self.exports or os.path.splitext(file_path)[1].lower() != '.docx' or
+                    not os.path.isfile(file_path)):
+                continue
+            if self.index is not None and self.index.error(file_path):
+                continue
+            unchanged, _ = self.prepare_file(file_path)
+            if not unchanged:
+                self.submit_export(file_path)
+
+    def discard_export(self, file_path):
+        """取消提前提交的导出并删除占位PDF；已经在导出中的等导出结束后再删除"""
+        pending = self.exports.pop(file_path, None)
+        if pending is not None:
+            pdf_path, future = pending
+            future.cancel()
+            future.add_done_callback(lambda _: remove_temp(pdf_path))
+
+    def convert_pdf_parallel(self, file_path):
+        try:
+            if file_path not in self.pending_pdf:
+                self.submit_pdf(file_path)
+            pending = self.pending_pdf[file_path]
+            if isinstance(pending, Exception):
+                raise pending
+
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            total_pages, done_pages, futures = pending
+            # 按提交顺序等待结果，保证进度事件按页码顺序产出
+            for future in futures:
+                self.control.checkpoint()
+                written, stats = future.result()
+                self.worker_stats = merge_stats(self.worker_stats, stats)
+                for page_num, outputs, timing in written:
+                    if self.spool_dir is not None:
+                        # 压缩包内的条目名按输出目录中的相对位置确定
+                        spooled = outputs
+                        outputs = [os.path.join(self.output_dir, os.path.relpath(output_path, self.spool_dir))
+                                   for output_path in spooled]
+                        for spool_path, output_path in zip(spooled, outputs):
+                            self.sink.add_file(spool_path, output_path)
+                    for output_path in outputs:
+                        self.record_output(output_path)
+                    self.report.add_page(timing)
+                    done_pages += 1
+                    progress = int(done_pages / total_pages * 100)
+                    yield ConversionEvent(PAGE_DONE, f"{base_name} - 第{page_num+1}页", progress,
+                                          completed=done_pages, total=total_pages, timing=timing,
+                                          outputs=outputs)
+        except Exception as e:
+            raise Exception(f"PDF转换错误: {str(e)}")
+
+    def convert_pdf(self, file_path):
+        if self.pool is not None:
+            yield from self.convert_pdf_parallel(file_path)
+            return
+        try:
+            doc = self.timed('open', fitz.open, file_path)
+            if len(doc) == 0:
+                raise ValueError("PDF文件为空或无法读取")
+
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            total_pages = self.page_limit(len(doc))
+            pages_to_convert = self.pages_to_render(file_path, base_name, total_pages)
+            done_pages = total_pages - len(pages_to_convert)
+            doc_hash = self.document_hash(file_path)
+
+            sources = self.render_sources(lambda: doc, pages_to_convert, base_name, doc_hash)
+            yield from self.write_pages(sources, total_pages, done_pages,
+                                        lambda page_num: f"{base_name} - 第{page_num+1}页")
+
+            doc.close()
+        except Exception as e:
+            raise Exception(f"PDF转换错误: {str(e)}")
+
+    def convert_word(self, file_path, document=None):
+        """document为已经load_docx的WordDocument，为空时在需要回退渲染时再读取"""
+        try:
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+
+            # 方案1：使用Word或LibreOffice导出为PDF，保持完整格式
+            if self.exporter is not None:
+                try:
+                    print(f"尝试使用{self.exporter.name}转换: {file_path}")
+
+                    # 提前提交的文档直接等待结果，否则现在提交
+                    if file_path not in self.exports:
+                        self.submit_export(file_path)
+                    temp_pdf_path, future = self.exports.pop(file_path)
+                    try:
+                        self.timed('word_export', future.result)
+
+                        print(f"开始处理PDF文件: {temp_pdf_path}")
+                        # Word每次导出的PDF内容不完全相同，缓存以原始Word文档的哈希为键
+                        doc_hash = self.document_hash(self.current_file)
+                        yield from self.convert_word_pdf(temp_pdf_path, base_name, doc_hash)
+                    finally:
+                        # 导出失败回退到文本模式时也删除占位PDF
+                        remove_temp(temp_pdf_path)
+                    return
+
+                except Exception as e:
+                    print(f"Word转PDF失败，回退到文本模式: {e}")
+                    # 如果Word转换失败，回退到原来的文本模式
+                    pass
+
+            # 方案2：回退到原来的文本模式（保持原有功能作为备选）
+            if document is None:
+                document = self.timed('parse', word.load_docx, file_path)
+            pages_to_save = self.timed('parse', word.fallback_pages, document, base_name,
+                                       None if self.pages == "all" else self.pages)
+
+            # 每页在送入流水线时才解码或绘制，流水线满时暂停，内存中只有在途的几页
+            sources = ((i, load(), self.page_outputs(os.path.join(self.output_dir,
+                                                                  f"{base_name}_content_{i+1}.{self.format_type}")),
+                        page_timing(i))
+                       for i, load in enumerate(pages_to_save))
+            yield from self.write_pages(sources, len(pages_to_save), 0,
+                                        lambda i: f"{base_name} - 图片 {i+1}")
+
+        except Exception as e:
+            raise Exception(f"Word转换错误: {str(e)}")
+
+    def convert_word_pdf(self, temp_pdf_path, base_name, doc_hash=None):
+        """把Word导出的临时PDF逐页转换为图片"""
+        # 使用PyMuPDF处理PDF
+        pdf_doc = self.timed('open', fitz.open, temp_pdf_path)
+        try:
+            total_pages = len(pdf_doc)
+            print(f"PDF总页数: {total_pages}")
+
+            # 确定要处理的页数
+            pages_to_process = self.page_limit(total_pages)
+
+            sources = self.render_sources(lambda: pdf_doc, range(pages_to_process), base_name, doc_hash)
+            yield from self.write_pages(sources, pages_to_process, 0,
+                                        lambda page_num: f"{base_name} - 页面 {page_num+1}")
+        finally:
+            pdf_doc.close()
+
+        print(f"Word转换完成，共处理 {pages_to_process} 页")
+
+
+def remove_temp(path):
+    """删除临时文件，文件已不存在时忽略"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def scan_folder(path, extensions=SUPPORTED_EXTENSIONS):
+    """用os.scandir递归查找支持格式的文件，逐个产出，同一目录内按名称排序
+
+    scandir的目录项自带文件类型，不需要像os.walk那样对每个文件再调用stat，大目录下明显更快。
+    """
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            # 无权限或扫描过程中被删除的目录直接跳过
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions) and entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+        # 倒序入栈，保证子目录按名称顺序处理
+        stack.extend(reversed(subdirs))
+
+
+def collect_files(paths, extensions=SUPPORTED_EXTENSIONS):
+    """展开文件和文件夹参数，返回支持格式的文件列表（保持输入顺序）"""
+    result = []
+    seen = set()
+    for path in paths:
+        candidates = scan_folder(path, extensions) if os.path.isdir(path) else [path]
+        for file_path in candidates:
+            if file_path not in seen:
+                seen.add(file_path)
+                result.append(file_path)
+    return result
@@ -0,0 +1,117 @@
+"""增量转换清单：记录每个输入文件的内容哈希、转换参数和已生成的输出文件"""
+import hashlib
+import json
+import os
+import sqlite3
+
+
+MANIFEST_NAME = '.pdftojpg_manifest.sqlite'
+
+# 每写入多少条输出记录提交一次，兼顾崩溃后可恢复的粒度和网络盘上的提交开销
+COMMIT_INTERVAL = 32
+
+
+def file_hash(file_path, chunk_size=1024 * 1024):
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                                 path TEXT PRIMARY KEY,
+                                 size INTEGER,
+                                 mtime REAL,
+                                 hash TEXT,
+                                 settings TEXT,
+                                 complete INTEGER)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS outputs (
+                                 path TEXT,
+                                 name TEXT,
+                                 size INTEGER,
+                                 PRIMARY KEY (path, name))""")
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def begin(self, file_path, settings):
+        """开始处理一个输入文件，返回(unchanged, valid_outputs)
+
+        unchanged为True表示内容和参数都未变化且所有输出完好，可以直接跳过；
+        valid_outputs是仍然有效的输出文件名(相对输出目录的路径)集合，只需补齐其余页面。
+        """
+        key = os.path.abspath(file_path)
+        settings = json.dumps(settings, sort_keys=True)
+        stat = os.stat(file_path)
+        row = self.conn.execute("SELECT size, mtime, hash, settings, complete FROM files WHERE path = ?",
+                                (key,)).fetchone()
+
+        # 大小和修改时间都未变时沿用记录的哈希，避免每次重读整个文件
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            digest = row[2]
+        else:
+            digest = file_hash(file_path)
+
+        valid_outputs = set()
+        if row is not None and row[2] == digest and row[3] == settings:
+            stale = []
+            for name, size in self.conn.execute("SELECT name, size FROM outputs WHERE path = ?",
+                                                (key,)).fetchall():
+                output_path = os.path.join(self.output_dir, name)
+                # 缺失或大小不符（写入中断导致截断）的输出需要重新生成
+                if os.path.isfile(output_path) and os.path.getsize(output_path) == size:
+                    valid_outputs.add(name)
+                else:
+                    stale.append(name)
+            self.conn.executemany("DELETE FROM outputs WHERE path = ? AND name = ?",
+                                  [(key, name) for name in stale])
+            unchanged = bool(row[4]) and not stale
+        else:
+            self.conn.execute("DELETE FROM outputs WHERE path = ?", (key,))
+            unchanged = False
+
+        if unchanged:
+            if row[0] != stat.st_size or row[1] != stat.st_mtime:
+                # 只是修改时间变化时更新记录，下次可以直接走快速路径
+                self.conn.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?",
+                                  (stat.st_size, stat.st_mtime, key))
+                self.uncommitted += 1
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, 0)",
+                              (key, stat.st_size, stat.st_mtime, digest, settings))
+            self.commit()
+        return unchanged, valid_outputs
+
+    def recorded_hash(self, file_path):
+        """返回清单中记录的内容哈希，没有记录时返回None"""
+        row = self.conn.execute("SELECT hash FROM files WHERE path = ?",
+                                (os.path.abspath(file_path),)).fetchone()
+        return row[0] if row is not None else None
+
+    def add_output(self, file_path, output_path):
+        """记录一个已写完的输出文件，名称为相对输出目录的路径(尺寸变体可能在子目录中)"""
+        self.conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)",
+                          (os.path.abspath(file_path), os.path.relpath(output_path, self.output_dir),
+                           os.path.getsize(output_path)))
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_INTERVAL:
+            self.commit()
+
+    def finish(self, file_path):
+        """标记输入文件已全部转换完成"""
+        self.conn.execute("UPDATE files SET complete = 1 WHERE path = ?", (os.path.abspath(file_path),))
+        self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,414 @@
+"""Word文档→PDF的导出后端：调用Word(win32com)或常驻的LibreOffice进程池
+
+以前每个文档都启动一次Word并在导出后退出，短文档的耗时主要花在启动上，而且只能在Windows上使用。
+导出后端在整个批次中保持打开：
+- word: 在一个专用线程中保持同一个Word.Application，每导出max_jobs个文档重启一次
+- libreoffice: 启动若干个常驻的转换进程(office_worker.py)，每个进程各自控制一个无界面的LibreOffice
+- auto: 有Word时用Word，否则有LibreOffice(且有能导入uno的Python)时用LibreOffice，都没有时使用文本回退渲染
+
+转换进程通过标准输入/输出逐行交换JSON：启动完成后输出{"ready": true}；
+请求{"op": "convert", "input": 文档路径, "output": PDF路径}或{"op": "ping"}，应答{"ok": true}或{"error": 说明}；
+请求{"op": "quit"}时退出。任何按这个约定读写的命令都可以作为WorkerPool的转换进程。
+每个任务开始前先确认进程存活并响应ping，超时的任务连同进程一起结束，由新进程接替。
+"""
+import functools
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+EXPORT_BACKENDS = ('auto', 'word', 'libreoffice', 'off')
+
+# 单个文档导出的超时(秒)
+DEFAULT_JOB_TIMEOUT = 120
+# 每个转换进程(或Word实例)导出这么多个文档后重启，避免长时间运行后内存增长或状态异常
+DEFAULT_MAX_JOBS = 50
+# 转换进程启动(含LibreOffice启动)的超时和健康检查的超时(秒)
+START_TIMEOUT = 60
+PING_TIMEOUT = 10
+# 退出时等待转换进程自行结束的时间(秒)
+STOP_TIMEOUT = 5
+# 检查Python能否导入uno模块的超时(秒)
+UNO_CHECK_TIMEOUT = 15
+
+NO_UNO_MESSAGE = "找到了LibreOffice，但没有能导入uno模块的Python(请安装python3-uno等包)，无法导出Word文档"
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'office_worker.py')
+
+# 常见的LibreOffice安装位置，PATH中找不到soffice时依次尝试
+SOFFICE_PATHS = (
+    r'C:\Program Files\LibreOffice\program\soffice.exe',
+    r'C:\Program Files (x86)\LibreOffice\program\soffice.exe',
+    '/Applications/LibreOffice.app/Contents/MacOS/soffice',
+    '/usr/lib/libreoffice/program/soffice',
+    '/opt/libreoffice/program/soffice',
+)
+
+
+class ExportError(Exception):
+    pass
+
+
+class ExportTimeout(ExportError):
+    pass
+
+
+class WorkerProcess:
+    """一个常驻的转换进程，同一时间只处理一个请求"""
+
+    def __init__(self, command):
+        self.jobs = 0
+        # 转换进程还会启动LibreOffice，放在单独的进程组中，超时时整组结束
+        options = {'start_new_session': True} if os.name != 'nt' else {}
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        encoding='utf-8', bufsize=1, **options)
+        self.lines = queue.Queue()
+        threading.Thread(target=self.read_loop, daemon=True).start()
+        self.receive(START_TIMEOUT)
+
+    def read_loop(self):
+        for line in self.process.stdout:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def receive(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.kill()
+                raise ExportTimeout(f"转换进程超过{timeout}秒没有响应")
+            if line is None:
+                raise ExportError(f"转换进程已退出(返回码{self.process.wait()})")
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                # 转换进程或其加载的库输出的其他内容，原样转到日志
+                print(line.rstrip())
+                continue
+            if reply.get('error'):
+                raise ExportError(reply['error'])
+            return reply
+
+    def request(self, message, timeout):
+        try:
+            self.process.stdin.write(json.dumps(message) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            raise ExportError("转换进程已退出")
+        return self.receive(timeout)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def healthy(self):
+        if not self.alive():
+            return False
+        try:
+            self.request({'op': 'ping'}, PING_TIMEOUT)
+            return True
+        except ExportError:
+            return False
+
+    def kill(self):
+        if self.alive():
+            try:
+                if os.name == 'nt':
+                    subprocess.run(['taskkill', '/F', '/T', '/PID', str(self.process.pid)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                else:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                self.process.kill()
+        self.process.wait()
+
+    def stop(self):
+        """请求进程自行退出，超时后强制结束"""
+        if self.alive():
+            try:
+                self.process.stdin.write(json.dumps({'op': 'quit'}) + '\n')
+                self.process.stdin.close()
+                self.process.wait(STOP_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        self.kill()
+
+
+class WorkerPool:
+    """常驻转换进程池：最多size个进程并发导出，进程在批次内的各个文档之间复用
+
+    command为启动一个转换进程的命令行；进程按需启动，导出max_jobs个文档后重启，
+    单个文档超过timeout秒时结束该进程。
+    """
+    name = 'pool'
+
+    def __init__(self, command, size=1, max_jobs=DEFAULT_MAX_JOBS, timeout=DEFAULT_JOB_TIMEOUT):
+        self.command = command
+        self.size = max(1, int(size))
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.busy = set()
+        self.closed = False
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=self.size)
+        self.counts = {'started': 0, 'recycled': 0, 'failed': 0, 'jobs': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def acquire(self):
+        """取出一个通过健康检查的空闲进程，没有时启动新进程"""
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                worker = WorkerProcess(self.command)
+                self.count('started')
+                break
+            if worker.healthy():
+                break
+            self.count('failed')
+            worker.kill()
+        with self.lock:
+            if self.closed:
+                worker.stop()
+                raise ExportError("导出后端已关闭")
+            self.busy.add(worker)
+        return worker
+
+    def release(self, worker, failed=False):
+        with self.lock:
+            self.busy.discard(worker)
+            closed = self.closed
+        if failed or not worker.alive():
+            self.count('failed')
+            worker.kill()
+        elif closed or worker.jobs >= self.max_jobs:
+            if not closed:
+                self.count('recycled')
+            worker.stop()
+        else:
+            self.idle.put(worker)
+
+    def convert(self, file_path, pdf_path):
+        """在当前线程中导出一个文档，失败时抛出ExportError"""
+        worker = self.acquire()
+        failed = False
+        try:
+            worker.request({'op': 'convert', 'input': os.path.abspath(file_path),
+                            'output': os.path.abspath(pdf_path)}, self.timeout)
+            worker.jobs += 1
+            self.count('jobs')
+        except ExportTimeout:
+            failed = True
+            raise
+        finally:
+            self.release(worker, failed)
+        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
+            raise ExportError("PDF文件未生成")
+
+    def submit(self, file_path, pdf_path):
+        """在后台导出，返回Future"""
+        future = self.executor.submit(self.convert, file_path, pdf_path)
+        self.futures = [pending for pending in self.futures if not pending.done()] + [future]
+        return future
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def close(self):
+        """取消未开始的任务，结束所有转换进程；正在导出的进程被强制结束"""
+        with self.lock:
+            self.closed = True
+            busy = list(self.busy)
+        for future in self.futures:
+            future.cancel()
+        for worker in busy:
+            worker.kill()
+        self.executor.shutdown(wait=True)
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+def find_soffice():
+    """查找LibreOffice的soffice程序，找不到时返回None"""
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path:
+            return os.path.realpath(path)
+    for path in SOFFICE_PATHS:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def imports_uno(python):
+    """检查这个Python能否导入uno模块"""
+    try:
+        return subprocess.run([python, '-c', 'import uno'], stdin=subprocess.DEVNULL,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              timeout=UNO_CHECK_TIMEOUT).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def office_python(soffice):
+    """运行转换进程的Python：优先使用LibreOffice自带的，其次是当前解释器和系统的python3；
+    都不能导入uno模块时返回None(发行版的LibreOffice通常不自带Python，uno由单独的包提供)"""
+    program_dir = os.path.dirname(soffice)
+    candidates = [os.path.join(program_dir, name) for name in ('python.exe', 'python')]
+    # macOS的安装包把Python放在Resources目录中
+    candidates.append(os.path.join(os.path.dirname(program_dir), 'Resources', 'python'))
+    candidates = [path for path in candidates if os.path.isfile(path)]
+    candidates += [sys.executable, shutil.which('python3')]
+    for path in candidates:
+        if path and imports_uno(path):
+            return path
+    return None
+
+
+def find_libreoffice():
+    """返回(soffice, 运行转换进程的Python)，LibreOffice不可用时返回None"""
+    soffice = find_soffice()
+    if soffice is None:
+        return None
+    python = office_python(soffice)
+    return (soffice, python) if python is not None else None
+
+
+class LibreOfficeBackend(WorkerPool):
+    name = 'libreoffice'
+
+    def __init__(self, size=1, max_jobs=DEFAULT_MAX_JOBS, timeout=DEFAULT_JOB_TIMEOUT, soffice=None):
+        soffice = soffice or find_soffice()
+        if soffice is None:
+            raise ValueError("未找到LibreOffice(soffice)，无法导出Word文档")
+        python = office_python(soffice)
+        if python is None:
+            raise ValueError(NO_UNO_MESSAGE)
+        super().__init__([python, WORKER_SCRIPT, soffice], size, max_jobs, timeout)
+
+
+class WordBackend:
+    """在一个专用线程中保持Word.Application(COM对象只能在创建它的线程中使用)
+
+    Word通过COM同步调用，无法中途中断，因此不设导出超时。
+    """
+    name = 'word'
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS):
+        from . import word
+
+        self.win32com = word.load_win32com()
+        if self.win32com is None:
+            raise ValueError("未安装pywin32，无法调用Word")
+        self.max_jobs = max_jobs
+        self.app = None
+        self.jobs = 0
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=1, initializer=self.init_thread)
+        self.counts = {'started': 0, 'recycled': 0, 'failed': 0, 'jobs': 0}
+
+    def init_thread(self):
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def start(self):
+        self.app = self.win32com.client.DispatchEx('Word.Application')
+        self.app.Visible = False
+        self.app.DisplayAlerts = 0
+        self.jobs = 0
+        self.counts['started'] += 1
+
+    def quit(self):
+        if self.app is not None:
+            try:
+                self.app.Quit()
+            except Exception:
+                pass
+            self.app = None
+
+    def export(self, file_path, pdf_path):
+        if self.app is None:
+            self.start()
+        try:
+            print(f"Word打开文件: {os.path.abspath(file_path)}")
+            doc = self.app.Documents.Open(os.path.abspath(file_path), ReadOnly=True, AddToRecentFiles=False)
+            try:
+                doc.SaveAs(os.path.abspath(pdf_path), FileFormat=17)  # 17 = wdFormatPDF
+            finally:
+                doc.Close(False)
+        except Exception as e:
+            # Word实例可能已经异常，下一个文档换新实例
+            self.counts['failed'] += 1
+            self.quit()
+            raise ExportError(f"Word导出失败: {str(e)}")
+        self.jobs += 1
+        self.counts['jobs'] += 1
+        if self.jobs >= self.max_jobs:
+            self.counts['recycled'] += 1
+            self.quit()
+        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
+            raise ExportError("PDF文件未生成")
+
+    def convert(self, file_path, pdf_path):
+        return self.submit(file_path, pdf_path).result()
+
+    def submit(self, file_path, pdf_path):
+        future = self.executor.submit(self.export, file_path, pdf_path)
+        self.futures = [pending for pending in self.futures if not pending.done()] + [future]
+        return future
+
+    def stats(self):
+        return dict(self.counts)
+
+    def close(self):
+        for future in self.futures:
+            future.cancel()
+        self.executor.submit(self.quit)
+        self.executor.shutdown(wait=True)
+
+
+def check_backend(name):
+    """检查导出方式是否可用：明确指定的后端不可用时抛出ValueError"""
+    from . import word
+
+    if name not in EXPORT_BACKENDS:
+        raise ValueError(f"不支持的Word导出方式: {name}")
+    if name == 'word' and word.load_win32com() is None:
+        raise ValueError("未安装pywin32，无法调用Word")
+    if name == 'libreoffice':
+        soffice = find_soffice()
+        if soffice is None:
+            raise ValueError("未找到LibreOffice(soffice)，无法导出Word文档")
+        if office_python(soffice) is None:
+            raise ValueError(NO_UNO_MESSAGE)
+
+
+def make_backend(name='auto', workers=1, max_jobs=DEFAULT_MAX_JOBS, timeout=DEFAULT_JOB_TIMEOUT):
+    """创建导出后端；off或auto下没有可用的后端时返回None"""
+    from . import word
+
+    if name not in EXPORT_BACKENDS:
+        raise ValueError(f"不支持的Word导出方式: {name}")
+    if name == 'word' or (name == 'auto' and word.load_win32com() is not None):
+        return WordBackend(max_jobs)
+    if name == 'libreoffice' or (name == 'auto' and find_libreoffice() is not None):
+        return LibreOfficeBackend(workers, max_jobs, timeout)
+    return None
@@ -0,0 +1,118 @@
+"""LibreOffice转换进程：由office.LibreOfficeBackend启动，在带uno模块的Python(通常是LibreOffice自带的)中运行
+
+用法: python office_worker.py SOFFICE路径
+
+启动一个使用独立配置目录的无界面LibreOffice，通过UNO连接后在标准输入/输出上按office模块说明的
+JSON行协议接收请求。这个脚本单独运行，不导入pdftojpg包。标准输入关闭时结束LibreOffice并退出。
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# 等待LibreOffice启动并接受UNO连接的时间(秒)
+CONNECT_TIMEOUT = 60
+
+
+def file_url(path):
+    import uno
+    return uno.systemPathToFileUrl(os.path.abspath(path))
+
+
+def properties(**values):
+    from com.sun.star.beans import PropertyValue
+
+    result = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        result.append(prop)
+    return tuple(result)
+
+
+def start_office(soffice, profile_dir, pipe_name):
+    # 每个转换进程使用自己的配置目录，多个LibreOffice实例可以同时运行
+    return subprocess.Popen([soffice, '--headless', '--invisible', '--nologo', '--nodefault', '--norestore',
+                             '--nolockcheck', f'-env:UserInstallation={file_url(profile_dir)}',
+                             f'--accept=pipe,name={pipe_name};urp;StarOffice.ComponentContext'],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def connect(pipe_name, office):
+    """连接LibreOffice并返回Desktop对象，LibreOffice启动完成前反复重试"""
+    import uno
+
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            context = resolver.resolve(f'uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext')
+            return context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        except Exception:
+            if office.poll() is not None or time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def convert(desktop, input_path, output_path):
+    doc = desktop.loadComponentFromURL(file_url(input_path), '_blank', 0,
+                                       properties(Hidden=True, ReadOnly=True))
+    if doc is None:
+        raise RuntimeError(f"LibreOffice无法打开文档: {input_path}")
+    try:
+        doc.storeToURL(file_url(output_path), properties(FilterName='writer_pdf_Export'))
+    finally:
+        doc.close(True)
+
+
+def reply(**values):
+    sys.stdout.write(json.dumps(values) + '\n')
+    sys.stdout.flush()
+
+
+def main():
+    soffice = sys.argv[1]
+    profile_dir = tempfile.mkdtemp(prefix='pdftojpg_office_')
+    pipe_name = f'pdftojpg_{os.getpid()}'
+    office = start_office(soffice, profile_dir, pipe_name)
+    desktop = None
+    try:
+        desktop = connect(pipe_name, office)
+        reply(ready=True)
+        for line in sys.stdin:
+            request = json.loads(line)
+            op = request.get('op')
+            if op == 'quit':
+                break
+            try:
+                if op == 'ping':
+                    # 调用一次UNO接口，确认LibreOffice仍然响应
+                    desktop.getComponents()
+                elif op == 'convert':
+                    convert(desktop, request['input'], request['output'])
+                else:
+                    raise ValueError(f"未知请求: {op}")
+                reply(ok=True)
+            except Exception as e:
+                reply(error=str(e))
+    finally:
+        if desktop is not None:
+            try:
+                desktop.terminate()
+            except Exception:
+                pass
+        try:
+            office.wait(10)
+        except subprocess.TimeoutExpired:
+            office.kill()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
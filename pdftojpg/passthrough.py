@@ -0,0 +1,76 @@
+"""扫描件直通：整页只有一张图片的页面直接写出PDF中嵌入的原始图片数据，不解码、不光栅化、不重新编码
+
+直通模式:
+- off: 总是渲染（默认）
+- match: 嵌入图片的像素尺寸与按当前DPI渲染的尺寸相差不超过MATCH_TOLERANCE时直通
+- native: 只要格式允许就直通，输出保持扫描件本身的分辨率
+
+只有同时满足以下条件的页面才会直通，否则回退到正常渲染：
+页面没有旋转和批注；页面内容只有一次图片绘制（允许OCR生成的不可见文字层），且图片铺满整页、方向正常；
+图片没有透明蒙版，颜色为灰度或RGB；嵌入数据的格式与输出格式一致（JPEG对JPEG，PNG对PNG）。
+"""
+
+
+PASSTHROUGH_MODES = ('off', 'match', 'native')
+
+# 图片绘制区域与页面尺寸的最大偏差(按页面宽高的比例)
+COVER_TOLERANCE = 0.01
+
+# match模式下嵌入图片与目标像素尺寸的最大偏差
+MATCH_TOLERANCE = 0.1
+
+# 输出格式 -> extract_image可直接写出的格式
+FORMAT_EXTS = {'jpeg': ('jpeg',), 'png': ('png',)}
+
+# bboxlog中不影响输出的记录：不可见文字和裁剪
+IGNORED_OPERATIONS = ('ignore-text', 'clip')
+
+
+def covers_page(bbox, rect):
+    x0, y0, x1, y1 = bbox
+    dx = rect.width * COVER_TOLERANCE
+    dy = rect.height * COVER_TOLERANCE
+    return (x0 - rect.x0 <= dx and y0 - rect.y0 <= dy and
+            rect.x1 - x1 <= dx and rect.y1 - y1 <= dy)
+
+
+def single_image_xref(page):
+    """页面只包含一张铺满整页、方向正常的图片时返回其xref，否则返回None"""
+    if page.rotation or page.first_annot is not None:
+        return None
+    images = page.get_images()
+    # 图片元组为(xref, smask, width, height, ...)，有透明蒙版的图片不能直接写出
+    if len(images) != 1 or images[0][1]:
+        return None
+    drawn = [(kind, bbox) for kind, bbox in page.get_bboxlog() if not kind.startswith(IGNORED_OPERATIONS)]
+    if len(drawn) != 1 or drawn[0][0] != 'fill-image' or not covers_page(drawn[0][1], page.rect):
+        return None
+    infos = page.get_image_info()
+    if len(infos) != 1:
+        return None
+    a, b, c, d, _, _ = infos[0]['transform']
+    # 只接受不旋转、不翻转的放置
+    if b or c or a <= 0 or d <= 0:
+        return None
+    return images[0][0]
+
+
+def embedded_image(page, target_size, format_type, mode):
+    """按直通模式检查页面，可以直通时返回extract_image的结果字典，否则返回None
+
+    target_size为按当前DPI渲染该页的像素尺寸(宽, 高)。
+    """
+    if mode == 'off' or format_type not in FORMAT_EXTS:
+        return None
+    xref = single_image_xref(page)
+    if xref is None:
+        return None
+    image = page.parent.extract_image(xref)
+    if not image or image['ext'] not in FORMAT_EXTS[format_type] or image['colorspace'] not in (1, 3):
+        return None
+    if mode == 'match':
+        width, height = target_size
+        if (abs(image['width'] - width) > width * MATCH_TOLERANCE or
+                abs(image['height'] - height) > height * MATCH_TOLERANCE):
+            return None
+    return image
@@ -0,0 +1,212 @@
+"""渲染→编码→写入流水线：编码线程池和写入线程通过有界队列衔接，在途页面数有上限，内存占用不随批次大小增长
+
+MuPDF不是线程安全的，渲染始终在调用submit的线程中进行；编码只在Pillow中完成，
+pixmap也只在调用线程中释放，编码线程和写入线程不会调用任何MuPDF接口。
+"""
+import io
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .encode import pixmap_to_image, save_image
+from .sinks import FileSink
+from .variants import decode_for_variants, downscale
+
+
+STAGES = ('render', 'encode', 'write')
+
+
+def encode_image(img, format_type, options=None):
+    """把PIL图片编码到内存"""
+    buffer = io.BytesIO()
+    save_image(img, buffer, format_type, options)
+    return buffer
+
+
+class PagePipeline:
+    def __init__(self, encoders=2, max_pending=4, options=None, sink=None):
+        self.encoders = max(1, int(encoders))
+        self.max_pending = max(1, int(max_pending))
+        # 编码参数(EncodeOptions)，None为默认预设
+        self.options = options
+        # 输出位置，默认每页写成单独的文件
+        self.sink = sink or FileSink()
+        self.encode_pool = ThreadPoolExecutor(max_workers=self.encoders)
+        self.write_queue = queue.Queue(maxsize=self.max_pending)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+        # (token, source, write_future)，保持提交顺序，source在这里持有直到写完
+        self.pending = deque()
+
+        self.lock = threading.Lock()
+        self.busy = dict.fromkeys(STAGES, 0.0)
+        self.pages = 0
+        self.bytes_written = 0
+        self.peak_pending = 0
+        self.peak_write_queue = 0
+        self.started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.busy[stage] += seconds
+
+    def encode(self, source, output_path, format_type, timing, variants=()):
+        """编码一页及其尺寸变体，返回[(输出路径, 缓冲区)]；source为PIL图片或直通的原始数据"""
+        start = time.perf_counter()
+        if isinstance(source, bytes):
+            buffers = [(output_path, io.BytesIO(source))]
+            img = decode_for_variants(source, max(edge for _, _, edge in variants)) if variants else None
+        else:
+            img = source
+            buffers = [(output_path, encode_image(img, format_type, self.options))]
+        for variant_path, variant_format, longest_edge in variants:
+            buffers.append((variant_path, encode_image(downscale(img, longest_edge), variant_format,
+                                                       self.options)))
+        elapsed = time.perf_counter() - start
+        self.record('encode', elapsed)
+        if timing is not None:
+            timing['encode'] = elapsed
+        return buffers
+
+    def write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                return
+            encode_future, output_path, write_future, timing = item
+            try:
+                buffers = encode_future.result()
+                start = time.perf_counter()
+                size = 0
+                for path, buffer in buffers:
+                    self.sink.write(path, buffer.getbuffer())
+                    size += buffer.getbuffer().nbytes
+                elapsed = time.perf_counter() - start
+                self.record('write', elapsed)
+                if timing is not None:
+                    timing['write'] = elapsed
+                    timing['bytes'] = size
+                with self.lock:
+                    self.pages += 1
+                    self.bytes_written += size
+                write_future.set_result(output_path)
+            except Exception as e:
+                write_future.set_exception(e)
+
+    def submit(self, source, output_path, format_type, token, timing=None, variants=()):
+        """提交一页（fitz.Pixmap或PIL图片），在途页面已满时阻塞，返回此期间写完的token列表
+
+        source为None表示调用方已经自行写出（如条带渲染的超大页面，包括其尺寸变体），只占一个顺序位置；
+        source为bytes表示已经编码好的数据（如直通的扫描图片），跳过编码直接写入；
+        variants为[(输出路径, 格式, 长边像素)]，在编码线程中从同一张图片缩小得到；
+        timing为该页的计时字典，编码和写入完成后分别填入encode、write和bytes(含所有变体)。
+        """
+        completed = []
+        while len(self.pending) >= self.max_pending:
+            completed.append(self.pop_oldest())
+
+        if source is None:
+            write_future = Future()
+            write_future.set_result(output_path)
+            self.pending.append((token, None, write_future))
+            with self.lock:
+                self.pages += 1
+            completed.extend(self.drain())
+            return completed
+
+        if isinstance(source, bytes) and not variants:
+            encode_future = Future()
+            encode_future.set_result([(output_path, io.BytesIO(source))])
+        else:
+            img = source if not hasattr(source, 'samples_mv') else pixmap_to_image(source)
+            encode_future = self.encode_pool.submit(self.encode, img, output_path, format_type, timing,
+                                                    variants)
+        write_future = Future()
+        self.write_queue.put((encode_future, output_path, write_future, timing))
+        self.pending.append((token, source, write_future))
+
+        with self.lock:
+            self.peak_pending = max(self.peak_pending, len(self.pending))
+            self.peak_write_queue = max(self.peak_write_queue, self.write_queue.qsize())
+        completed.extend(self.drain())
+        return completed
+
+    def pop_oldest(self):
+        token, source, write_future = self.pending.popleft()
+        write_future.result()
+        return token
+
+    def drain(self):
+        """不阻塞地取出已按顺序写完的token"""
+        completed = []
+        while self.pending and self.pending[0][2].done():
+            completed.append(self.pop_oldest())
+        return completed
+
+    def flush(self):
+        """等待所有在途页面写完，返回它们的token；出错时丢弃剩余页面后抛出第一个错误"""
+        completed = []
+        try:
+            while self.pending:
+                completed.append(self.pop_oldest())
+        except Exception:
+            self.discard()
+            raise
+        return completed
+
+    def discard(self):
+        """等待并丢弃在途页面，忽略其中的错误"""
+        while self.pending:
+            token, source, write_future = self.pending.popleft()
+            try:
+                write_future.result()
+            except Exception:
+                pass
+
+    def depth(self):
+        """当前在途页面数和写入队列长度"""
+        return {'pending': len(self.pending), 'write_queue': self.write_queue.qsize()}
+
+    def stats(self):
+        """各阶段的累计忙碌时间和利用率；利用率=忙碌时间/(运行时间×该阶段线程数)"""
+        wall = time.perf_counter() - self.started
+        threads = {'render': 1, 'encode': self.encoders, 'write': 1}
+        with self.lock:
+            return {
+                'wall': wall,
+                'pages': self.pages,
+                'bytes_written': self.bytes_written,
+                'stages': {stage: {'busy': self.busy[stage], 'threads': threads[stage]}
+                           for stage in STAGES},
+                'peak_pending': self.peak_pending,
+                'peak_write_queue': self.peak_write_queue,
+                'max_pending': self.max_pending,
+            }
+
+    def close(self):
+        self.discard()
+        self.write_queue.put(None)
+        self.writer.join()
+        self.encode_pool.shutdown(wait=True)
+
+
+def merge_stats(total, stats):
+    """合并多个流水线（如多个子进程）的统计，total为None时返回stats的副本"""
+    if total is None:
+        return {**stats, 'stages': {stage: dict(value) for stage, value in stats['stages'].items()}}
+    total['wall'] += stats['wall']
+    total['pages'] += stats['pages']
+    total['bytes_written'] += stats['bytes_written']
+    for stage, value in stats['stages'].items():
+        total['stages'][stage]['busy'] += value['busy']
+    total['peak_pending'] = max(total['peak_pending'], stats['peak_pending'])
+    total['peak_write_queue'] = max(total['peak_write_queue'], stats['peak_write_queue'])
+    return total
+
+
+def utilisation(stats):
+    """按阶段计算利用率(0~1)"""
+    wall = stats['wall'] or 1e-9
+    return {stage: value['busy'] / (wall * value['threads']) for stage, value in stats['stages'].items()}
@@ -0,0 +1,137 @@
+"""转换前的预检：并行快速扫描所有输入文件，得到页数、页面尺寸、加密状态等信息
+
+预检只读取文档结构，不渲染页面：PDF读取页数、每页尺寸、是否加密、是否为单张图片的扫描页，
+.docx只检查zip包结构。结果用于计算整个批次的总页数、提前拒绝损坏/加密/空文件，
+以及估算每页渲染所需的内存。
+"""
+import os
+import time
+
+import fitz  # PyMuPDF
+
+from .sizing import page_dpi
+from .word import check_docx_package
+
+
+# 每个进程池任务包含的文件数
+FILES_PER_TASK = 16
+
+
+def inspect_pdf(file_path, info):
+    try:
+        doc = fitz.open(file_path)
+    except Exception as e:
+        raise ValueError(f"无法打开PDF: {str(e)}")
+    try:
+        info['encrypted'] = bool(doc.is_encrypted)
+        if doc.needs_pass:
+            raise ValueError("PDF已加密，需要密码才能打开")
+        if len(doc) == 0:
+            raise ValueError("PDF文件为空或无法读取")
+        sizes = []
+        image_pages = []
+        for page in doc:
+            rect = page.rect
+            sizes.append((round(rect.width, 2), round(rect.height, 2)))
+            # 只查资源字典：恰好引用一张图片且没有字体的页面视为纯图片页（扫描件）
+            if len(page.get_images()) == 1 and not page.get_fonts():
+                image_pages.append(page.number)
+        info['pages'] = len(sizes)
+        info['page_sizes'] = sizes
+        info['image_pages'] = image_pages
+    finally:
+        doc.close()
+
+
+def inspect_docx(file_path, info):
+    check_docx_package(file_path)
+    # 页数要由Word排版后才能确定，这里只记录为未知
+    info['pages'] = None
+
+
+def inspect_file(file_path):
+    """检查单个文件，返回信息字典；文件不可用时error为错误说明"""
+    info = {'path': file_path, 'kind': os.path.splitext(file_path)[1].lower().lstrip('.'),
+            'size': None, 'pages': None, 'page_sizes': [], 'image_pages': [],
+            'encrypted': False, 'error': None}
+    try:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+        info['size'] = os.path.getsize(file_path)
+        if info['size'] == 0:
+            raise ValueError("文件为空")
+        if info['kind'] == 'pdf':
+            inspect_pdf(file_path, info)
+        elif info['kind'] == 'docx':
+            inspect_docx(file_path, info)
+    except Exception as e:
+        info['error'] = str(e)
+    return info
+
+
+def inspect_files(file_paths):
+    """进程池任务：检查一组文件"""
+    return [inspect_file(file_path) for file_path in file_paths]
+
+
+def page_pixel_bytes(size, dpi, channels=3):
+    """按页面尺寸(点)估算整页RGB像素占用的字节数；dpi也可以是按目标尺寸渲染的Sizing"""
+    scale = page_dpi(dpi, size[0], size[1]) / 72
+    return int(size[0] * scale + 1) * int(size[1] * scale + 1) * channels
+
+
+class PreflightIndex:
+    def __init__(self, entries, seconds=0.0):
+        # 文件路径 -> inspect_file的结果
+        self.entries = entries
+        self.seconds = seconds
+
+    def get(self, file_path):
+        return self.entries.get(file_path)
+
+    def error(self, file_path):
+        info = self.entries.get(file_path)
+        return info['error'] if info is not None else None
+
+    def rejected(self):
+        return [path for path, info in self.entries.items() if info['error']]
+
+    def pages(self, file_path, page_limit=None):
+        """文件要转换的页数，未知时返回None；page_limit为引擎按页数设置截取的函数"""
+        info = self.entries.get(file_path)
+        if info is None or info['error'] or info['pages'] is None:
+            return None
+        return page_limit(info['pages']) if page_limit else info['pages']
+
+    def max_page_bytes(self, file_path, dpi):
+        """该文件最大一页的渲染内存估算，未知时返回None"""
+        info = self.entries.get(file_path)
+        if info is None or not info['page_sizes']:
+            return None
+        return max(page_pixel_bytes(size, dpi) for size in info['page_sizes'])
+
+    def summary(self, file_list, page_limit=None):
+        pages = [self.pages(file_path, page_limit) for file_path in file_list]
+        return {
+            'files': len(file_list),
+            'rejected': len(self.rejected()),
+            'pages': pages,
+            'known_pages': sum(count for count in pages if count is not None),
+            'image_pages': sum(len(info['image_pages']) for info in self.entries.values()),
+            'seconds': self.seconds,
+        }
+
+
+def preflight(file_list, pool=None):
+    """检查所有文件并返回PreflightIndex；pool为进程池时分块并行检查"""
+    start = time.perf_counter()
+    entries = {}
+    if pool is None:
+        for file_path in file_list:
+            entries[file_path] = inspect_file(file_path)
+    else:
+        chunks = [file_list[i:i + FILES_PER_TASK] for i in range(0, len(file_list), FILES_PER_TASK)]
+        for infos in pool.map(inspect_files, chunks):
+            for info in infos:
+                entries[info['path']] = info
+    return PreflightIndex(entries, time.perf_counter() - start)
@@ -0,0 +1,120 @@
+"""批次级进度：汇总整个批次的已完成页数/总页数、吞吐量和预计剩余时间，并按固定频率合并更新
+
+每个文件的页数优先使用预检结果，文件开始转换后以引擎报告的页数为准；
+仍然未知的文件（如未预检或需要Word排版的.docx）按已知文件的平均页数估算。
+"""
+import time
+
+from .engine import PREFLIGHT_DONE, FILE_STARTED, PAGE_DONE, FILE_FAILED, FILE_SKIPPED, BATCH_FINISHED
+
+
+# 两次界面更新之间的最短间隔(秒)
+UPDATE_INTERVAL = 0.25
+
+
+class BatchProgress:
+    def __init__(self, total_files, interval=UPDATE_INTERVAL):
+        self.total_files = total_files
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_update = None
+        # 按处理顺序记录每个文件的页数，None表示未知
+        self.expected = [None] * total_files
+        self.current = -1
+        self.current_done = 0
+        self.files_done = 0
+        self.active = False
+        self.pages_done = 0
+        self.message = ''
+
+    def update(self, event):
+        """处理一个引擎事件，返回本次是否应该刷新界面（文件级事件总是刷新）"""
+        if event.kind == PREFLIGHT_DONE:
+            self.expected = list(event.timing['pages'])
+        elif event.kind == FILE_STARTED:
+            self.end_file()
+            self.current += 1
+            self.current_done = 0
+            self.active = True
+        elif event.kind == PAGE_DONE:
+            if event.total:
+                self.set_expected(event.total)
+                self.pages_done += event.completed - self.current_done
+                self.current_done = event.completed
+            else:
+                self.pages_done += 1
+                self.current_done += 1
+        elif event.kind in (FILE_FAILED, FILE_SKIPPED):
+            # 失败或跳过的文件只计入实际完成的页数
+            self.set_expected(self.current_done)
+            self.end_file()
+        elif event.kind == BATCH_FINISHED:
+            self.end_file()
+        self.message = event.message
+        return self.due(force=event.kind != PAGE_DONE)
+
+    def set_expected(self, pages):
+        if 0 <= self.current < len(self.expected):
+            self.expected[self.current] = pages
+
+    def end_file(self):
+        if self.active:
+            self.files_done += 1
+            self.active = False
+
+    def due(self, force=False):
+        now = time.monotonic()
+        if force or self.last_update is None or now - self.last_update >= self.interval:
+            self.last_update = now
+            return True
+        return False
+
+    def estimated_total(self):
+        known = [pages for pages in self.expected if pages is not None]
+        total = sum(known)
+        unknown = len(self.expected) - len(known)
+        if unknown and known:
+            total += int(total / len(known) * unknown)
+        return max(self.pages_done, total)
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        total = self.estimated_total()
+        rate = self.pages_done / elapsed if elapsed > 0 else 0.0
+        eta = (total - self.pages_done) / rate if rate > 0 else None
+        if self.files_done >= self.total_files:
+            percent = 100
+        elif total:
+            percent = int(self.pages_done / total * 100)
+        else:
+            percent = int(self.files_done / max(1, self.total_files) * 100)
+        return {
+            'files_done': self.files_done,
+            'total_files': self.total_files,
+            'pages_done': self.pages_done,
+            'pages_total': total,
+            'percent': percent,
+            'pages_per_sec': rate,
+            'elapsed': elapsed,
+            'eta': eta,
+            'message': self.message,
+        }
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+def format_progress(snapshot):
+    """把进度快照格式化为一行中文说明"""
+    text = (f"文件 {snapshot['files_done']}/{snapshot['total_files']}, "
+            f"页面 {snapshot['pages_done']}/{snapshot['pages_total']}, "
+            f"{snapshot['pages_per_sec']:.1f}页/秒")
+    if snapshot['eta'] is not None and snapshot['files_done'] < snapshot['total_files']:
+        text += f", 预计剩余{format_duration(snapshot['eta'])}"
+    return text
@@ -0,0 +1,170 @@
+"""PDF页面渲染，供主进程和进程池子进程共同使用"""
+import os
+import time
+
+import fitz  # PyMuPDF
+
+from .cache import COLORSPACES
+from .color import cached_colorspaces, choose_colorspace, finish_pixmap
+from .encode import pixmap_to_image, save_image
+from .passthrough import embedded_image
+from .report import page_timing
+from .sizing import page_matrix
+from .sinks import FileSink
+from .tiled import needs_tiling, page_pixel_rect, render_tiled
+from .variants import variant_size
+
+
+# 每个并行任务包含的页数，过小会增加子进程重复打开文档的开销
+PAGES_PER_TASK = 8
+
+
+def page_output_path(output_dir, base_name, page_num, format_type):
+    """输出文件命名规则: {base}_page_{n}.{format}，页码从1开始"""
+    return os.path.join(output_dir, f"{base_name}_page_{page_num+1}.{format_type}")
+
+
+def render_output(open_doc, page_num, dpi, output_path, format_type, cache=None, doc_hash=None,
+                  tile_budget=None, tiles=False, timing=None, options=None, color='rgb', passthrough='off',
+                  sink=None, variants=()):
+    """渲染单页，返回(pixmap, 输出文件列表)
+
+    dpi为固定DPI或按目标尺寸渲染的Sizing，后者按页面实际尺寸计算缩放；
+    启用缓存时优先读取缓存，命中时open_doc不会被调用，无需MuPDF解析文档；
+    整页像素超出tile_budget时按条带渲染并直接写出，此时pixmap为None。
+    timing不为空时记录缓存命中情况、pixmap尺寸和输出色彩空间，条带渲染时还记录写出字节数；
+    options为条带渲染直接写出时使用的编码参数；color为色彩模式(rgb/auto/bilevel)，
+    bilevel模式下转为黑白的页面返回PIL图片而不是pixmap；
+    passthrough不为off时，整页只有一张图片的页面返回嵌入图片的原始字节，不渲染也不读取缓存；
+    sink为条带渲染直接写出时的输出位置；
+    variants为该页的尺寸变体[(输出路径, 格式, 长边像素)]，通常由编码线程从返回的图片缩小得到，
+    条带渲染的页面则在这里按缩小后的尺寸直接渲染写出。返回的输出文件列表包含所有变体。
+    """
+    if timing is None:
+        timing = {}
+    variant_paths = [path for path, _, _ in variants]
+    if passthrough != 'off':
+        page = open_doc()[page_num]
+        mat = page_matrix(dpi, page.rect)
+        irect = page_pixel_rect(page, mat)
+        image = embedded_image(page, (irect.width, irect.height), format_type, passthrough)
+        if image is not None:
+            timing.update(passthrough=image['ext'], width=image['width'], height=image['height'],
+                          colorspace='gray' if image['colorspace'] == 1 else 'rgb')
+            return image['image'], [output_path] + variant_paths
+    if cache is not None:
+        pix, _ = cache.get_any(doc_hash, page_num, dpi, cached_colorspaces(color))
+        timing['cache'] = 'miss' if pix is None else 'hit'
+        if pix is not None:
+            describe_pixmap(timing, pix)
+            return finish_pixmap(pix, color, format_type, timing), [output_path] + variant_paths
+    page = open_doc()[page_num]
+    mat = page_matrix(dpi, page.rect)
+    # 需要试渲染时先生成显示列表，试渲染和正式渲染都不再重复解析页面内容
+    source = page.get_displaylist() if color != 'rgb' else page
+    colorspace = choose_colorspace(source, color)
+    if needs_tiling(page, mat, tile_budget, COLORSPACES[colorspace].n):
+        outputs, size = render_tiled(page, mat, output_path, format_type, tile_budget, tiles, options,
+                                     colorspace, source if color != 'rgb' else None, sink)
+        irect = page_pixel_rect(page, mat)
+        timing.update(tiled=len(outputs), width=irect.width, height=irect.height, colorspace=colorspace,
+                      bytes=size + render_variants(source, irect, mat, variants, colorspace, options, sink))
+        return None, outputs + variant_paths
+    pix = source.get_pixmap(matrix=mat, colorspace=COLORSPACES[colorspace])
+    describe_pixmap(timing, pix)
+    if cache is not None:
+        cache.put(doc_hash, page_num, dpi, colorspace, pix)
+    return finish_pixmap(pix, color, format_type, timing), [output_path] + variant_paths
+
+
+def render_variants(source, irect, mat, variants, colorspace, options=None, sink=None):
+    """条带渲染的页面没有整页像素可供缩小，各尺寸变体按缩小后的矩阵直接渲染，返回写出字节数"""
+    if sink is None:
+        sink = FileSink()
+    size = 0
+    for variant_path, variant_format, longest_edge in variants:
+        width, _ = variant_size(irect.width, irect.height, longest_edge)
+        zoom = width / irect.width
+        pix = source.get_pixmap(matrix=mat * fitz.Matrix(zoom, zoom), colorspace=COLORSPACES[colorspace])
+        with sink.open(variant_path) as f:
+            save_image(pixmap_to_image(pix), f, variant_format, options)
+        size += f.bytes_written
+        del pix
+    return size
+
+
+def describe_pixmap(timing, pix):
+    timing.update(width=pix.width, height=pix.height, pixmap_bytes=pix.stride * pix.height)
+
+
+def render_pdf_pages(file_path, page_numbers, output_dir, format_type, dpi, base_name=None,
+                     cache_config=None, doc_hash=None, pipeline_config=(1, 2, None), tile_config=(None, False),
+                     color='rgb', passthrough='off', variant_config=((), 'suffix')):
+    """在子进程中独立打开PDF并渲染指定页，返回([(页码, 输出文件列表, 计时字典)], 流水线统计)
+
+    cache_config为(缓存目录, 容量上限)，子进程各自打开缓存索引；
+    pipeline_config为(编码线程数, 在途页面上限, 编码参数)，子进程内部同样按渲染→编码→写入流水线运行；
+    tile_config为(条带渲染的内存预算, 是否写成分块文件)；color为色彩模式，passthrough为扫描件直通模式；
+    variant_config为(尺寸变体列表, 变体输出布局)。
+    """
+    from .cache import PageCache
+    from .pipeline import PagePipeline
+    from .scheduler import worker_checkpoint
+    from .variants import variant_outputs
+
+    if base_name is None:
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+    cache = PageCache(*cache_config) if cache_config else None
+    pipeline = PagePipeline(*pipeline_config)
+    opened = []
+    written = []
+    timing = None
+
+    def open_doc():
+        if not opened:
+            start = time.perf_counter()
+            opened.append(fitz.open(file_path))
+            # 打开文档的耗时计入触发打开的那一页
+            timing['open'] = time.perf_counter() - start
+        return opened[0]
+
+    try:
+        for page_num in page_numbers:
+            # 主进程暂停时在这里等待，取消时抛出ConversionCancelled
+            worker_checkpoint()
+            timing = page_timing(page_num)
+            start = time.perf_counter()
+            output_path = page_output_path(output_dir, base_name, page_num, format_type)
+            variants = variant_outputs(output_path, *variant_config)
+            pix, outputs = render_output(open_doc, page_num, dpi, output_path, format_type, cache, doc_hash,
+                                         *tile_config, timing, pipeline.options, color, passthrough,
+                                         None, variants)
+            elapsed = time.perf_counter() - start
+            pipeline.record('render', elapsed)
+            timing['render'] = elapsed - timing.get('open', 0.0)
+            written.extend(pipeline.submit(pix, output_path, format_type, (page_num, outputs, timing), timing,
+                                           variants))
+        written.extend(pipeline.flush())
+    finally:
+        pipeline.close()
+        for doc in opened:
+            doc.close()
+        if cache is not None:
+            cache.close()
+    return written, pipeline.stats()
+
+
+def split_pages(page_numbers, chunk_size=PAGES_PER_TASK):
+    """把页码列表按顺序切分为若干区间"""
+    page_numbers = list(page_numbers)
+    return [page_numbers[start:start + chunk_size]
+            for start in range(0, len(page_numbers), chunk_size)]
+
+
+def count_pages(file_path):
+    """读取PDF页数"""
+    doc = fitz.open(file_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
@@ -0,0 +1,183 @@
+"""批次运行报告：记录每个文件、每一页各阶段的耗时、写出字节数和pixmap尺寸，写成JSONL
+
+每页的计时字典随页面一起经过渲染→编码→写入流水线，各阶段只在已有的计时点上写入一个键，开销可以忽略。
+"""
+import json
+import os
+import time
+
+
+REPORT_NAME = '.pdftojpg_report.jsonl'
+
+# 页面级阶段：打开文档(只计入该进程渲染的第一页)、光栅化、编码、写盘
+PAGE_STAGES = ('open', 'render', 'encode', 'write')
+
+
+def page_timing(page_num):
+    """新建单页的计时字典，页码从1开始"""
+    return {'page': page_num + 1}
+
+
+class RunReport:
+    """每页和每个文件的记录在完成时就追加到报告的临时文件，内存中只保留批次汇总所需的累计值，
+    页数再多内存也不会增长；同一文件的页面行在该文件的文件行之前"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.out = None
+        # 写临时文件失败时记下错误，批次结束写报告时再抛出，不中断转换
+        self.error = None
+        self.started = time.time()
+        self.clock = time.perf_counter()
+        self.current = None
+        # 预检汇总（预检关闭时为None）
+        self.preflight = None
+        # 编码参数，汇总时附上按预设统计的平均每页编码耗时和字节数
+        self.encoding = None
+        self.statuses = {}
+        self.stages = {}
+        self.pages = 0
+        self.bytes_written = 0
+        self.colorspaces = {}
+        self.passthrough = 0
+        self.encoded = {'pages': 0, 'seconds': 0.0, 'bytes': 0}
+
+    def record(self, line):
+        """追加一行到临时文件，第一次写入时才创建"""
+        if self.error is not None:
+            return
+        try:
+            if self.out is None:
+                self.out = open(self.tmp_path, 'w', encoding='utf-8')
+            self.out.write(json.dumps(line, ensure_ascii=False) + '\n')
+        except OSError as e:
+            self.error = e
+
+    def start_file(self, file_path):
+        self.current = {'file': file_path, 'status': None, 'error': None, 'stages': {}, 'pages': 0,
+                        'bytes_written': 0, 'started': time.perf_counter()}
+
+    def stage(self, name, seconds):
+        """累加当前文件的文件级阶段耗时，如open、parse、word_export、hash"""
+        if self.current is not None:
+            stages = self.current['stages']
+            stages[name] = stages.get(name, 0.0) + seconds
+
+    def add_page(self, timing):
+        record = self.current
+        if record is None:
+            return
+        self.record({'type': 'page', 'file': record['file'], **timing})
+        # 页面级耗时汇总到文件
+        for stage in PAGE_STAGES:
+            if stage in timing:
+                self.stage(stage, timing[stage])
+        record['pages'] += 1
+        record['bytes_written'] += timing.get('bytes', 0)
+        colorspace = timing.get('colorspace')
+        if colorspace is not None:
+            self.colorspaces[colorspace] = self.colorspaces.get(colorspace, 0) + 1
+        if 'passthrough' in timing:
+            self.passthrough += 1
+        # 只统计经过编码流水线的页面，条带渲染直接写出的页面不计入
+        if 'encode' in timing:
+            self.encoded['pages'] += 1
+            self.encoded['seconds'] += timing['encode']
+            self.encoded['bytes'] += timing.get('bytes', 0)
+
+    def finish_file(self, status, error=None):
+        record = self.current
+        if record is None:
+            return None
+        record['status'] = status
+        record['error'] = error
+        record['seconds'] = time.perf_counter() - record.pop('started')
+        self.record({'type': 'file', **record})
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for stage, seconds in record['stages'].items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.pages += record['pages']
+        self.bytes_written += record['bytes_written']
+        self.current = None
+        return record
+
+    def summary(self, pipeline_stats=None):
+        """整个批次的汇总，pipeline_stats为流水线统计(含队列深度峰值)"""
+        summary = {
+            'started': self.started,
+            'seconds': time.perf_counter() - self.clock,
+            'files': dict(self.statuses),
+            'pages': self.pages,
+            'bytes_written': self.bytes_written,
+            'stages': dict(self.stages),
+            'colorspaces': dict(self.colorspaces),
+            'passthrough': self.passthrough,
+        }
+        if self.preflight is not None:
+            summary['preflight'] = self.preflight
+        if self.encoding is not None:
+            summary['encoding'] = dict(self.encoding, **self.encoding_stats())
+        if pipeline_stats is not None:
+            summary['pipeline'] = {key: pipeline_stats[key]
+                                   for key in ('peak_pending', 'peak_write_queue', 'max_pending')
+                                   if key in pipeline_stats}
+        return summary
+
+    def encoding_stats(self):
+        encoded = self.encoded
+        if not encoded['pages']:
+            return {'encoded_pages': 0, 'encode_ms_per_page': None, 'bytes_per_page': None}
+        return {'encoded_pages': encoded['pages'],
+                'encode_ms_per_page': encoded['seconds'] / encoded['pages'] * 1000,
+                'bytes_per_page': encoded['bytes'] // encoded['pages']}
+
+    def write(self, summary):
+        """追加批次汇总作为最后一行，再把临时文件替换为正式报告，避免留下半截报告"""
+        self.record({'type': 'batch', **summary})
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+        if self.error is not None:
+            self.remove_tmp()
+            raise self.error
+        os.replace(self.tmp_path, self.path)
+
+    def close(self):
+        """批次没有写出报告就结束时(如提前停止迭代)删除临时文件"""
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+            self.remove_tmp()
+
+    def remove_tmp(self):
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+STAGE_NAMES = {'open': '打开', 'parse': '解析', 'word_export': 'Word导出', 'hash': '哈希',
+               'render': '渲染', 'encode': '编码', 'write': '写入'}
+
+
+COLORSPACE_NAMES = {'rgb': '彩色', 'gray': '灰度', 'bilevel': '黑白'}
+
+
+def format_summary(summary):
+    """把批次汇总格式化为一行中文说明，供命令行和界面日志使用"""
+    stages = ", ".join(f"{STAGE_NAMES.get(stage, stage)}{seconds:.2f}s"
+                       for stage, seconds in sorted(summary['stages'].items(), key=lambda item: -item[1]))
+    text = (f"共{summary['pages']}页 {summary['bytes_written'] / 1024 / 1024:.1f}MB, "
+            f"耗时{summary['seconds']:.2f}s; 各阶段累计: {stages or '无'}")
+    colorspaces = summary.get('colorspaces') or {}
+    if set(colorspaces) - {'rgb'}:
+        text += "; 色彩: " + ", ".join(f"{COLORSPACE_NAMES.get(name, name)}{count}页"
+                                       for name, count in sorted(colorspaces.items()))
+    if summary.get('passthrough'):
+        text += f"; 直接输出原图{summary['passthrough']}页"
+    encoding = summary.get('encoding')
+    if encoding and encoding['encoded_pages']:
+        text += (f"; 编码预设{encoding['preset']}: 每页平均编码{encoding['encode_ms_per_page']:.1f}ms, "
+                 f"{encoding['bytes_per_page'] / 1024:.0f}KB")
+    return text
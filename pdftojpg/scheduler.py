@@ -0,0 +1,118 @@
+"""任务调度：按策略安排文件的处理顺序，并提供暂停、继续和取消控制
+
+策略:
+- fifo: 按添加顺序
+- shortest: 预计渲染量最小的文件优先，避免一个几千页的大文件挡住后面所有小文件
+- priority: 用户指定的优先级高的先处理，同优先级内按预计渲染量从小到大
+
+调度以文件为单位：只调整文件之间的顺序，同一文件的页区间任务总是按页码顺序提交，
+大文件的各页区间不会与其他文件的任务交错排序。
+
+暂停和取消通过multiprocessing.Event在主进程和进程池子进程之间共享，渲染每一页之前检查一次。
+"""
+import multiprocessing
+import os
+import time
+
+from .preflight import page_pixel_bytes
+
+
+POLICIES = ('fifo', 'shortest', 'priority')
+
+
+class ConversionCancelled(BaseException):
+    """转换被取消。继承BaseException，穿过各层按Exception包装错误信息的处理，直接回到批次循环"""
+
+
+class JobControl:
+    def __init__(self):
+        self.paused = multiprocessing.Event()
+        self.cancelled = multiprocessing.Event()
+
+    def pause(self):
+        self.paused.set()
+
+    def resume(self):
+        self.paused.clear()
+
+    def cancel(self):
+        self.cancelled.set()
+        # 解除暂停，让等待中的线程和进程尽快退出
+        self.paused.clear()
+
+    def reset(self):
+        self.paused.clear()
+        self.cancelled.clear()
+
+    def is_paused(self):
+        return self.paused.is_set()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def checkpoint(self):
+        """暂停时阻塞到继续为止，已取消时抛出ConversionCancelled"""
+        wait_until_resumed(self.paused, self.cancelled)
+
+
+def wait_until_resumed(paused, cancelled):
+    while paused.is_set() and not cancelled.is_set():
+        time.sleep(0.1)
+    if cancelled.is_set():
+        raise ConversionCancelled()
+
+
+# 进程池子进程中的控制标志，由init_worker设置
+worker_flags = None
+
+
+def init_worker(paused, cancelled):
+    """进程池初始化函数：子进程创建时继承主进程的暂停/取消标志"""
+    global worker_flags
+    worker_flags = (paused, cancelled)
+
+
+def worker_checkpoint():
+    if worker_flags is not None:
+        wait_until_resumed(*worker_flags)
+
+
+def file_cost(file_path, index=None, dpi=200, page_limit=None):
+    """估算文件的渲染量(像素字节数)，预检信息不可用时返回None"""
+    if index is None:
+        return None
+    info = index.get(file_path)
+    if info is None or not info['page_sizes']:
+        return None
+    sizes = info['page_sizes']
+    if page_limit is not None:
+        sizes = sizes[:page_limit(len(sizes))]
+    return sum(page_pixel_bytes(size, dpi) for size in sizes)
+
+
+def order_files(file_list, policy='fifo', index=None, dpi=200, page_limit=None, priorities=None):
+    """按策略返回新的文件顺序；只对整个文件排序，不拆开调度同一文件的页区间
+
+    有预检索引时按像素量估算成本，没有时按文件大小；成本未知的文件（如.docx）取已知成本的中位数。
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"不支持的调度策略: {policy}")
+    if policy == 'fifo' or len(file_list) < 2:
+        return list(file_list)
+
+    if index is not None:
+        costs = {file_path: file_cost(file_path, index, dpi, page_limit) for file_path in file_list}
+    else:
+        costs = {file_path: os.path.getsize(file_path) if os.path.isfile(file_path) else None
+                 for file_path in file_list}
+    known = sorted(cost for cost in costs.values() if cost is not None)
+    default = known[len(known) // 2] if known else 0
+    costs = {file_path: default if cost is None else cost for file_path, cost in costs.items()}
+
+    positions = {file_path: i for i, file_path in enumerate(file_list)}
+    priorities = priorities or {}
+    if policy == 'priority':
+        key = lambda file_path: (-priorities.get(file_path, 0), costs[file_path], positions[file_path])
+    else:
+        key = lambda file_path: (costs[file_path], positions[file_path])
+    return sorted(file_list, key=key)
@@ -0,0 +1,551 @@
+"""本地HTTP转换服务：其他服务上传或引用文档，边渲染边取回页面图片
+
+接口:
+- POST /convert  请求体为PDF/.docx文件内容，或不带请求体、用path参数引用服务端允许目录中的文件；
+  查询参数: format=jpeg|png|webp, dpi=200, pages=all|1-3,5,8-, stream=zip|multipart, name=原文件名
+  响应在每页写完后立即发送：zip为流式写出的ZIP，multipart为multipart/mixed，每页一段；
+  条目名为page_{原页码}.{格式}。等待中的任务已满时返回429，第一页之前就失败的文档返回422
+- GET /metrics  队列长度、任务计数和延迟分位数(JSON)
+- GET /health
+
+任务在有上限的线程池中运行：每个线程(任务槽)有一个常驻的ConversionEngine，其进程池和Word导出后端
+在服务启动时创建并在任务之间复用；每个任务使用独立的临时输出目录，页面发送后立即删除。
+默认只监听127.0.0.1，不需要任何外部服务。
+"""
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import fitz  # PyMuPDF
+
+from .encode import OUTPUT_FORMATS
+from .engine import ConversionEngine, PAGE_DONE, FILE_FAILED
+from .report import REPORT_NAME
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 同时运行的任务数和排队等待的任务数上限
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 8
+# 上传文件的大小上限
+MAX_UPLOAD = 512 * 1024 * 1024
+MAX_DPI = 1200
+STREAM_MODES = ('zip', 'multipart')
+# 延迟指标保留最近多少个任务的样本
+LATENCY_SAMPLES = 1000
+UPLOAD_CHUNK = 1024 * 1024
+# 客户端停止读取或上传超过这么多秒时断开连接并取消任务
+CLIENT_TIMEOUT = 60
+
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+
+def parse_ranges(spec):
+    """解析页码范围，如 1-3,5,8- ，返回[(起始页, 结束页或None)]，页码从1开始；all返回None"""
+    if not spec or spec == 'all':
+        return None
+    ranges = []
+    for part in spec.split(','):
+        try:
+            if '-' in part:
+                start, end = part.split('-', 1)
+                start, end = int(start), (int(end) if end.strip() else None)
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise ValueError(f"页码范围格式错误: {spec}")
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"页码范围无效: {part}")
+        ranges.append((start, end))
+    return ranges
+
+
+def in_ranges(ranges, page):
+    return ranges is None or any(start <= page and (end is None or page <= end) for start, end in ranges)
+
+
+def ranges_limit(ranges):
+    """转换到第几页就能覆盖所有范围，有开放的范围时返回'all'"""
+    if ranges is None or any(end is None for _, end in ranges):
+        return 'all'
+    return max(end for _, end in ranges)
+
+
+def detect_kind(name, head):
+    """按文件名扩展名或文件头判断是PDF还是.docx，无法识别时返回None"""
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext in ('.pdf', '.docx'):
+        return ext
+    if head.startswith(b'%PDF'):
+        return '.pdf'
+    if head.startswith(b'PK'):
+        return '.docx'
+    return None
+
+
+def warm_up(engine):
+    """提前启动进程池中的全部进程：请求不承担进程启动开销，子进程也不会继承之后建立的客户端连接"""
+    if engine.pool is not None:
+        for future in [engine.pool.submit(os.getpid) for _ in range(engine.workers)]:
+            future.result()
+
+
+def latency_summary(samples):
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {'count': len(values), 'p50': values[len(values) // 2],
+            'p95': values[min(len(values) - 1, int(len(values) * 0.95))], 'max': values[-1]}
+
+
+class ServiceMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'accepted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'pages': 0}
+        self.running = 0
+        self.samples = {name: deque(maxlen=LATENCY_SAMPLES) for name in ('queue_wait', 'first_page', 'total')}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counts[key] += amount
+
+    def sample(self, name, seconds):
+        with self.lock:
+            self.samples[name].append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            result = dict(self.counts, running=self.running)
+            result['latency'] = {name: latency_summary(values) for name, values in self.samples.items()}
+        return result
+
+
+class Job:
+    """一个转换请求：工作线程把每页的结果放进events，请求处理线程边取边发送"""
+
+    def __init__(self, work_dir, source_path, name, format_type, dpi, ranges):
+        self.work_dir = work_dir
+        self.output_dir = os.path.join(work_dir, 'out')
+        self.source_path = source_path
+        self.name = name
+        self.format_type = format_type
+        self.dpi = dpi
+        self.ranges = ranges
+        # ('page', 原页码, 输出文件列表)、('error', 说明)，None表示任务结束
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        # 正在运行本任务的引擎，任务结束后清空，取消不会影响同一引擎上的下一个任务
+        self.engine = None
+        self.lock = threading.Lock()
+        self.submitted = time.monotonic()
+        self.first_page = None
+
+    def bind(self, engine):
+        with self.lock:
+            self.engine = engine
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled.set()
+            if self.engine is not None:
+                self.engine.cancel()
+
+
+class ConversionService:
+    """有上限的转换任务池：workers个线程运行任务，最多max_queue个任务排队，超出时拒绝
+
+    allowed_roots为允许用path参数引用的服务端目录，为空时只接受上传；
+    job_workers为每个任务槽渲染PDF的常驻进程数，export_backend为Word文档导出PDF的方式。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE, work_root=None, allowed_roots=(),
+                 job_workers=1, export_backend='auto', max_upload=MAX_UPLOAD):
+        self.workers = max(1, int(workers))
+        self.max_queue = max_queue
+        self.work_root = work_root
+        self.allowed_roots = [os.path.realpath(root) for root in allowed_roots]
+        self.job_workers = job_workers
+        self.export_backend = export_backend
+        self.max_upload = max_upload
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.metrics = ServiceMetrics()
+        # 每个任务槽一个引擎，启动时创建进程池和导出后端，请求不再承担启动开销
+        self.slot_root = tempfile.mkdtemp(prefix='pdftojpg_service_', dir=work_root)
+        self.engines = []
+        for slot in range(self.workers):
+            engine = ConversionEngine(os.path.join(self.slot_root, f'slot{slot}'), workers=job_workers,
+                                      preflight=False, export_backend=export_backend)
+            engine.start_workers()
+            warm_up(engine)
+            self.engines.append(engine)
+        self.threads = [threading.Thread(target=self.worker_loop, args=(engine,), daemon=True)
+                        for engine in self.engines]
+        for thread in self.threads:
+            thread.start()
+
+    def full(self):
+        return self.jobs.full()
+
+    def new_work_dir(self):
+        return tempfile.mkdtemp(prefix='pdftojpg_job_', dir=self.work_root)
+
+    def resolve_path(self, path):
+        """path参数引用的文件必须位于允许的目录中，否则抛出PermissionError"""
+        real = os.path.realpath(path)
+        if not any(real == root or real.startswith(root + os.sep) for root in self.allowed_roots):
+            raise PermissionError(f"不允许引用该文件: {path}")
+        if not os.path.isfile(real):
+            raise FileNotFoundError(f"文件不存在: {path}")
+        return real
+
+    def submit(self, job):
+        """提交任务，排队已满时抛出queue.Full"""
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self.metrics.count('rejected')
+            raise
+        self.metrics.count('accepted')
+
+    def worker_loop(self, engine):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self.metrics.lock:
+                self.metrics.running += 1
+            try:
+                self.run_job(job, engine)
+            finally:
+                with self.metrics.lock:
+                    self.metrics.running -= 1
+
+    def prepare_source(self, job):
+        """PDF只需要部分页面时先抽出这些页面，返回(转换的文件, 子文档页码->原页码列表或None, 页数设置)"""
+        if job.ranges is None or os.path.splitext(job.source_path)[1].lower() != '.pdf':
+            return job.source_path, None, ranges_limit(job.ranges)
+        doc = fitz.open(job.source_path)
+        try:
+            selected = [i for i in range(len(doc)) if in_ranges(job.ranges, i + 1)]
+            if not selected:
+                raise ValueError(f"页码范围超出文档页数({len(doc)}页)")
+            if len(selected) == len(doc):
+                return job.source_path, None, 'all'
+            doc.select(selected)
+            subset = os.path.join(job.work_dir, os.path.basename(job.source_path))
+            if os.path.exists(subset):
+                subset = os.path.join(job.work_dir, 'selected_' + os.path.basename(job.source_path))
+            doc.save(subset)
+        finally:
+            doc.close()
+        return subset, [i + 1 for i in selected], 'all'
+
+    def configure(self, engine, job, pages):
+        """把任务槽的引擎切换到本任务的输出目录和参数"""
+        os.makedirs(job.output_dir)
+        engine.output_dir = job.output_dir
+        engine.format_type = job.format_type
+        engine.dpi = job.dpi
+        engine.pages = pages
+        engine.report_path = os.path.join(job.work_dir, REPORT_NAME)
+
+    def run_job(self, job, engine):
+        started = time.monotonic()
+        self.metrics.sample('queue_wait', started - job.submitted)
+        failed = False
+        try:
+            if job.cancelled.is_set():
+                return
+            source, numbers, pages = self.prepare_source(job)
+            self.configure(engine, job, pages)
+            job.bind(engine)
+            try:
+                for event in engine.iter_convert([source]):
+                    # iter_convert开始时会清除取消状态，在这之前到达的取消在这里重新生效
+                    if job.cancelled.is_set():
+                        engine.cancel()
+                    self.handle_event(job, event, numbers)
+                    failed = failed or event.kind == FILE_FAILED
+            finally:
+                job.bind(None)
+        except Exception as e:
+            failed = True
+            job.events.put(('error', str(e)))
+        finally:
+            self.metrics.sample('total', time.monotonic() - job.submitted)
+            if failed:
+                self.metrics.count('failed')
+            else:
+                self.metrics.count('cancelled' if job.cancelled.is_set() else 'completed')
+            job.events.put(None)
+
+    def handle_event(self, job, event, numbers):
+        """把页面换算为原页码后交给请求处理线程，范围之外的页面删除"""
+        if event.kind == PAGE_DONE:
+            page = numbers[event.timing['page'] - 1] if numbers else event.timing['page']
+            if not in_ranges(job.ranges, page):
+                # Word文档只能从头转换，范围之外的页面直接丢弃
+                for output_path in event.outputs:
+                    os.remove(output_path)
+                return
+            if job.first_page is None:
+                job.first_page = time.monotonic()
+                self.metrics.sample('first_page', job.first_page - job.submitted)
+            self.metrics.count('pages')
+            job.events.put(('page', page, event.outputs))
+        elif event.kind == FILE_FAILED:
+            job.events.put(('error', event.message))
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        for engine in self.engines:
+            engine.stop_workers()
+        shutil.rmtree(self.slot_root, ignore_errors=True)
+
+
+class ZipStream:
+    """按页写出流式ZIP；输出不可回退时zipfile在每个条目后写数据描述符"""
+    content_type = 'application/zip'
+
+    def __init__(self, wfile):
+        self.archive = zipfile.ZipFile(wfile, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def add_file(self, path, name):
+        self.archive.write(path, name)
+
+    def add_error(self, message):
+        self.archive.writestr('error.json', json.dumps({'error': message}, ensure_ascii=False))
+
+    def close(self):
+        self.archive.close()
+
+
+class MultipartStream:
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/mixed; boundary={self.boundary}'
+
+    def write_part(self, headers, data):
+        head = ''.join(f'{key}: {value}\r\n' for key, value in headers)
+        self.wfile.write(f'--{self.boundary}\r\n{head}Content-Length: {len(data)}\r\n\r\n'.encode('utf-8'))
+        self.wfile.write(data)
+        self.wfile.write(b'\r\n')
+        self.wfile.flush()
+
+    def add_file(self, path, name):
+        with open(path, 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(name)[1].lstrip('.')
+        self.write_part([('Content-Type', CONTENT_TYPES.get(ext, 'application/octet-stream')),
+                         ('Content-Disposition', f'attachment; filename="{name}"')], data)
+
+    def add_error(self, message):
+        self.write_part([('Content-Type', 'application/json')],
+                        json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'))
+
+    def close(self):
+        self.wfile.write(f'--{self.boundary}--\r\n'.encode('utf-8'))
+
+
+def entry_names(page, outputs):
+    """每页的条目名；超大页面分块输出时按块编号"""
+    if len(outputs) == 1:
+        return [f"page_{page}{os.path.splitext(outputs[0])[1]}"]
+    return [f"page_{page}_{i + 1}{os.path.splitext(path)[1]}" for i, path in enumerate(outputs)]
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    service = None
+    server_version = 'pdftojpg'
+    timeout = CLIENT_TIMEOUT
+
+    def send_json(self, status, payload, headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            metrics = self.service.metrics.snapshot()
+            metrics.update(queued=self.service.jobs.qsize(), max_queue=self.service.max_queue,
+                           workers=self.service.workers)
+            self.send_json(200, metrics)
+        elif path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': '未知路径'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/convert':
+            self.send_json(404, {'error': '未知路径'})
+            return
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            format_type = params.get('format', 'jpeg')
+            if format_type not in OUTPUT_FORMATS:
+                raise ValueError(f"不支持的输出格式: {format_type}")
+            dpi = int(params.get('dpi', 200))
+            if not 1 <= dpi <= MAX_DPI:
+                raise ValueError(f"DPI必须在1到{MAX_DPI}之间")
+            ranges = parse_ranges(params.get('pages', 'all'))
+            stream = params.get('stream', 'zip')
+            if stream not in STREAM_MODES:
+                raise ValueError(f"不支持的返回方式: {stream}")
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        # 在读取上传内容之前先检查队列，已满时不必接收整个文件
+        if self.service.full():
+            self.service.metrics.count('rejected')
+            self.send_json(429, {'error': '转换队列已满，请稍后重试'}, [('Retry-After', '1')])
+            return
+
+        work_dir = self.service.new_work_dir()
+        try:
+            job = self.receive_job(work_dir, params, format_type, dpi, ranges)
+            if job is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                return
+            try:
+                self.service.submit(job)
+            except queue.Full:
+                self.send_json(429, {'error': '转换队列已满，请稍后重试'}, [('Retry-After', '1')])
+                shutil.rmtree(work_dir, ignore_errors=True)
+                return
+            self.stream_job(job, stream)
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+    def receive_job(self, work_dir, params, format_type, dpi, ranges):
+        """读取上传的文件或解析path参数，返回Job；请求不合格时发送错误响应并返回None"""
+        if 'path' in params:
+            try:
+                source_path = self.service.resolve_path(params['path'])
+            except PermissionError as e:
+                self.send_json(403, {'error': str(e)})
+                return None
+            except FileNotFoundError as e:
+                self.send_json(404, {'error': str(e)})
+                return None
+            with open(source_path, 'rb') as f:
+                head = f.read(8)
+            name = os.path.basename(source_path)
+        else:
+            length = self.headers.get('Content-Length', '').strip()
+            if not length.isdigit():
+                self.send_json(400, {'error': '上传文件需要有效的Content-Length'})
+                return None
+            length = int(length)
+            if length > self.service.max_upload:
+                self.send_json(413, {'error': '上传文件过大'})
+                return None
+            name = os.path.basename(params.get('name', '')) or 'document'
+            source_path = os.path.join(work_dir, 'upload')
+            with open(source_path, 'wb') as f:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(UPLOAD_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            if remaining:
+                # 客户端提前断开或长度与内容不符，不完整的文件不能转换
+                self.send_json(400, {'error': f"上传内容不完整: 缺少{remaining}字节"})
+                return None
+            with open(source_path, 'rb') as f:
+                head = f.read(8)
+        kind = detect_kind(name, head)
+        if kind is None:
+            self.send_json(415, {'error': '只支持PDF和Word(.docx)文件'})
+            return None
+        if source_path.startswith(work_dir):
+            # 上传的文件按原文件名(去掉扩展名)命名，输出和日志中显示的就是这个名字
+            named = os.path.join(work_dir, os.path.splitext(name)[0] + kind)
+            os.replace(source_path, named)
+            source_path = named
+        return Job(work_dir, source_path, name, format_type, dpi, ranges)
+
+    def stream_job(self, job, stream):
+        """第一页写完或任务失败之后才发送响应头，之后每页写完立即发送"""
+        item = ()
+        try:
+            item = job.events.get()
+            if item is None or item[0] == 'error':
+                message = item[1] if item is not None else '文档没有可输出的页面'
+                self.send_json(422, {'error': message})
+                return
+            self.send_response(200)
+            writer = ZipStream(self.wfile) if stream == 'zip' else MultipartStream(self.wfile)
+            self.send_header('Content-Type', writer.content_type)
+            self.send_header('Content-Disposition',
+                             f'attachment; filename="{os.path.splitext(job.name)[0]}.zip"' if stream == 'zip'
+                             else 'inline')
+            self.end_headers()
+            while item is not None:
+                if item[0] == 'page':
+                    _, page, outputs = item
+                    for output_path, name in zip(outputs, entry_names(page, outputs)):
+                        writer.add_file(output_path, name)
+                        os.remove(output_path)
+                else:
+                    writer.add_error(item[1])
+                item = job.events.get()
+            writer.close()
+        except OSError:
+            # 客户端提前断开或停止读取超时，在finally中停止转换
+            pass
+        finally:
+            if item is not None:
+                job.cancel()
+            # 等待工作线程结束后再删除临时目录
+            while item is not None:
+                item = job.events.get()
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}")
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """创建绑定到service的HTTP服务器，调用serve_forever开始处理请求"""
+    handler = type('BoundConversionHandler', (ConversionHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, **options):
+    """启动服务并一直运行到Ctrl+C，options传给ConversionService"""
+    service = ConversionService(**options)
+    server = make_server(service, host, port)
+    print(f"转换服务已启动: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
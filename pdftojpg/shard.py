@@ -0,0 +1,434 @@
+"""分片批处理：多个进程或多台机器共用共享盘上的同一个批次目录，各自领取工作单元并行转换
+
+批次目录(与输入、输出位于同一共享盘上)的结构:
+- batch.json  批次计划：转换参数和工作单元列表，页数多的PDF按shard_pages页拆分为多个单元
+- leases/     租约文件 {单元}.{代次}，内容为持有者和到期时间
+- work/       各进程正在写的单元报告
+- done/       已完成单元的报告 {单元}.jsonl，从work/改名过来，存在即表示该单元已完成
+
+领取单元不需要锁：租约文件用O_CREAT|O_EXCL创建，同一代次只有一个进程能创建成功。
+持有者每隔租约时长的三分之一续期一次；进程崩溃后租约过期，其他进程创建下一代租约接管该单元，
+原持有者续期时发现已有更新的代次就停止转换并放弃结果。一个单元被接管MAX_ATTEMPTS次仍未完成时记为失败。
+所有单元完成后，发现这一点的进程把各单元的报告合并为一份运行报告。
+
+各节点看到的输入路径必须相同，时钟误差要远小于租约时长。不依赖sqlite，因为网络文件系统上的sqlite锁不可靠。
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from .engine import BATCH_FINISHED
+from .render import count_pages
+
+
+BATCH_FILE = 'batch.json'
+# 每个工作单元最多包含的PDF页数
+DEFAULT_SHARD_PAGES = 50
+# 租约时长(秒)，持有者每隔三分之一时长续期
+DEFAULT_LEASE_TTL = 60.0
+# 单元被领取多少次仍未完成时不再重试
+MAX_ATTEMPTS = 3
+# 没有可领取的单元、其他进程仍在转换时，隔多久再检查一次(秒)
+IDLE_INTERVAL = 2.0
+# 等待其他进程写完批次计划的时间(秒)
+PLAN_WAIT = 30
+
+
+def worker_id():
+    """主机名:进程号:随机后缀，区分不同机器和同一台机器上重启的进程"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def write_json(path, data):
+    """先写唯一的临时文件再替换，读取方不会看到写了一半的内容"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def plan_units(file_list, page_limit, shard_pages=DEFAULT_SHARD_PAGES):
+    """把文件列表拆分为工作单元；Word文档和无法读取的PDF整个文件为一个单元，错误留到转换时报告"""
+    units = []
+    for file_path in file_list:
+        file_path = os.path.abspath(file_path)
+        ranges = [None]
+        if file_path.lower().endswith('.pdf'):
+            try:
+                total_pages = page_limit(count_pages(file_path))
+            except Exception:
+                total_pages = 0
+            if total_pages > shard_pages:
+                ranges = [(start, min(start + shard_pages, total_pages))
+                          for start in range(0, total_pages, shard_pages)]
+        for page_range in ranges:
+            units.append({'id': f"u{len(units) + 1:06d}", 'file': file_path,
+                          'pages': list(page_range) if page_range is not None else None})
+    return units
+
+
+class Lease:
+    def __init__(self, batch, unit, generation, owner):
+        self.batch = batch
+        self.unit = unit
+        self.generation = generation
+        self.owner = owner
+        self.path = batch.lease_path(unit['id'], generation)
+
+    def lost(self):
+        """已有更新的代次，说明本进程被判定为失联，单元已由其他进程接管"""
+        return os.path.exists(self.batch.lease_path(self.unit['id'], self.generation + 1))
+
+    def renew(self, ttl):
+        if self.lost():
+            return False
+        write_json(self.path, {'owner': self.owner, 'expires': time.time() + ttl})
+        return True
+
+    def release(self):
+        """提前结束租约，其他进程可以立即接管"""
+        if not self.lost():
+            write_json(self.path, {'owner': self.owner, 'expires': 0})
+
+
+class ShardBatch:
+    """共享盘上的批次目录"""
+
+    def __init__(self, batch_dir):
+        self.batch_dir = batch_dir
+        self.plan_path = os.path.join(batch_dir, BATCH_FILE)
+        self.lease_dir = os.path.join(batch_dir, 'leases')
+        self.work_dir = os.path.join(batch_dir, 'work')
+        self.done_dir = os.path.join(batch_dir, 'done')
+        for directory in (self.lease_dir, self.work_dir, self.done_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.units = []
+
+    def open(self, file_list, settings, page_limit, shard_pages=DEFAULT_SHARD_PAGES):
+        """加入已有的批次，或按file_list新建批次计划；参数或输入与批次计划不一致时抛出ValueError
+
+        多个进程同时新建时只有一个能创建成功，其余进程读取它写出的计划并据此检查自己的参数，
+        已经开始领取单元的批次计划不会被覆盖。
+        """
+        settings = json.loads(json.dumps(settings))
+        if not os.path.exists(self.plan_path):
+            if not file_list:
+                raise ValueError(f"批次目录中没有批次计划，需要指定输入文件: {self.batch_dir}")
+            self.create_plan({'settings': settings, 'shard_pages': shard_pages, 'created': time.time(),
+                              'units': plan_units(file_list, page_limit, shard_pages)})
+        plan = self.read_plan()
+        if plan['settings'] != settings:
+            raise ValueError("转换参数与批次计划中的参数不一致，所有进程必须使用相同的转换参数")
+        if file_list:
+            if plan['shard_pages'] != shard_pages:
+                raise ValueError(f"分片页数与批次计划不一致(批次计划为{plan['shard_pages']}页)")
+            if {os.path.abspath(path) for path in file_list} != {unit['file'] for unit in plan['units']}:
+                raise ValueError("输入文件与批次计划不一致；加入已有的批次时可以不指定输入文件")
+        self.units = plan['units']
+        return plan
+
+    def create_plan(self, plan):
+        """先写完整的临时文件，再用硬链接原子地创建batch.json，已存在时不覆盖"""
+        tmp_path = f"{self.plan_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False)
+        try:
+            os.link(tmp_path, self.plan_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # 不支持硬链接的共享盘：O_EXCL创建后再写入，其他进程在read_plan中等待内容写完
+            try:
+                fd = os.open(self.plan_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(plan, f, ensure_ascii=False)
+        finally:
+            os.remove(tmp_path)
+
+    def read_plan(self):
+        deadline = time.monotonic() + PLAN_WAIT
+        while True:
+            plan = read_json(self.plan_path)
+            if plan is not None:
+                return plan
+            if time.monotonic() > deadline:
+                raise ValueError(f"批次计划无法读取: {self.plan_path}")
+            time.sleep(0.2)
+
+    def lease_path(self, unit_id, generation):
+        return os.path.join(self.lease_dir, f"{unit_id}.{generation}")
+
+    def done_path(self, unit_id):
+        return os.path.join(self.done_dir, f"{unit_id}.jsonl")
+
+    def generations(self):
+        """各单元当前的最高代次"""
+        result = {}
+        for name in os.listdir(self.lease_dir):
+            unit_id, _, generation = name.partition('.')
+            if generation.isdigit():
+                result[unit_id] = max(result.get(unit_id, 0), int(generation))
+        return result
+
+    def done(self):
+        return {name[:-len('.jsonl')] for name in os.listdir(self.done_dir) if name.endswith('.jsonl')}
+
+    def expired(self, unit_id, generation, ttl):
+        path = self.lease_path(unit_id, generation)
+        lease = read_json(path)
+        if lease is None:
+            # 刚创建、还没写入内容的租约按文件修改时间计算
+            try:
+                return os.path.getmtime(path) + ttl < time.time()
+            except OSError:
+                return False
+        return lease['expires'] < time.time()
+
+    def try_create(self, unit, generation, owner, ttl):
+        try:
+            fd = os.open(self.lease_path(unit['id'], generation), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        os.close(fd)
+        lease = Lease(self, unit, generation, owner)
+        lease.renew(ttl)
+        # 列出目录之后其他进程可能刚完成该单元
+        if os.path.exists(self.done_path(unit['id'])):
+            return None
+        return lease
+
+    def claim(self, owner, ttl):
+        """领取一个单元，返回(租约或None, 未完成的单元数)"""
+        done = self.done()
+        generations = self.generations()
+        remaining = 0
+        for unit in self.units:
+            if unit['id'] in done:
+                continue
+            remaining += 1
+            generation = generations.get(unit['id'], 0)
+            if generation and not self.expired(unit['id'], generation, ttl):
+                continue
+            if generation >= MAX_ATTEMPTS:
+                self.give_up(unit, generation)
+                remaining -= 1
+                continue
+            lease = self.try_create(unit, generation + 1, owner, ttl)
+            if lease is not None:
+                return lease, remaining
+        return None, remaining
+
+    def give_up(self, unit, generation):
+        error = f"工作单元被中断{generation}次，不再重试"
+        print(f"{unit['file']} {unit['pages'] or ''}: {error}")
+        self.commit(unit, None, [{'type': 'file', 'file': unit['file'], 'status': 'failed', 'error': error,
+                                  'stages': {}, 'pages': 0, 'seconds': 0.0, 'bytes_written': 0}])
+
+    def commit(self, unit, lease, lines):
+        """写出单元报告，第一行记录单元和完成它的进程"""
+        header = {'type': 'unit', 'id': unit['id'], 'file': unit['file'], 'pages': unit['pages'],
+                  'worker': lease.owner if lease is not None else None,
+                  'attempt': lease.generation if lease is not None else None}
+        path = self.done_path(unit['id'])
+        tmp_path = os.path.join(self.work_dir, f"{unit['id']}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in [header] + lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, path)
+
+    def merge(self, report_path):
+        """合并所有单元的报告，写成与单进程批次格式相同的运行报告，返回批次汇总"""
+        files = {}
+        pages = []
+        batches = []
+        workers = {}
+        retried = 0
+        for unit in self.units:
+            try:
+                with open(self.done_path(unit['id']), 'r', encoding='utf-8') as f:
+                    lines = [json.loads(line) for line in f if line.strip()]
+            except OSError:
+                continue
+            for line in lines:
+                kind = line.pop('type')
+                if kind == 'unit':
+                    workers[line['worker']] = workers.get(line['worker'], 0) + 1
+                    retried += bool(line['attempt'] and line['attempt'] > 1)
+                elif kind == 'file':
+                    merge_file_record(files, line)
+                elif kind == 'page':
+                    pages.append(line)
+                elif kind == 'batch':
+                    batches.append(line)
+        pages.sort(key=lambda timing: (timing['file'], timing['page']))
+        summary = merge_summaries(batches, pages, files)
+        summary['shards'] = {'units': len(self.units), 'retried': retried,
+                             'workers': {worker: count for worker, count in workers.items() if worker}}
+        tmp_path = f"{report_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in files.values():
+                f.write(json.dumps({'type': 'file', **record}, ensure_ascii=False) + '\n')
+            for timing in pages:
+                f.write(json.dumps({'type': 'page', **timing}, ensure_ascii=False) + '\n')
+            f.write(json.dumps({'type': 'batch', **summary}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, report_path)
+        return summary
+
+
+# 同一文件拆分为多个单元时，合并后的状态取最严重的一个
+STATUS_ORDER = ('done', 'skipped', 'cancelled', 'failed')
+
+
+def merge_file_record(files, record):
+    merged = files.get(record['file'])
+    if merged is None:
+        files[record['file']] = dict(record, stages=dict(record['stages']))
+        return
+    if STATUS_ORDER.index(record['status']) > STATUS_ORDER.index(merged['status']):
+        merged['status'] = record['status']
+    merged['error'] = merged['error'] or record['error']
+    for key in ('pages', 'seconds', 'bytes_written'):
+        merged[key] += record[key]
+    for stage, seconds in record['stages'].items():
+        merged['stages'][stage] = merged['stages'].get(stage, 0.0) + seconds
+
+
+def merge_summaries(batches, pages, files):
+    """按RunReport.summary的格式汇总；seconds为从最早开始到最晚结束的时间，worker_seconds为各单元耗时之和"""
+    statuses = {}
+    stages = {}
+    for record in files.values():
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+        for stage, seconds in record['stages'].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    colorspaces = {}
+    for timing in pages:
+        if timing.get('colorspace') is not None:
+            colorspaces[timing['colorspace']] = colorspaces.get(timing['colorspace'], 0) + 1
+    started = min((batch['started'] for batch in batches), default=time.time())
+    summary = {
+        'started': started,
+        'seconds': max((batch['started'] + batch['seconds'] for batch in batches), default=started) - started,
+        'worker_seconds': sum(batch['seconds'] for batch in batches),
+        'files': statuses,
+        'pages': len(pages),
+        'bytes_written': sum(timing.get('bytes', 0) for timing in pages),
+        'stages': stages,
+        'colorspaces': colorspaces,
+        'passthrough': sum(1 for timing in pages if 'passthrough' in timing),
+    }
+    encoding = next((batch['encoding'] for batch in batches if 'encoding' in batch), None)
+    if encoding is not None:
+        encoded = [timing for timing in pages if 'encode' in timing]
+        summary['encoding'] = dict(encoding, encoded_pages=len(encoded),
+                                   encode_ms_per_page=(sum(timing['encode'] for timing in encoded) /
+                                                       len(encoded) * 1000) if encoded else None,
+                                   bytes_per_page=(sum(timing.get('bytes', 0) for timing in encoded) //
+                                                   len(encoded)) if encoded else None)
+    return summary
+
+
+class ShardWorker:
+    """在批次目录中反复领取单元并用engine转换，直到所有单元完成
+
+    engine的运行报告路径作为合并后的报告路径，各单元的报告写在批次目录中。
+    单元转换时不做预检：预检每次都要读取整个文档，同一文档拆成多个单元时会重复很多次；
+    损坏或加密的文件在转换时照样报告为失败。
+    """
+
+    def __init__(self, engine, batch_dir, lease_ttl=DEFAULT_LEASE_TTL, owner=None):
+        if engine.sink_kind != 'files':
+            raise ValueError("分片批处理需要每页输出为单独的文件，不能与压缩包输出同时使用")
+        if engine.incremental:
+            raise ValueError("分片批处理由批次目录记录进度，不能与增量转换同时使用")
+        self.engine = engine
+        self.batch = ShardBatch(batch_dir)
+        self.lease_ttl = lease_ttl
+        self.owner = owner or worker_id()
+        self.report_path = engine.report_path
+
+    def run(self, file_list=None, callback=None, shard_pages=DEFAULT_SHARD_PAGES):
+        """转换直到批次完成，返回合并后的批次汇总；file_list为空时加入已有的批次"""
+        self.batch.open(file_list, self.engine.settings(), self.engine.page_limit, shard_pages)
+        print(f"分片批处理: {len(self.batch.units)}个单元, 本进程{self.owner}")
+        preflight = self.engine.preflight
+        self.engine.preflight = False
+        self.engine.start_workers()
+        try:
+            while True:
+                lease, remaining = self.batch.claim(self.owner, self.lease_ttl)
+                if lease is not None:
+                    self.run_unit(lease, callback)
+                elif remaining == 0:
+                    break
+                else:
+                    # 其余单元由其他进程处理中，等待完成或租约过期
+                    time.sleep(IDLE_INTERVAL)
+        finally:
+            self.engine.stop_workers()
+            self.engine.report_path = self.report_path
+            self.engine.preflight = preflight
+        return self.batch.merge(self.report_path)
+
+    def run_unit(self, lease, callback):
+        unit = lease.unit
+        work_path = os.path.join(self.batch.work_dir, f"{unit['id']}.{uuid.uuid4().hex}.jsonl")
+        self.engine.report_path = work_path
+        self.engine.page_ranges = {unit['file']: tuple(unit['pages'])} if unit['pages'] else {}
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease_ttl / 3):
+                if not lease.renew(self.lease_ttl):
+                    print(f"{unit['id']}的租约已被其他进程接管，停止转换")
+                    lost.set()
+                    self.engine.cancel()
+                    return
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        finished = None
+        try:
+            for event in self.engine.iter_convert([unit['file']]):
+                if event.kind == BATCH_FINISHED:
+                    finished = event
+                if callback is not None:
+                    callback(event)
+        except BaseException:
+            lease.release()
+            raise
+        finally:
+            stop.set()
+            thread.join()
+            self.engine.page_ranges = {}
+        try:
+            if lost.is_set() or lease.lost() or finished is None or self.engine.control.cancelled.is_set():
+                lease.release()
+                return
+            try:
+                with open(work_path, 'r', encoding='utf-8') as f:
+                    lines = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                # 单元报告没有写成功时交给其他进程(或本进程稍后)重新转换
+                print(f"读取{unit['id']}的报告失败: {e}")
+                lease.release()
+                return
+            self.batch.commit(unit, lease, lines)
+        finally:
+            if os.path.exists(work_path):
+                os.remove(work_path)
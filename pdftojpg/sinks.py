@@ -0,0 +1,230 @@
+"""输出位置：默认每页写成输出目录下的单独文件，也可以流式写入ZIP/TAR压缩包
+
+大批量转换时几十万个小文件在网络共享目录上创建很慢，下游通常还要重新打包；
+压缩包可以整批一个或每个文档一个，包内文件名与单独文件相同({base}_page_{n}.{format})，
+放在子目录中的输出(如按子目录布局的尺寸变体)在包内保留相对路径。
+图片本身已经压缩，包内条目只存储不再压缩。
+
+渲染流水线的写入线程和主线程（条带渲染、收集子进程输出）都会写入同一个压缩包，
+每个条目在锁内完整写入。条带渲染的超大页面在ZIP中直接流式写入条目；
+TAR的条目头部需要预先知道大小，先写入超过阈值后落盘的临时缓冲区，不会把整页保存在内存中。
+"""
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+
+SINK_KINDS = ('files', 'zip', 'tar')
+ARCHIVE_SCOPES = ('batch', 'document')
+
+# 整批输出时压缩包的默认文件名(不含扩展名)
+DEFAULT_ARCHIVE_NAME = 'pages'
+
+# TAR条目在内存中缓冲的上限，超出后转存到临时文件
+TAR_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+class CountingWriter:
+    """包装可写对象，统计写入的字节数；关闭时先调用on_close(此时f仍可读写)，再关闭f"""
+
+    def __init__(self, f, on_close=None):
+        self.f = f
+        self.on_close = on_close
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        try:
+            if self.on_close is not None:
+                self.on_close(self)
+        finally:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileSink:
+    """每页写成单独的文件，output_path即为文件路径"""
+    archive = False
+
+    def begin_document(self, base_name):
+        pass
+
+    def end_document(self, success=True):
+        pass
+
+    def write(self, output_path, data):
+        with open(output_path, 'wb') as f:
+            f.write(data)
+
+    def open(self, output_path):
+        """返回流式写入一个输出文件的对象，关闭后写入完成"""
+        return CountingWriter(open(output_path, 'wb'))
+
+    def add_file(self, src_path, output_path=None):
+        if output_path is not None and output_path != src_path:
+            shutil.move(src_path, output_path)
+
+    def close(self, success=True):
+        pass
+
+
+class ArchiveSink:
+    """流式写入压缩包：scope为batch时整批一个压缩包，为document时每个文档一个
+
+    压缩包先写成.part文件，完整写完后再改名，下游不会读到写了一半的压缩包；
+    文档转换失败或批次中断时保留.part文件名，不完整的压缩包不会被当作已完成。
+    """
+    archive = True
+    extension = None
+
+    def __init__(self, output_dir, scope='batch', archive_name=DEFAULT_ARCHIVE_NAME):
+        if scope not in ARCHIVE_SCOPES:
+            raise ValueError(f"不支持的压缩包范围: {scope}")
+        self.output_dir = output_dir
+        self.scope = scope
+        self.archive_name = archive_name
+        self.lock = threading.Lock()
+        self.handle = None
+        self.path = None
+        self.paths = []
+
+    def archive_path(self, name):
+        return os.path.join(self.output_dir, f"{name}.{self.extension}")
+
+    def entry_name(self, output_path):
+        """包内条目名：输出文件相对输出目录的路径，统一用/分隔"""
+        return os.path.relpath(output_path, self.output_dir).replace(os.sep, '/')
+
+    def begin_document(self, base_name):
+        if self.scope == 'document':
+            self.close()
+            self.start(base_name)
+
+    def end_document(self, success=True):
+        if self.scope == 'document':
+            self.close(success)
+
+    def ensure_open(self):
+        if self.handle is None:
+            self.start(self.archive_name)
+
+    def start(self, name):
+        self.path = self.archive_path(name)
+        self.handle = self.open_archive(self.path + '.part')
+
+    def close(self, success=True):
+        with self.lock:
+            if self.handle is None:
+                return
+            self.handle.close()
+            self.handle = None
+            if not success:
+                print(f"压缩包未完整写完，保留为: {self.path}.part")
+                return
+            os.replace(self.path + '.part', self.path)
+            self.paths.append(self.path)
+
+    def write(self, output_path, data):
+        with self.lock:
+            self.ensure_open()
+            self.write_entry(self.entry_name(output_path), data)
+
+    def add_file(self, src_path, output_path=None):
+        """把磁盘上的文件（如子进程写出的页面）分块复制进压缩包，然后删除原文件"""
+        name = self.entry_name(output_path or src_path)
+        with self.lock:
+            self.ensure_open()
+            self.copy_entry(name, src_path)
+        os.remove(src_path)
+
+
+class ZipSink(ArchiveSink):
+    extension = 'zip'
+
+    def open_archive(self, path):
+        return zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def entry_info(self, name):
+        return zipfile.ZipInfo(name, time.localtime()[:6])
+
+    def write_entry(self, name, data):
+        self.handle.writestr(self.entry_info(name), data)
+
+    def copy_entry(self, name, src_path):
+        self.handle.write(src_path, name)
+
+    def open(self, output_path):
+        """直接流式写入一个条目，写完之前其他线程不能写入同一压缩包"""
+        self.lock.acquire()
+        try:
+            self.ensure_open()
+            entry = self.handle.open(self.entry_info(self.entry_name(output_path)), 'w', force_zip64=True)
+        except BaseException:
+            self.lock.release()
+            raise
+
+        def finish(writer):
+            try:
+                entry.close()
+            finally:
+                self.lock.release()
+
+        return CountingWriter(entry, finish)
+
+
+class TarSink(ArchiveSink):
+    extension = 'tar'
+
+    def open_archive(self, path):
+        return tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+
+    def entry_info(self, name, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = time.time()
+        return info
+
+    def write_entry(self, name, data):
+        self.handle.addfile(self.entry_info(name, len(data)), io.BytesIO(data))
+
+    def copy_entry(self, name, src_path):
+        self.handle.add(src_path, name)
+
+    def open(self, output_path):
+        name = self.entry_name(output_path)
+        spool = tempfile.SpooledTemporaryFile(max_size=TAR_SPOOL_SIZE)
+
+        def finish(writer):
+            spool.seek(0)
+            with self.lock:
+                self.ensure_open()
+                self.handle.addfile(self.entry_info(name, writer.bytes_written), spool)
+
+        return CountingWriter(spool, finish)
+
+
+def make_sink(kind='files', output_dir=None, scope='batch', archive_name=DEFAULT_ARCHIVE_NAME):
+    if kind == 'files':
+        return FileSink()
+    if kind == 'zip':
+        return ZipSink(output_dir, scope, archive_name)
+    if kind == 'tar':
+        return TarSink(output_dir, scope, archive_name)
+    raise ValueError(f"不支持的输出方式: {kind}")
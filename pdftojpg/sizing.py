@@ -0,0 +1,60 @@
+"""按目标尺寸渲染：根据每页的实际尺寸计算DPI，使不同幅面的页面输出大小可控
+
+渲染参数可以是固定DPI(数字)，也可以是Sizing：
+- longest_edge: 输出图片长边的像素数
+- megapixels: 每页输出的像素总数(百万)
+min_dpi/max_dpi可选，用于限制极小或极大页面算出的DPI。
+"""
+import math
+from collections import namedtuple
+
+
+Sizing = namedtuple('Sizing', ['longest_edge', 'megapixels', 'min_dpi', 'max_dpi'],
+                    defaults=(None, None, None, None))
+
+
+def make_sizing(longest_edge=None, megapixels=None, min_dpi=None, max_dpi=None):
+    """校验参数并创建Sizing，两种目标必须且只能指定一种"""
+    if (longest_edge is None) == (megapixels is None):
+        raise ValueError("按目标尺寸渲染时需要指定长边像素或总像素中的一个")
+    if longest_edge is not None and longest_edge <= 0:
+        raise ValueError("长边像素必须大于0")
+    if megapixels is not None and megapixels <= 0:
+        raise ValueError("总像素必须大于0")
+    if min_dpi is not None and max_dpi is not None and min_dpi > max_dpi:
+        raise ValueError("最小DPI不能大于最大DPI")
+    return Sizing(longest_edge, megapixels, min_dpi, max_dpi)
+
+
+def page_dpi(resolution, width, height):
+    """按页面尺寸(点)计算渲染DPI；resolution为固定DPI时原样返回"""
+    if not isinstance(resolution, Sizing):
+        return resolution
+    if resolution.longest_edge is not None:
+        dpi = resolution.longest_edge * 72 / max(width, height, 1)
+    else:
+        dpi = 72 * math.sqrt(resolution.megapixels * 1e6 / max(width * height, 1))
+    if resolution.min_dpi is not None:
+        dpi = max(dpi, resolution.min_dpi)
+    if resolution.max_dpi is not None:
+        dpi = min(dpi, resolution.max_dpi)
+    return dpi
+
+
+def page_matrix(resolution, rect):
+    """页面的渲染矩阵"""
+    import fitz  # PyMuPDF
+
+    zoom = page_dpi(resolution, rect.width, rect.height) / 72
+    return fitz.Matrix(zoom, zoom)
+
+
+def describe_resolution(resolution):
+    """用于日志和报告的中文说明"""
+    if not isinstance(resolution, Sizing):
+        return f"{resolution}DPI"
+    text = (f"长边{resolution.longest_edge}像素" if resolution.longest_edge is not None
+            else f"每页{resolution.megapixels}百万像素")
+    if resolution.min_dpi is not None or resolution.max_dpi is not None:
+        text += f"(DPI范围{resolution.min_dpi or '-'}~{resolution.max_dpi or '-'})"
+    return text
@@ -0,0 +1,134 @@
+"""无法调用Word时的文本回退渲染：把文档文本按固定尺寸分页排版，逐页绘制成图片
+
+按实际字宽折行：西文在空格处断行，中日韩文字可以在任意字符之间断行，单词超过整行宽度时强制断开。
+字体和每个字符的宽度在进程内缓存，转换多个文档时不再重复查找字体文件和测量字形。
+排版只计算每页包含哪些行，绘制在逐页取出图片时才进行，max_pages限制页数时超出的部分不排版。
+"""
+import unicodedata
+from functools import lru_cache
+
+
+# 页面尺寸按A4比例，宽度与以前的文本图片一致
+PAGE_WIDTH = 800
+PAGE_HEIGHT = 1131
+MARGIN = 50
+
+FONT_SIZE = 16
+TITLE_FONT_SIZE = 20
+LINE_HEIGHT = 25
+# 第一页标题的位置和正文起始位置
+TITLE_TOP = 30
+FIRST_PAGE_TOP = 80
+
+# 依次尝试的字体文件，都不可用时使用Pillow的默认字体
+FONT_NAMES = ('arial.ttf', 'simhei.ttf')
+
+BACKGROUND_COLOR = 'white'
+TEXT_COLOR = 'black'
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    """按字号加载字体，结果在进程内缓存"""
+    from PIL import ImageFont
+
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=65536)
+def char_width(font, char):
+    return font.getlength(char)
+
+
+def text_width(font, text):
+    return sum(char_width(font, char) for char in text)
+
+
+def can_break_after(char):
+    """空格之后和中日韩等全角字符之后可以断行"""
+    return char.isspace() or unicodedata.east_asian_width(char) in ('W', 'F')
+
+
+def wrap_line(text, font, max_width):
+    """按宽度把一行文本折成多行"""
+    lines = []
+    start = 0
+    width = 0
+    last_break = None
+    i = 0
+    while i < len(text):
+        width += char_width(font, text[i])
+        if width > max_width and i > start:
+            # 在最后一个断点处断开，没有断点时在当前字符之前强制断开
+            end = last_break if last_break is not None else i
+            lines.append(text[start:end].rstrip())
+            start = end
+            while start < len(text) and text[start].isspace():
+                start += 1
+            i = max(i, start)
+            width = text_width(font, text[start:i])
+            last_break = None
+            continue
+        if can_break_after(text[i]):
+            last_break = i + 1
+        i += 1
+    if start < len(text) or not lines:
+        lines.append(text[start:].rstrip())
+    return lines
+
+
+def first_page_lines():
+    return (PAGE_HEIGHT - FIRST_PAGE_TOP - MARGIN) // LINE_HEIGHT
+
+
+def page_lines():
+    return (PAGE_HEIGHT - MARGIN * 2) // LINE_HEIGHT
+
+
+def layout_pages(text_lines, max_pages=None):
+    """把文本行排版成页，返回每页的行列表；max_pages不为空时排满该页数后停止"""
+    font = load_font(FONT_SIZE)
+    max_width = PAGE_WIDTH - MARGIN * 2
+    pages = []
+    current = []
+    capacity = first_page_lines()
+    for text in text_lines:
+        for line in wrap_line(text, font, max_width):
+            if len(current) >= capacity:
+                pages.append(current)
+                if max_pages is not None and len(pages) >= max_pages:
+                    return pages
+                current = []
+                capacity = page_lines()
+            current.append(line)
+    if current or not pages:
+        pages.append(current)
+    return pages
+
+
+def draw_page(lines, title=None):
+    """绘制一页；title不为空时绘制在页面顶部(文档的第一页)"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (PAGE_WIDTH, PAGE_HEIGHT), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(img)
+    y_position = MARGIN
+    if title is not None:
+        draw.text((MARGIN, TITLE_TOP), title, fill=TEXT_COLOR, font=load_font(TITLE_FONT_SIZE))
+        y_position = FIRST_PAGE_TOP
+    font = load_font(FONT_SIZE)
+    for line in lines:
+        draw.text((MARGIN, y_position), line, fill=TEXT_COLOR, font=font)
+        y_position += LINE_HEIGHT
+    return img
+
+
+def text_pages(text_lines, title, max_pages=None):
+    """排版文本并返回逐页绘制的无参数函数列表，调用时才绘制对应的页面"""
+    return [lambda index=index, lines=lines: draw_page(lines, title if index == 0 else None)
+            for index, lines in enumerate(layout_pages(text_lines, max_pages))]
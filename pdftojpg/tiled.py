@@ -0,0 +1,221 @@
+"""超大页面的条带渲染：按水平条带逐段光栅化并流式写出，单页峰值内存不超过设定的预算
+
+PNG用逐行压缩的流式写入器；JPEG每个条带单独编码后在重启标记(RST)处拼接成一个完整的基线JPEG，
+条带高度取16的倍数以对齐MCU，解码结果与整页编码一致。拼接要求各条带使用相同的标准霍夫曼表，
+因此条带JPEG总是关闭霍夫曼优化和渐进式编码，质量和色度抽样沿用编码参数。
+WebP不能流式写出，超出预算的WebP页面总是写成分块文件。也可以选择把每个条带写成单独的分块文件。
+"""
+import io
+import os
+import struct
+import zlib
+
+import fitz  # PyMuPDF
+
+from .encode import PRESETS, DEFAULT_PRESET, pixmap_to_image, save_image
+from .sinks import FileSink
+
+
+DEFAULT_TILE_BUDGET = 256 * 1024 * 1024
+
+# 条带高度对齐到JPEG最大的MCU高度(4:2:0采样时为16行)
+BAND_ALIGN = 16
+
+# 色度抽样 -> JPEG的MCU尺寸(宽, 高)
+MCU_SIZES = {0: (8, 8), 1: (16, 8), 2: (16, 16)}
+
+# PNG每积累这么多压缩数据输出一个IDAT块
+PNG_CHUNK_SIZE = 256 * 1024
+
+
+def page_pixel_rect(page, mat):
+    """与get_pixmap一致的整页像素范围"""
+    return (page.rect * mat).irect
+
+
+def needs_tiling(page, mat, budget, channels=3):
+    if not budget:
+        return False
+    irect = page_pixel_rect(page, mat)
+    return irect.width * irect.height * channels > budget
+
+
+def mcu_size(channels, subsampling):
+    """灰度JPEG只有一个分量，MCU固定为8x8"""
+    return (8, 8) if channels == 1 else MCU_SIZES[subsampling]
+
+
+def band_rows(width, budget, channels=3, format_type=None, subsampling=2):
+    """按内存预算计算每个条带的行数"""
+    rows = max(BAND_ALIGN, budget // max(1, width * channels))
+    if format_type == 'jpeg':
+        # 重启间隔(每条带的MCU数)是16位整数
+        mcu_width, mcu_height = mcu_size(channels, subsampling)
+        mcus_per_row = (width + mcu_width - 1) // mcu_width
+        rows = min(rows, max(1, 65535 // mcus_per_row // (BAND_ALIGN // mcu_height)) * BAND_ALIGN)
+    return rows - rows % BAND_ALIGN
+
+
+def iter_bands(page, mat, rows, colorspace=fitz.csRGB, display_list=None):
+    """逐个产出条带pixmap，页面只解析一次；display_list为调用方已经生成的显示列表"""
+    if display_list is None:
+        display_list = page.get_displaylist()
+    irect = page_pixel_rect(page, mat)
+    inverse = ~mat
+    for y0 in range(irect.y0, irect.y1, rows):
+        y1 = min(irect.y1, y0 + rows)
+        clip = fitz.Rect(irect.x0, y0, irect.x1, y1) * inverse
+        yield display_list.get_pixmap(matrix=mat, colorspace=colorspace, clip=clip)
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+class PngStreamWriter:
+    """逐行写入PNG，内存中只保留当前条带"""
+
+    def __init__(self, f, width, height, channels, compress_level=6):
+        self.f = f
+        self.row_bytes = width * channels
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = []
+        self.pending_size = 0
+        color_type = {1: 0, 3: 2}[channels]
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+
+    def write_band(self, pix):
+        samples = pix.samples_mv
+        for y in range(pix.height):
+            start = y * pix.stride
+            # 每行前加过滤类型0(None)
+            self.add(self.compressor.compress(b'\x00'))
+            self.add(self.compressor.compress(samples[start:start + self.row_bytes]))
+
+    def add(self, data):
+        if data:
+            self.pending.append(data)
+            self.pending_size += len(data)
+            if self.pending_size >= PNG_CHUNK_SIZE:
+                self.flush_idat()
+
+    def flush_idat(self):
+        if self.pending:
+            self.f.write(png_chunk(b'IDAT', b''.join(self.pending)))
+            self.pending = []
+            self.pending_size = 0
+
+    def close(self):
+        self.add(self.compressor.flush())
+        self.flush_idat()
+        self.f.write(png_chunk(b'IEND', b''))
+
+
+def split_jpeg(data):
+    """把基线JPEG拆成(SOS之前的各段, SOS段, 熵编码数据)"""
+    if data[:2] != b'\xff\xd8' or data[-2:] != b'\xff\xd9':
+        raise ValueError("JPEG数据不完整")
+    pos = 2
+    while pos < len(data):
+        marker = data[pos + 1]
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        end = pos + 2 + length
+        if marker == 0xDA:
+            return data[:pos], data[pos:end], data[end:-2]
+        pos = end
+    raise ValueError("JPEG中没有扫描数据")
+
+
+class JpegStripWriter:
+    """把逐条带编码的JPEG拼接成一个文件：条带之间插入RST标记，头部高度改为整页高度"""
+
+    def __init__(self, f, width, height, options=None):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.index = 0
+        self.options = strip_options(options)
+
+    def write_band(self, pix):
+        buffer = io.BytesIO()
+        save_image(pixmap_to_image(pix), buffer, 'jpeg', self.options)
+        header, sos, scan = split_jpeg(buffer.getvalue())
+        if self.index == 0:
+            mcu_width, mcu_height = mcu_size(pix.n, self.options.subsampling)
+            mcus_per_row = (self.width + mcu_width - 1) // mcu_width
+            restart_interval = mcus_per_row * (pix.height // mcu_height)
+            self.f.write(self.patch_height(header))
+            self.f.write(b'\xff\xdd' + struct.pack('>HH', 4, restart_interval))
+            self.f.write(sos)
+        else:
+            self.f.write(bytes((0xFF, 0xD0 + (self.index - 1) % 8)))
+        self.f.write(scan)
+        self.index += 1
+
+    def patch_height(self, header):
+        header = bytearray(header)
+        pos = 2
+        while pos < len(header):
+            marker = header[pos + 1]
+            length = struct.unpack('>H', header[pos + 2:pos + 4])[0]
+            if marker == 0xC0:
+                header[pos + 5:pos + 7] = struct.pack('>H', self.height)
+                return bytes(header)
+            pos += 2 + length
+        raise ValueError("JPEG头部缺少SOF0")
+
+    def close(self):
+        self.f.write(b'\xff\xd9')
+
+
+def strip_options(options):
+    """条带拼接用的JPEG参数：保留质量和色度抽样，关闭霍夫曼优化和渐进式"""
+    if options is None:
+        options = PRESETS[DEFAULT_PRESET]
+    return options._replace(optimize=False, progressive=False)
+
+
+def tile_output_path(output_path, index):
+    """分块文件命名: {base}_page_{n}_tile_{k}.{format}，k从1开始"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_tile_{index+1}{ext}"
+
+
+def render_tiled(page, mat, output_path, format_type, budget, tiles=False, options=None,
+                 colorspace='rgb', display_list=None, sink=None):
+    """按条带渲染整页并写出，返回(写出的文件路径列表, 写出字节数)
+
+    colorspace为'rgb'或'gray'；sink为输出位置，默认写成单独的文件。
+    """
+    if sink is None:
+        sink = FileSink()
+    irect = page_pixel_rect(page, mat)
+    cs = fitz.csGRAY if colorspace == 'gray' else fitz.csRGB
+    subsampling = options.subsampling if options is not None else PRESETS[DEFAULT_PRESET].subsampling
+    rows = band_rows(irect.width, budget, cs.n, format_type, subsampling)
+
+    if tiles or format_type == 'webp':
+        outputs = []
+        size = 0
+        for index, band in enumerate(iter_bands(page, mat, rows, cs, display_list)):
+            tile_path = tile_output_path(output_path, index)
+            with sink.open(tile_path) as f:
+                save_image(pixmap_to_image(band), f, format_type, options)
+            size += f.bytes_written
+            outputs.append(tile_path)
+            # 先释放当前条带再渲染下一条带，保证同时只有一个条带在内存中
+            del band
+        return outputs, size
+
+    with sink.open(output_path) as f:
+        if format_type == 'png':
+            compress_level = options.compress_level if options is not None else 6
+            writer = PngStreamWriter(f, irect.width, irect.height, cs.n, compress_level)
+        else:
+            writer = JpegStripWriter(f, irect.width, irect.height, options)
+        for band in iter_bands(page, mat, rows, cs, display_list):
+            writer.write_band(band)
+            del band
+        writer.close()
+    return [output_path], f.bytes_written
@@ -0,0 +1,91 @@
+"""多尺寸输出：每页只渲染一次，网页图、缩略图等较小的尺寸从同一块像素缓冲区缩小得到
+
+每个尺寸变体有自己的名称、长边像素数和输出格式，输出位置有两种布局：
+- suffix: 与原图同目录，文件名加后缀 {base}_page_{n}_{name}.{format}
+- subdir: 放在以变体名称命名的子目录中 {name}/{base}_page_{n}.{format}
+
+缩小在编码线程中用Pillow完成：先按整数倍reduce(盒式平均，很快)，再做一次精细的重采样。
+变体不会比原图更大；直通的扫描图片在解码时直接按缩小后的尺寸解码JPEG。
+"""
+import io
+import os
+from collections import namedtuple
+
+from PIL import Image
+
+from .encode import OUTPUT_FORMATS
+
+
+Variant = namedtuple('Variant', ['name', 'longest_edge', 'format_type'])
+
+VARIANT_LAYOUTS = ('suffix', 'subdir')
+
+# resize的reducing_gap：先用reduce缩小到目标尺寸的这么多倍以内，再重采样
+REDUCING_GAP = 2.0
+
+
+def make_variant(name, longest_edge, format_type='jpeg'):
+    if not name or os.sep in name or '/' in name or name in ('.', '..'):
+        raise ValueError(f"变体名称无效: {name}")
+    if longest_edge <= 0:
+        raise ValueError("变体的长边像素必须大于0")
+    if format_type not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {format_type}")
+    return Variant(name, int(longest_edge), format_type)
+
+
+def parse_variant(spec):
+    """解析命令行的变体说明 名称:长边像素[:格式]，如 thumb:256:jpeg"""
+    parts = spec.split(':')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"变体格式应为 名称:长边像素[:格式]: {spec}")
+    try:
+        longest_edge = int(parts[1])
+    except ValueError:
+        raise ValueError(f"变体的长边像素必须是整数: {spec}")
+    return make_variant(parts[0], longest_edge, parts[2] if len(parts) == 3 else 'jpeg')
+
+
+def variant_output_path(output_path, variant, layout='suffix'):
+    directory, filename = os.path.split(output_path)
+    root = os.path.splitext(filename)[0]
+    if layout == 'subdir':
+        return os.path.join(directory, variant.name, f"{root}.{variant.format_type}")
+    return os.path.join(directory, f"{root}_{variant.name}.{variant.format_type}")
+
+
+def variant_outputs(output_path, variants, layout='suffix'):
+    """一页的各个变体，返回[(输出路径, 格式, 长边像素)]"""
+    return [(variant_output_path(output_path, variant, layout), variant.format_type, variant.longest_edge)
+            for variant in variants]
+
+
+def variant_dirs(output_dir, variants, layout='suffix'):
+    """subdir布局下需要预先创建的子目录"""
+    return [os.path.join(output_dir, variant.name) for variant in variants] if layout == 'subdir' else []
+
+
+def variant_size(width, height, longest_edge):
+    """按长边缩小后的尺寸，不放大"""
+    scale = min(1.0, longest_edge / max(width, height, 1))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def downscale(img, longest_edge):
+    """把PIL图片缩小到长边不超过longest_edge"""
+    size = variant_size(img.width, img.height, longest_edge)
+    if img.mode == '1':
+        # 黑白图片先转灰度，缩小后的边缘保留灰阶
+        img = img.convert('L')
+    if size == img.size:
+        return img
+    return img.resize(size, Image.BILINEAR, reducing_gap=REDUCING_GAP)
+
+
+def decode_for_variants(data, longest_edge):
+    """解码直通的原始图片数据；JPEG按所需的最大变体尺寸缩小解码，省去大部分解码工作"""
+    img = Image.open(io.BytesIO(data))
+    if img.format == 'JPEG':
+        img.draft(img.mode, variant_size(img.width, img.height, longest_edge))
+    img.load()
+    return img
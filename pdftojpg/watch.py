@@ -0,0 +1,350 @@
+"""监视模式：持续监视投递文件夹，新到达或修改过的PDF/.docx写完后立即转换
+
+以前靠定时重复运行批量转换来处理新到的扫描件，每次都要重新遍历整个目录树。
+监视模式只在启动时遍历一次，之后：
+- Linux上用inotify接收文件写完(IN_CLOSE_WRITE)、移入和新建子目录的通知，不再扫描目录树
+- 其他系统或inotify不可用时轮询：只检查各目录的修改时间，有变化的目录才重新列出其中的文件；
+  原地改写文件不改变目录的修改时间，已知文件的大小和修改时间另外轮流检查，每轮最多POLL_STAT_BATCH个
+
+收到通知的文件要等写入方写完：文件大小和修改时间保持不变超过settle秒才开始转换；
+inotify报告文件已关闭时只需保持QUICK_SETTLE秒。转换沿用同一个ConversionEngine，
+进程池和Word导出后端在整个监视期间保持运行，每批就绪的文件作为一个批次转换。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from .engine import SUPPORTED_EXTENSIONS, scan_folder
+
+
+# 文件大小和修改时间保持不变多少秒后视为写完
+DEFAULT_SETTLE = 2.0
+# inotify报告写入方已关闭文件后的等待时间
+QUICK_SETTLE = 0.25
+# 轮询模式下检查目录变化的间隔(秒)
+DEFAULT_POLL_INTERVAL = 2.0
+# 等待文件写完时检查一次的间隔(秒)
+CHECK_INTERVAL = 0.1
+# 轮询模式下每轮最多检查多少个已知文件，文件很多时分几轮轮流检查完
+POLL_STAT_BATCH = 5000
+
+# inotify事件掩码(见linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_candidate(path, extensions=SUPPORTED_EXTENSIONS):
+    """支持的格式，并排除Word打开文档时生成的~$锁文件和隐藏文件"""
+    name = os.path.basename(path)
+    return name.lower().endswith(extensions) and not name.startswith(('~$', '.'))
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+class Inotify:
+    """通过ctypes调用Linux的inotify，递归监视目录"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify初始化失败")
+        self.dirs = {}
+
+    def add(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            # 超出fs.inotify.max_user_watches等限制时由调用方改用轮询
+            raise OSError(ctypes.get_errno(), f"无法监视目录: {directory}")
+        self.dirs[wd] = directory
+
+    def read(self, timeout):
+        """等待最多timeout秒，返回[(路径, 事件掩码)]"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            directory = self.dirs.get(wd)
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+            elif directory is not None:
+                events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """监视若干目录，产出写完的新文件或修改过的文件
+
+    existing为True时启动时已有的文件也作为新文件处理(配合增量模式可以补齐上次未转换的文件)；
+    ignore为不监视的目录，如位于投递文件夹内的输出目录；use_inotify为False时总是轮询。
+    """
+
+    def __init__(self, paths, extensions=SUPPORTED_EXTENSIONS, settle=DEFAULT_SETTLE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, existing=False, ignore=(), use_inotify=True):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.extensions = extensions
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.ignore = [os.path.abspath(path) for path in ignore]
+        # 等待写完的文件 {路径: (上次观察到的大小和修改时间, 状态变化的时间, 是否已关闭)}
+        self.pending = {}
+        # 已知文件的大小和修改时间，用于判断文件是否有变化
+        self.known = {}
+        # 轮询模式下各目录的修改时间
+        self.dir_mtimes = {}
+        self.last_poll = 0.0
+        # 轮询模式下下一轮从第几个已知文件开始检查
+        self.stat_cursor = 0
+        self.inotify = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                print(f"inotify不可用，改为轮询: {e}")
+        for path in self.paths:
+            self.add_tree(path, existing)
+
+    @property
+    def mode(self):
+        return 'inotify' if self.inotify is not None else 'poll'
+
+    def ignored(self, path):
+        return any(path == ignored or path.startswith(ignored + os.sep) for ignored in self.ignore)
+
+    def add_tree(self, root, queue_files=True):
+        """开始监视root及其所有子目录；queue_files为True时其中已有的文件等待写完后转换"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            if self.ignored(directory):
+                continue
+            self.watch_dir(directory)
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif is_candidate(entry.path, self.extensions) and entry.is_file():
+                        if queue_files:
+                            self.touch(entry.path)
+                        else:
+                            self.known[entry.path] = file_state(entry.path)
+                except OSError:
+                    continue
+
+    def watch_dir(self, directory):
+        if self.inotify is not None:
+            try:
+                self.inotify.add(directory)
+                return
+            except OSError as e:
+                print(f"inotify无法继续添加监视，改为轮询: {e}")
+                self.inotify.close()
+                self.inotify = None
+                # 已经用inotify监视的目录也要开始记录修改时间
+                for root in self.paths:
+                    self.record_dirs(root)
+        self.dir_mtimes[directory] = self.dir_mtime(directory)
+
+    def dir_mtime(self, directory):
+        try:
+            return os.stat(directory).st_mtime
+        except OSError:
+            return None
+
+    def record_dirs(self, root):
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            if self.ignored(directory) or directory in self.dir_mtimes:
+                continue
+            self.dir_mtimes[directory] = self.dir_mtime(directory)
+            try:
+                with os.scandir(directory) as it:
+                    stack.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+
+    def touch(self, path, closed=False):
+        """文件有变化，重新开始计算等待写完的时间"""
+        self.pending[path] = (file_state(path), time.monotonic(), closed)
+
+    def handle_event(self, path, mask):
+        if path is None:
+            # 事件队列溢出，可能丢失了通知，重新检查所有目录一次
+            print("inotify事件队列溢出，重新检查监视目录")
+            for root in self.paths:
+                self.rescan(root)
+        elif mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # 新目录中在添加监视之前就已经写入的文件也要处理
+                self.add_tree(path)
+        elif is_candidate(path, self.extensions) and not self.ignored(os.path.dirname(path)):
+            self.touch(path, bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)))
+
+    def rescan(self, root):
+        for file_path in scan_folder(root, self.extensions):
+            if not self.ignored(os.path.dirname(file_path)) and is_candidate(file_path, self.extensions):
+                if self.known.get(file_path) != file_state(file_path) and file_path not in self.pending:
+                    self.touch(file_path)
+
+    def poll_dirs(self):
+        """轮询模式：只重新列出修改时间变化的目录"""
+        for directory, mtime in list(self.dir_mtimes.items()):
+            current = self.dir_mtime(directory)
+            if current == mtime:
+                continue
+            if current is None:
+                # 目录已删除
+                del self.dir_mtimes[directory]
+                continue
+            self.dir_mtimes[directory] = current
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in self.dir_mtimes:
+                            self.add_tree(entry.path)
+                    elif (is_candidate(entry.path, self.extensions) and entry.path not in self.pending and
+                          self.known.get(entry.path) != file_state(entry.path)):
+                        self.touch(entry.path)
+                except OSError:
+                    continue
+
+    def poll_files(self):
+        """轮询模式：检查一批已知文件自身的大小和修改时间，发现原地改写的文件"""
+        paths = list(self.known)
+        if not paths:
+            return
+        start = self.stat_cursor % len(paths)
+        batch = paths[start:start + POLL_STAT_BATCH]
+        self.stat_cursor = start + len(batch)
+        for path in batch:
+            if path in self.pending:
+                continue
+            state = file_state(path)
+            if state is None:
+                # 文件已删除，重新出现时由目录检查发现
+                del self.known[path]
+            elif state != self.known[path]:
+                self.touch(path)
+
+    def check_pending(self):
+        """返回已经写完的文件，按到达顺序"""
+        now = time.monotonic()
+        ready = []
+        for path, (state, since, closed) in list(self.pending.items()):
+            current = file_state(path)
+            if current is None:
+                # 文件已被删除或移走
+                del self.pending[path]
+            elif current != state:
+                self.pending[path] = (current, now, False)
+            elif now - since >= (QUICK_SETTLE if closed and current[0] > 0 else self.settle):
+                del self.pending[path]
+                # 只是打开后关闭、内容没有变化的文件不再转换
+                if self.known.get(path) != current:
+                    self.known[path] = current
+                    if current[0] > 0:
+                        ready.append(path)
+                    else:
+                        # 空文件不转换，之后写入内容时会再次进入等待
+                        print(f"跳过空文件: {path}")
+        return ready
+
+    def wait(self, timeout=None, stop=None):
+        """等待到有文件写完为止，返回这些文件；超过timeout秒或stop被设置时返回空列表"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while stop is None or not stop.is_set():
+            ready = self.check_pending()
+            if ready:
+                return ready
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return []
+            # 有等待写完的文件时短间隔检查，否则一直等待通知
+            interval = CHECK_INTERVAL if self.pending else 1.0
+            if self.inotify is not None:
+                for path, mask in self.inotify.read(interval):
+                    self.handle_event(path, mask)
+            else:
+                if now - self.last_poll >= self.poll_interval:
+                    self.last_poll = now
+                    self.poll_dirs()
+                    self.poll_files()
+                time.sleep(min(interval, self.poll_interval))
+        return []
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+def watch(engine, paths, callback=None, stop=None, **options):
+    """持续监视paths，写完的文件每批交给engine转换，callback接收每个ConversionEvent
+
+    stop为threading.Event，设置后在当前批次结束时退出；options传给FolderWatcher。
+    输出目录位于被监视的目录中时自动排除。
+    """
+    stop = stop or threading.Event()
+    options.setdefault('ignore', [engine.output_dir])
+    watcher = FolderWatcher(paths, **options)
+    print(f"开始监视({watcher.mode}): {', '.join(watcher.paths)}")
+    engine.start_workers()
+    try:
+        while not stop.is_set():
+            files = watcher.wait(stop=stop)
+            if not files:
+                continue
+            for event in engine.iter_convert(files):
+                if callback is not None:
+                    callback(event)
+    finally:
+        engine.stop_workers()
+        watcher.close()
@@ -0,0 +1,236 @@
+"""Word文档处理：格式校验、.doc转.docx以及无法导出PDF时的文本回退渲染(导出PDF见office)
+
+.docx只从磁盘读取一次(较大的文件用mmap映射)，并且只用python-docx解析一次：
+包结构校验、内容检查、文本提取和图片提取都使用同一个WordDocument。
+回退渲染的每一页在写出时才解码内嵌图片或绘制文本，已写出的页面不会一直留在内存中；
+文本按固定页面尺寸分页排版(见textpages)。
+"""
+import io
+import mmap
+import os
+import zipfile
+
+from .textpages import text_pages
+
+
+# 不小于该大小的.docx用mmap映射，不整个读入内存
+MMAP_THRESHOLD = 32 * 1024 * 1024
+
+
+def load_win32com():
+    """按需导入win32com，非Windows环境或未安装pywin32时返回None"""
+    try:
+        import win32com.client
+        return win32com
+    except ImportError:
+        return None
+
+
+def doc_to_docx(file_path, docx_path):
+    """调用Word把旧版.doc另存为.docx"""
+    win32com = load_win32com()
+    if win32com is None:
+        raise ImportError('未安装pywin32，无法自动调用Word转换doc为docx')
+    word = win32com.client.Dispatch('Word.Application')
+    word.Visible = False
+    doc = word.Documents.Open(file_path)
+    doc.SaveAs(docx_path, FileFormat=16)  # 16 = wdFormatDocumentDefault (docx)
+    doc.Close()
+    word.Quit()
+
+
+def check_docx_package(file_path):
+    """只检查.docx的zip包结构和word/document.xml，不解析文档内容，不合格时抛出ValueError
+
+    file_path也可以是已经读入内存的文件对象。
+    """
+    try:
+        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            file_list = zip_ref.namelist()
+            # 检查是否包含Word文档的核心文件
+            if 'word/document.xml' not in file_list:
+                # 检查是否是主题文件
+                if any('theme' in f.lower() for f in file_list):
+                    raise ValueError("文件格式错误: 这是一个Office主题文件，不是Word文档")
+                else:
+                    raise ValueError("文件格式错误: 这不是有效的Word文档")
+    except zipfile.BadZipFile:
+        raise ValueError("文件格式错误: 文件已损坏或不是有效的Word文档")
+
+
+class MappedStream(io.RawIOBase):
+    """mmap的只读文件对象包装，zipfile需要的seekable等方法在较早的Python版本中mmap没有提供"""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.mapping[self.pos:self.pos + len(b)]
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.mapping)
+        self.pos = offset
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+
+class WordDocument:
+    """读取一次的.docx：保存文件数据和python-docx的解析结果"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.mapping = None
+        self.data = None
+        self.doc = None
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = f.read()
+
+    def stream(self):
+        """文件数据的只读文件对象，每次调用都从头开始"""
+        if self.mapping is not None:
+            return MappedStream(self.mapping)
+        return io.BytesIO(self.data)
+
+    def parse(self):
+        """用python-docx解析文档；解析时已读出所有部件，之后不再需要原始文件数据"""
+        from docx import Document
+
+        if self.doc is None:
+            self.doc = Document(self.stream())
+            self.release()
+        return self.doc
+
+    def has_content(self):
+        doc = self.parse()
+        return (len(doc.paragraphs) > 0 and any(p.text.strip() for p in doc.paragraphs)) or len(doc.tables) > 0
+
+    def text_lines(self):
+        """段落和表格的文本行，表格每行的单元格用 | 连接"""
+        doc = self.parse()
+        text_content = []
+        for para in doc.paragraphs:
+            try:
+                text = para.text.strip()
+                if text:
+                    text_content.append(clean_text(text))
+            except Exception as e:
+                print(f"处理段落文本失败: {e}")
+                continue
+
+        for table in doc.tables:
+            for row in table.rows:
+                row_text = []
+                for cell in row.cells:
+                    try:
+                        text = cell.text.strip()
+                        if text:
+                            row_text.append(clean_text(text))
+                    except Exception as e:
+                        print(f"处理表格单元格文本失败: {e}")
+                        continue
+                if row_text:
+                    text_content.append(" | ".join(row_text))
+        return text_content
+
+    def image_blobs(self):
+        """内嵌图片的原始数据列表，只检查图片头部，不解码像素"""
+        from PIL import Image
+
+        blobs = []
+        for rel in self.parse().part.rels.values():
+            if "image" in rel.target_ref:
+                try:
+                    image_data = rel.target_part.blob
+                    Image.open(io.BytesIO(image_data)).close()
+                    blobs.append(image_data)
+                except Exception as e:
+                    print(f"提取图片失败: {e}")
+                    continue
+        return blobs
+
+    def release(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        self.data = None
+
+    def close(self):
+        self.release()
+        self.doc = None
+
+
+def load_docx(file_path):
+    """读取并检查.docx的包结构和内容，返回WordDocument，不合格时抛出ValueError"""
+    document = WordDocument(file_path)
+    try:
+        check_docx_package(document.stream())
+
+        try:
+            # 检查文档是否有内容
+            has_content = document.has_content()
+        except Exception as e:
+            if 'themeManager' in str(e) or 'theme' in str(e):
+                raise ValueError("文件格式错误: 这是一个Office主题文件，不是Word文档")
+            elif 'package' in str(e).lower():
+                raise ValueError("文件格式错误: 文件包结构异常，可能已损坏")
+            else:
+                raise ValueError(f"Word文件处理失败: {str(e)}")
+        if not has_content:
+            raise ValueError("Word文档为空或无有效内容")
+    except Exception:
+        document.close()
+        raise
+    return document
+
+
+def clean_text(text):
+    """处理文本编码"""
+    if not isinstance(text, str):
+        text = str(text)
+    return text.encode('utf-8', errors='ignore').decode('utf-8')
+
+
+def open_image(image_data):
+    from PIL import Image
+
+    return Image.open(io.BytesIO(image_data))
+
+
+def fallback_pages(document, base_name, max_pages=None):
+    """无法调用Word时的输出页面：文本内容分页绘制成的图片和各内嵌图片
+
+    返回无参数函数的列表，调用时才绘制或解码对应的图片；max_pages不为空时最多返回这么多页。
+    """
+    pages = []
+
+    # 文档文本内容分页排版
+    text_content = document.text_lines()
+    if text_content:
+        pages.extend(text_pages(text_content, f"Word文档: {base_name}", max_pages))
+
+    for image_data in document.image_blobs():
+        pages.append(lambda image_data=image_data: open_image(image_data))
+
+    # 如果没有内容，创建提示图片
+    if not pages:
+        pages.extend(text_pages([], f"Word文档: {base_name} (无内容)"))
+
+    return pages if max_pages is None else pages[:max_pages]
@@ -0,0 +1,37 @@
+"""测试用的假转换进程：按office模块的JSON行协议应答，不需要LibreOffice
+
+输入路径中含有hang时不再应答(用于超时测试)，含有bad时返回错误；
+其余请求写出一个内容为"%PDF-fake 进程号"的文件，测试据此判断进程是否被复用。
+"""
+import json
+import os
+import sys
+import time
+
+
+def reply(**values):
+    sys.stdout.write(json.dumps(values) + '\n')
+    sys.stdout.flush()
+
+
+def main():
+    reply(ready=True)
+    for line in sys.stdin:
+        request = json.loads(line)
+        op = request.get('op')
+        if op == 'quit':
+            break
+        if op == 'ping':
+            reply(ok=True)
+        elif 'hang' in request['input']:
+            time.sleep(3600)
+        elif 'bad' in request['input']:
+            reply(error='无法打开文档')
+        else:
+            with open(request['output'], 'w') as f:
+                f.write(f"%PDF-fake {os.getpid()}")
+            reply(ok=True)
+
+
+if __name__ == '__main__':
+    main()
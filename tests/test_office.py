@@ -0,0 +1,97 @@
+"""WorkerPool的测试，使用fake_office_worker.py代替LibreOffice转换进程"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from pdftojpg.office import ExportError, ExportTimeout, WorkerPool
+
+
+FAKE_WORKER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_office_worker.py')]
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_pool(self, **options):
+        pool = WorkerPool(FAKE_WORKER, **options)
+        self.pools.append(pool)
+        return pool
+
+    def convert(self, pool, name):
+        """导出一个文档，返回完成导出的进程号"""
+        pdf_path = os.path.join(self.tmp, name + '.pdf')
+        pool.convert(os.path.join(self.tmp, name + '.docx'), pdf_path)
+        with open(pdf_path) as f:
+            return int(f.read().split()[1])
+
+    def test_worker_reused(self):
+        pool = self.make_pool()
+        pids = {self.convert(pool, f'doc{i}') for i in range(3)}
+        self.assertEqual(len(pids), 1)
+        self.assertEqual(pool.stats()['started'], 1)
+        self.assertEqual(pool.stats()['jobs'], 3)
+
+    def test_recycled_after_max_jobs(self):
+        pool = self.make_pool(max_jobs=2)
+        pids = [self.convert(pool, f'doc{i}') for i in range(3)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(pool.stats()['started'], 2)
+        self.assertEqual(pool.stats()['recycled'], 1)
+
+    def test_error_reply(self):
+        pool = self.make_pool()
+        first = self.convert(pool, 'doc')
+        with self.assertRaises(ExportError) as context:
+            self.convert(pool, 'bad')
+        self.assertIn('无法打开文档', str(context.exception))
+        self.assertNotIsInstance(context.exception, ExportTimeout)
+        # 应答错误不影响进程继续使用
+        self.assertEqual(self.convert(pool, 'doc2'), first)
+        self.assertEqual(pool.stats()['started'], 1)
+
+    def test_timeout_kills_worker(self):
+        pool = self.make_pool(timeout=1)
+        first = self.convert(pool, 'doc')
+        with self.assertRaises(ExportTimeout):
+            self.convert(pool, 'hang')
+        with self.assertRaises(OSError):
+            os.kill(first, 0)
+        self.assertNotEqual(self.convert(pool, 'doc2'), first)
+        self.assertEqual(pool.stats()['started'], 2)
+        self.assertEqual(pool.stats()['failed'], 1)
+
+    def test_dead_worker_replaced(self):
+        pool = self.make_pool()
+        first = self.convert(pool, 'doc')
+        # 空闲进程意外退出，下一个任务前的健康检查发现后换用新进程
+        idle = pool.idle.queue[0]
+        idle.process.kill()
+        idle.process.wait()
+        self.assertNotEqual(self.convert(pool, 'doc2'), first)
+        self.assertEqual(pool.stats()['failed'], 1)
+        self.assertEqual(pool.stats()['started'], 2)
+
+    def test_close_stops_workers(self):
+        pool = self.make_pool(size=2)
+        futures = [pool.submit(os.path.join(self.tmp, f'doc{i}.docx'), os.path.join(self.tmp, f'doc{i}.pdf'))
+                   for i in range(4)]
+        for future in futures:
+            future.result()
+        workers = list(pool.idle.queue)
+        pool.close()
+        self.assertTrue(workers)
+        self.assertTrue(all(not worker.alive() for worker in workers))
+
+
+if __name__ == '__main__':
+    unittest.main()